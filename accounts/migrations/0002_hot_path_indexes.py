@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loginhistory',
+            index=models.Index(fields=['user', 'login_datetime', 'id'], name='login_user_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['user', 'timestamp', 'id'], name='activity_user_timestamp_idx'),
+        ),
+    ]
@@ -51,6 +51,9 @@ class LoginHistory(models.Model):
     class Meta:
         ordering = ['-login_datetime']
         verbose_name_plural = 'Login Histories'
+        indexes = [
+            models.Index(fields=['user', 'login_datetime', 'id'], name='login_user_datetime_idx'),
+        ]
 
     def __str__(self):
         status = 'Success' if self.success else 'Failed'
@@ -106,6 +109,9 @@ class UserActivity(models.Model):
     class Meta:
         ordering = ['-timestamp']
         verbose_name_plural = 'User Activities'
+        indexes = [
+            models.Index(fields=['user', 'timestamp', 'id'], name='activity_user_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.action} - {self.content_type}"
@@ -1,3 +1,9 @@
 from django.test import TestCase
+from restaurant_management.testing import QueryPlanMixin
+from .models import LoginHistory, UserActivity
 
-# Create your tests here.
+
+class AccountQueryPlanTests(QueryPlanMixin, TestCase):
+    def test_hot_queries_use_indexes(self):
+        self.assertNoFullScan(UserActivity.objects.filter(user_id=1).order_by('-timestamp', '-id')[:21])
+        self.assertNoFullScan(LoginHistory.objects.filter(user_id=1).order_by('-login_datetime', '-id')[:21])
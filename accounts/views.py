@@ -5,6 +5,7 @@ from django.urls import reverse_lazy
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.http import JsonResponse
+from restaurant_management.pagination import CursorPaginationMixin
 from .models import UserProfile, LoginHistory, UserNotificationSetting, UserActivity
 
 class RegisterView(CreateView):
@@ -104,11 +105,12 @@ class TestNotificationView(LoginRequiredMixin, View):
             return JsonResponse({'status': 'success'})
         return JsonResponse({'status': 'error', 'message': 'Invalid notification type'})
 
-class UserActivityView(LoginRequiredMixin, ListView):
+class UserActivityView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = UserActivity
     template_name = 'accounts/user_activity.html'
     context_object_name = 'activities'
     paginate_by = 20
+    cursor_ordering = ['-timestamp', '-id']
 
     def get_queryset(self):
         return self.request.user.activities.all()
@@ -121,11 +123,12 @@ class ActivityDetailView(LoginRequiredMixin, DetailView):
     def get_queryset(self):
         return self.request.user.activities.all()
 
-class LoginHistoryView(LoginRequiredMixin, ListView):
+class LoginHistoryView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = LoginHistory
     template_name = 'accounts/login_history.html'
     context_object_name = 'login_history'
     paginate_by = 20
+    cursor_ordering = ['-login_datetime', '-id']
 
     def get_queryset(self):
         return self.request.user.login_history.all()
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+def drop_duplicate_dates(apps, schema_editor):
+    # Racing drains created the copies and then updated all of them alike, so one row per date is kept
+    DashboardMetric = apps.get_model('dashboard', 'DashboardMetric')
+    duplicated = (
+        DashboardMetric.objects.values('date').annotate(keep=models.Min('id'), rows=models.Count('id'))
+        .filter(rows__gt=1).values_list('date', 'keep')
+    )
+    for date, keep in list(duplicated):
+        DashboardMetric.objects.filter(date=date).exclude(pk=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dashboardmetric',
+            name='date',
+            field=models.DateField(unique=True),
+        ),
+    ]
@@ -1,10 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from orders.models import Order
+from orders.archive import completed_order_totals
 from inventory.models import InventoryItem
 from staff.models import Employee
 from menu.models import MenuItem
+from restaurant_management.dates import day_range
 
 class DashboardWidget(models.Model):
     WIDGET_TYPES = [
@@ -87,7 +89,7 @@ class UserWidgetSettings(models.Model):
 
 class DashboardMetric(models.Model):
     """Store pre-calculated metrics for quick dashboard access"""
-    date = models.DateField()
+    date = models.DateField(unique=True)
     total_sales = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -118,28 +120,33 @@ class DashboardMetric(models.Model):
     @classmethod
     def update_metrics(cls, date):
         """Update or create metrics for a specific date"""
+        from reports.models import AnalyticsOutbox
+        with transaction.atomic():
+            AnalyticsOutbox.flush()
+            return cls._update_metrics(date)
+
+    @classmethod
+    def _update_metrics(cls, date):
         # Get completed orders for the day
-        completed_orders = Order.objects.filter(
-            created_at__date=date,
-            status='COMPLETED'
-        )
+        start, end = day_range(date)
+        totals = completed_order_totals(start, end)
         
         # Calculate sales metrics
-        total_sales = completed_orders.aggregate(
-            total=models.Sum('total', default=0)
-        )['total']
-        total_orders = completed_orders.count()
+        total_sales = totals['sales']
+        total_orders = totals['count']
         average_order_value = total_sales / total_orders if total_orders > 0 else 0
         
         # Get current operational metrics
         active_tables = Order.objects.filter(
-            created_at__date=date,
-            status__in=['PENDING', 'PREPARING', 'READY']
+            status__in=Order.KITCHEN_STATUSES,
+            created_at__gte=start,
+            created_at__lt=end
         ).values('table').distinct().count()
         
         pending_orders = Order.objects.filter(
-            created_at__date=date,
-            status__in=['PENDING', 'PREPARING']
+            status__in=['PENDING', 'PREPARING'],
+            created_at__gte=start,
+            created_at__lt=end
         ).count()
         
         low_stock_items = InventoryItem.objects.filter(
@@ -148,7 +155,7 @@ class DashboardMetric(models.Model):
         
         staff_on_duty = Employee.objects.filter(
             schedules__date=date,
-            schedules__attendance__status='PRESENT'
+            schedules__attendance_records__status='PRESENT'
         ).distinct().count()
         
         # Update or create metrics
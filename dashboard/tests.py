@@ -1,3 +1,61 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+from orders.models import Order
+from .models import DashboardWidget
 
-# Create your tests here.
+
+class WidgetDataConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('manager')
+        cls.sales = DashboardWidget.objects.create(name='Sales', widget_type='SALES_SUMMARY')
+        cls.alerts = DashboardWidget.objects.create(name='Alerts', widget_type='INVENTORY_ALERTS')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.order = Order.objects.create(customer_name='Walk-in', total=Decimal('12.00'))
+
+    def poll(self, widget, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(f'/api/widget-data/{widget.pk}/', **headers)
+
+    def test_unchanged_widget_answers_304(self):
+        response = self.poll(self.sales)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['order_count'], 1)
+        with self.assertNumQueries(4):
+            # Session, user, the widget row and today's order aggregate
+            self.assertEqual(self.poll(self.sales, response['ETag']).status_code, 304)
+
+    def test_todays_orders_invalidate_the_sales_summary(self):
+        etag = self.poll(self.sales)['ETag']
+        self.order.total = Decimal('20.00')
+        self.order.save()
+        response = self.poll(self.sales, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(str(response.json()['data']['total_sales'])), Decimal('20.00'))
+        etag = response['ETag']
+        Order.objects.create(customer_name='Regular', total=Decimal('8.00'))
+        response = self.poll(self.sales, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['order_count'], 2)
+        etag = response['ETag']
+        # Yesterday's orders are not part of the summary
+        Order.objects.filter(pk=self.order.pk).update(created_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(self.poll(self.sales, etag).json()['data']['order_count'], 1)
+
+    def test_widget_edits_invalidate_and_orders_do_not(self):
+        etag = self.poll(self.alerts)['ETag']
+        Order.objects.create(customer_name='Regular')
+        self.assertEqual(self.poll(self.alerts, etag).status_code, 304)
+        self.alerts.refresh_rate = 600
+        self.alerts.save()
+        self.assertEqual(self.poll(self.alerts, etag).status_code, 200)
+
+    def test_missing_widget_is_not_cached(self):
+        response = self.poll(DashboardWidget(pk=999))
+        self.assertFalse(response.json()['success'])
+        self.assertFalse(response.has_header('ETag'))
@@ -1,6 +1,9 @@
 from django.views.generic import TemplateView, ListView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
+from django.db import models
+from restaurant_management.conditional import ConditionalGetMixin, queryset_validator
+from restaurant_management.dates import day_range
 from .models import DashboardWidget, UserDashboardPreference, DashboardMetric
 from orders.models import Order
 from inventory.models import InventoryItem
@@ -13,7 +16,7 @@ class DashboardView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        today = timezone.now().date()
+        today = timezone.localdate()
         
         # Get or create user dashboard preferences
         preference, _ = UserDashboardPreference.objects.get_or_create(
@@ -31,8 +34,10 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             context['metrics'] = None
         
         # Get recent orders
-        context['recent_orders'] = Order.objects.filter(
-            created_at__date=today
+        start, end = day_range(today)
+        context['recent_orders'] = Order.objects.for_list().filter(
+            created_at__gte=start,
+            created_at__lt=end
         ).order_by('-created_at')[:5]
         
         # Get low stock items
@@ -41,7 +46,7 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         )[:5]
         
         # Get active staff
-        context['active_staff'] = Employee.objects.filter(
+        context['active_staff'] = Employee.objects.for_list().filter(
             is_active=True
         )[:5]
         
@@ -84,10 +89,24 @@ class UserPreferencesView(LoginRequiredMixin, UpdateView):
 from django.http import JsonResponse
 from django.views import View
 
-class WidgetDataView(LoginRequiredMixin, View):
+class WidgetDataView(LoginRequiredMixin, ConditionalGetMixin, View):
+    def get_validator(self, request, widget_id):
+        self.widget = DashboardWidget.objects.filter(id=widget_id).first()
+        if self.widget is None:
+            return None
+        return f'widget-{self.widget.pk}-{self.widget.updated_at.timestamp()}-{self.get_data_validator(self.widget)}'
+
+    def get_data_validator(self, widget):
+        # Only widget types with live data need more than the widget row itself
+        if widget.widget_type == 'SALES_SUMMARY':
+            today = timezone.localdate()
+            start, end = day_range(today)
+            return f'{today}-{queryset_validator(Order.objects.filter(created_at__gte=start, created_at__lt=end))}'
+        return ''
+
     def get(self, request, widget_id):
         try:
-            widget = DashboardWidget.objects.get(id=widget_id)
+            widget = self.widget or DashboardWidget.objects.get(id=widget_id)
             # Get widget-specific data based on widget type
             data = self.get_widget_data(widget)
             return JsonResponse({'success': True, 'data': data})
@@ -110,8 +129,8 @@ class WidgetDataView(LoginRequiredMixin, View):
         return {}
 
     def get_sales_summary(self):
-        today = timezone.now().date()
-        orders = Order.objects.filter(created_at__date=today)
+        start, end = day_range(timezone.localdate())
+        orders = Order.objects.filter(created_at__gte=start, created_at__lt=end)
         return {
             'total_sales': orders.aggregate(total=models.Sum('total'))['total'] or 0,
             'order_count': orders.count(),
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import InventoryItem, Supplier, InventoryTransaction
+from .models import InventoryItem, Supplier, InventoryTransaction, Recipe, GoodsReceipt, GoodsReceiptLine, StockSnapshot
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
@@ -13,12 +13,77 @@ class InventoryItemAdmin(admin.ModelAdmin):
     list_filter = ['supplier']
     search_fields = ['name', 'description']
     ordering = ['name']
-    list_editable = ['quantity', 'reorder_level', 'cost_per_unit']
+    list_editable = ['reorder_level', 'cost_per_unit']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return self.readonly_fields
+        # Stock changes are booked as ledger entries so snapshots and variance stay right
+        return list(self.readonly_fields) + ['quantity']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
 
 @admin.register(InventoryTransaction)
 class InventoryTransactionAdmin(admin.ModelAdmin):
-    list_display = ['item', 'transaction_type', 'quantity', 'unit_price', 'date']
+    list_display = ['item', 'transaction_type', 'quantity', 'balance_after', 'unit_price', 'date']
     list_filter = ['transaction_type', 'date']
     search_fields = ['item__name', 'notes']
     ordering = ['-date']
     readonly_fields = ['date']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return self.readonly_fields
+        # Stock moved when the entry was recorded; corrections are new ADJ entries
+        return self.readonly_fields + ['item', 'transaction_type', 'quantity']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
+class GoodsReceiptLineInline(admin.TabularInline):
+    model = GoodsReceiptLine
+    fields = ['item', 'quantity', 'unit_price']
+    readonly_fields = ['item', 'quantity', 'unit_price']
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(GoodsReceipt)
+class GoodsReceiptAdmin(admin.ModelAdmin):
+    """Receipts are booked through the API or the receive_goods command; stock moved with them"""
+    list_display = ['pk', 'supplier', 'reference', 'received_at', 'total']
+    list_filter = ['supplier', 'received_at']
+    search_fields = ['reference', 'supplier__name']
+    list_select_related = ['supplier']
+    inlines = [GoodsReceiptLineInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(Recipe)
+class RecipeAdmin(admin.ModelAdmin):
+    list_display = ['menu_item', 'inventory_item', 'quantity', 'unit']
+    list_filter = ['menu_item__category']
+    search_fields = ['menu_item__name', 'inventory_item__name']
+    list_select_related = ['menu_item', 'inventory_item']
+    raw_id_fields = ['menu_item', 'inventory_item']
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['item', 'date', 'taken_at', 'quantity', 'cost_per_unit']
+    list_filter = ['date']
+    search_fields = ['item__name']
+    list_select_related = ['item']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
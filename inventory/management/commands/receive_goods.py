@@ -0,0 +1,45 @@
+import csv
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from inventory.models import InventoryItem, Supplier
+from inventory.services import receive_goods
+
+
+class Command(BaseCommand):
+    help = (
+        'Book a supplier delivery from a CSV file with item, quantity and unit_price columns. '
+        'Items may be given by id or by exact name.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--supplier', required=True, help='Supplier id or name')
+        parser.add_argument('--reference', default='', help='Delivery note or invoice number')
+        parser.add_argument('--notes', default='')
+
+    def handle(self, *args, **options):
+        supplier = options['supplier']
+        if not supplier.isdigit():
+            supplier = Supplier.objects.filter(name=supplier).values_list('pk', flat=True).first()
+            if supplier is None:
+                raise CommandError(f"Unknown supplier: {options['supplier']}")
+
+        with open(options['csv_file'], newline='') as source:
+            lines = list(csv.DictReader(source))
+
+        names = {line.get('item') for line in lines if line.get('item') and not line['item'].isdigit()}
+        by_name = {}
+        for pk, name in InventoryItem.objects.filter(name__in=names).values_list('pk', 'name'):
+            by_name.setdefault(name, []).append(pk)
+        for name in names:
+            if len(by_name.get(name, [])) != 1:
+                raise CommandError(f'Item name "{name}" matches {len(by_name.get(name, []))} inventory items')
+        for line in lines:
+            if line.get('item') in by_name:
+                line['item'] = by_name[line['item']][0]
+
+        try:
+            receipt = receive_goods(supplier, lines, options['reference'], options['notes'])
+        except ValidationError as e:
+            raise CommandError('; '.join(f'{field}: {", ".join(messages)}' for field, messages in e.message_dict.items()))
+        self.stdout.write(self.style.SUCCESS(f'Booked receipt #{receipt.pk}: {len(lines)} lines, total {receipt.total}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from inventory.services import refresh_menu_availability
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute MenuItem.is_available for every dish with a recipe from current stock. '
+        'Stock changes keep the flags up to date; run this after importing recipes or stock.'
+    )
+
+    def handle(self, *args, **options):
+        flipped = refresh_menu_availability()
+        self.stdout.write(self.style.SUCCESS(f'Flipped availability of {flipped} menu items'))
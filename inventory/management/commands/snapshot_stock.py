@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from inventory.stock import take_stock_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Record the current stock of every inventory item for as-of, valuation and variance reports. '
+        'Run it daily from cron (e.g. "5 0 * * * manage.py snapshot_stock").'
+    )
+
+    def handle(self, *args, **options):
+        taken = take_stock_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted stock of {taken} items'))
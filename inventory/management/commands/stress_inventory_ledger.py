@@ -0,0 +1,83 @@
+import multiprocessing
+import random
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models
+from inventory.models import InventoryItem, InventoryTransaction
+
+STRESS_MARKER = 'inventory-ledger-stress-test'
+
+
+def _post_transactions(args):
+    item_id, count, seed = args
+    # Forked children must not reuse the parent's database connection
+    connections.close_all()
+    rng = random.Random(seed)
+    # One stale copy of the item per station, as a long-lived form or worker would hold
+    item = InventoryItem.objects.get(pk=item_id)
+    posted, rejected = 0, 0
+    for _ in range(count):
+        try:
+            InventoryTransaction.objects.create(
+                item=item,
+                transaction_type=rng.choice(['IN', 'OUT', 'OUT']),
+                quantity=Decimal(rng.randint(1, 5)),
+                unit_price=Decimal('1.00'),
+                notes=STRESS_MARKER,
+            )
+            posted += 1
+        except ValidationError:
+            rejected += 1
+    connections.close_all()
+    return posted, rejected
+
+
+class Command(BaseCommand):
+    help = (
+        'Post stock movements for one item from several processes at once and check that '
+        'the final stock equals the starting stock plus the ledger'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--transactions', type=int, default=200, help='Movements posted per process')
+        parser.add_argument('--initial', type=int, default=50, help='Starting stock of the test item')
+        parser.add_argument('--keep', action='store_true', help='Keep the test item and its ledger')
+
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('This stress test needs the fork start method')
+
+        initial = Decimal(options['initial'])
+        item = InventoryItem.objects.create(
+            name=STRESS_MARKER, unit='unit', quantity=initial, reorder_level=0, cost_per_unit=Decimal('1.00')
+        )
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        jobs = [(item.pk, options['transactions'], seed) for seed in range(options['processes'])]
+        with context.Pool(options['processes']) as pool:
+            results = pool.map(_post_transactions, jobs)
+
+        ledger = InventoryTransaction.objects.filter(item=item).aggregate(
+            entries=models.Count('id'),
+            received=models.Sum('quantity', filter=models.Q(transaction_type='IN'), default=0),
+            issued=models.Sum('quantity', filter=models.Q(transaction_type='OUT'), default=0),
+            lowest=models.Min('balance_after'),
+        )
+        item.refresh_from_db()
+        expected = initial + ledger['received'] - ledger['issued']
+        posted = sum(done for done, _ in results)
+        rejected = sum(refused for _, refused in results)
+
+        self.stdout.write(
+            f'{posted} movements posted by {options["processes"]} processes, {rejected} refused for stock, '
+            f'{ledger["entries"]} in the ledger; stock {item.quantity}, ledger says {expected}, '
+            f'lowest balance {ledger["lowest"]}'
+        )
+        if not options['keep']:
+            item.delete()
+
+        if item.quantity != expected or ledger['entries'] != posted or (ledger['lowest'] or 0) < 0:
+            raise CommandError('Stock and ledger disagree')
+        self.stdout.write(self.style.SUCCESS('Stock matches the ledger'))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['item', 'date'], name='invtx_item_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['date', 'id'], name='invtx_date_id_idx'),
+        ),
+    ]
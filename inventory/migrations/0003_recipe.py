@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:13
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_hot_path_indexes'),
+        ('menu', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=3, help_text='Amount used per portion, in the recipe unit', max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('unit', models.CharField(choices=[('kg', 'Kilograms'), ('g', 'Grams'), ('l', 'Liters'), ('ml', 'Milliliters'), ('unit', 'Units'), ('dozen', 'Dozen')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('inventory_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to='inventory.inventoryitem')),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe', to='menu.menuitem')),
+            ],
+            options={
+                'ordering': ['menu_item', 'inventory_item'],
+                'constraints': [models.UniqueConstraint(fields=('menu_item', 'inventory_item'), name='recipe_menu_inventory_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_recipe'),
+        ('menu', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['inventory_item', 'menu_item'], name='recipe_inventory_menu_idx'),
+        ),
+    ]
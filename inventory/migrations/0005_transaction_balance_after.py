@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_recipe_inventory_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='balance_after',
+            field=models.DecimalField(decimal_places=2, editable=False, help_text='Item stock right after this entry was applied', max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def seed_snapshots(apps, schema_editor):
+    # Existing quantities are the only known starting point for as-of queries
+    from django.utils import timezone
+    InventoryItem = apps.get_model('inventory', 'InventoryItem')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    taken_at = timezone.now()
+    StockSnapshot.objects.bulk_create([
+        StockSnapshot(
+            item_id=pk, date=timezone.localdate(taken_at), taken_at=taken_at, quantity=quantity, cost_per_unit=cost
+        )
+        for pk, quantity, cost in InventoryItem.objects.values_list('pk', 'quantity', 'cost_per_unit').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_goods_receipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Local date of the snapshot')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_per_unit', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.inventoryitem')),
+            ],
+            options={
+                'ordering': ['-taken_at'],
+                'indexes': [models.Index(fields=['item', '-taken_at'], name='stocksnap_item_taken_idx'), models.Index(fields=['date'], name='stocksnap_date_idx')],
+            },
+        ),
+        migrations.RunPython(seed_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+from orders.signals import completed_totals_changed
 
 class Supplier(models.Model):
     name = models.CharField(max_length=100)
@@ -15,6 +19,20 @@ class Supplier(models.Model):
     def __str__(self):
         return self.name
 
+class InventoryItemQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('supplier')
+
+# Unit -> (dimension, size in the dimension's base unit)
+UNIT_SIZES = {
+    'kg': ('mass', 1000),
+    'g': ('mass', 1),
+    'l': ('volume', 1000),
+    'ml': ('volume', 1),
+    'unit': ('count', 1),
+    'dozen': ('count', 12),
+}
+
 class InventoryItem(models.Model):
     UNIT_CHOICES = [
         ('kg', 'Kilograms'),
@@ -55,6 +73,8 @@ class InventoryItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = InventoryItemQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = 'Inventory Items'
         ordering = ['name']
@@ -65,6 +85,19 @@ class InventoryItem(models.Model):
     def needs_reorder(self):
         return self.quantity <= self.reorder_level
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Stock only moves through the ledger; don't write back the quantity this instance loaded
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'quantity'
+            ]
+        super().save(*args, **kwargs)
+
+class InventoryTransactionQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('item')
+
 class InventoryTransaction(models.Model):
     TRANSACTION_TYPES = [
         ('IN', 'Stock In'),
@@ -88,25 +121,201 @@ class InventoryTransaction(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(0)]
     )
+    balance_after = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        editable=False,
+        help_text="Item stock right after this entry was applied"
+    )
     date = models.DateTimeField(default=timezone.now)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = InventoryTransactionQuerySet.as_manager()
+
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['item', 'date'], name='invtx_item_date_idx'),
+            models.Index(fields=['date', 'id'], name='invtx_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.item.name} ({self.quantity})"
 
-    def save(self, *args, **kwargs):
+    def apply_to_stock(self):
+        """Move the item's stock with one conditional UPDATE and return the new balance.
+
+        OUT only succeeds while the stock covers it, so two stations can
+        never take the same units; the row lock taken by the UPDATE keeps
+        the balance read back ours until the transaction ends.
+        """
+        stock = InventoryItem.objects.filter(pk=self.item_id)
+        now = timezone.now()
         if self.transaction_type == 'IN':
-            self.item.quantity += self.quantity
+            stock.update(quantity=models.F('quantity') + self.quantity, updated_at=now)
         elif self.transaction_type == 'OUT':
-            if self.item.quantity < self.quantity:
+            if not stock.filter(quantity__gte=self.quantity).update(
+                quantity=models.F('quantity') - self.quantity, updated_at=now
+            ):
                 raise ValidationError("Insufficient stock available")
-            self.item.quantity -= self.quantity
         elif self.transaction_type == 'ADJ':
-            self.item.quantity = self.quantity
-        
-        self.item.save()
-        super().save(*args, **kwargs)
+            stock.update(quantity=self.quantity, updated_at=now)
+        return stock.values_list('quantity', flat=True).get()
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            # Stock moved when the entry was recorded; later saves only touch the entry
+            return super().save(*args, **kwargs)
+        from .services import refresh_menu_availability
+        with transaction.atomic():
+            self.balance_after = self.apply_to_stock()
+            self.item.quantity = self.balance_after
+            super().save(*args, **kwargs)
+            refresh_menu_availability(inventory_item_ids=[self.item_id])
+
+class StockSnapshot(models.Model):
+    """An item's stock at ``taken_at``; ledger entries after it carry the quantity forward"""
+    item = models.ForeignKey(
+        InventoryItem,
+        on_delete=models.CASCADE,
+        related_name='snapshots'
+    )
+    date = models.DateField(help_text="Local date of the snapshot")
+    taken_at = models.DateTimeField()
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    cost_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        ordering = ['-taken_at']
+        indexes = [
+            # As-of lookups: the newest snapshot at or before a moment for each item
+            models.Index(fields=['item', '-taken_at'], name='stocksnap_item_taken_idx'),
+            models.Index(fields=['date'], name='stocksnap_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item.name}: {self.quantity} at {self.taken_at:%Y-%m-%d %H:%M}"
+
+class GoodsReceipt(models.Model):
+    """A supplier delivery booked into stock in one go"""
+    supplier = models.ForeignKey(
+        Supplier,
+        on_delete=models.PROTECT,
+        related_name='receipts'
+    )
+    reference = models.CharField(max_length=50, blank=True, help_text="Supplier delivery note or invoice number")
+    received_at = models.DateTimeField(default=timezone.now)
+    received_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='goods_receipts'
+    )
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-received_at']
+
+    def __str__(self):
+        return f"Receipt #{self.pk} - {self.supplier.name} {self.reference}".rstrip()
+
+class GoodsReceiptLine(models.Model):
+    receipt = models.ForeignKey(
+        GoodsReceipt,
+        on_delete=models.CASCADE,
+        related_name='lines'
+    )
+    item = models.ForeignKey(
+        InventoryItem,
+        on_delete=models.PROTECT,
+        related_name='receipt_lines'
+    )
+    quantity = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(0)]
+    )
+    unit_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        validators=[MinValueValidator(0)]
+    )
+
+    def __str__(self):
+        return f"{self.quantity} {self.item.unit} {self.item.name} @ {self.unit_price}"
+
+class Recipe(models.Model):
+    """One ingredient of a menu item: how much of an inventory item a single portion uses"""
+    menu_item = models.ForeignKey(
+        'menu.MenuItem',
+        on_delete=models.CASCADE,
+        related_name='recipe'
+    )
+    inventory_item = models.ForeignKey(
+        InventoryItem,
+        on_delete=models.CASCADE,
+        related_name='recipes'
+    )
+    quantity = models.DecimalField(
+        max_digits=10,
+        decimal_places=3,
+        validators=[MinValueValidator(0)],
+        help_text="Amount used per portion, in the recipe unit"
+    )
+    unit = models.CharField(max_length=10, choices=InventoryItem.UNIT_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['menu_item', 'inventory_item']
+        constraints = [
+            models.UniqueConstraint(fields=['menu_item', 'inventory_item'], name='recipe_menu_inventory_uniq'),
+        ]
+        indexes = [
+            # Reverse dependency lookup: which dishes use this ingredient
+            models.Index(fields=['inventory_item', 'menu_item'], name='recipe_inventory_menu_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.menu_item.name}: {self.quantity} {self.unit} {self.inventory_item.name}"
+
+    def clean(self):
+        if self.inventory_item_id and UNIT_SIZES[self.unit][0] != UNIT_SIZES[self.inventory_item.unit][0]:
+            raise ValidationError(f"{self.unit} cannot be converted to {self.inventory_item.unit}")
+
+@receiver(completed_totals_changed)
+def consume_ingredients(sender, changes, **kwargs):
+    """Take the ingredients of newly completed orders out of stock in the same transaction"""
+    from .services import consume_order_ingredients
+    consume_order_ingredients([change['order_id'] for change in changes if change['count'] > 0])
+
+@receiver(post_save, sender=InventoryItem)
+def refresh_dependent_availability(sender, instance, update_fields=None, **kwargs):
+    """Re-check the dishes that use an item whenever its stock or unit is saved"""
+    if update_fields is None or {'quantity', 'unit'} & set(update_fields):
+        from .services import refresh_menu_availability
+        refresh_menu_availability(inventory_item_ids=[instance.pk])
+
+@receiver(post_save, sender=InventoryItem)
+def record_opening_stock(sender, instance, created, **kwargs):
+    """New items start with a snapshot, since their opening quantity is not in the ledger"""
+    if created:
+        taken_at = timezone.now()
+        StockSnapshot.objects.create(
+            item=instance,
+            date=timezone.localdate(taken_at),
+            taken_at=taken_at,
+            quantity=instance.quantity,
+            cost_per_unit=instance.cost_per_unit,
+        )
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def refresh_recipe_availability(sender, instance, **kwargs):
+    from .services import refresh_menu_availability
+    refresh_menu_availability(menu_item_ids=[instance.menu_item_id])
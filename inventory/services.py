@@ -0,0 +1,200 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+from .models import (
+    GoodsReceipt, GoodsReceiptLine, InventoryItem, InventoryTransaction, Recipe, Supplier, UNIT_SIZES
+)
+
+QUANTITY_STEP = Decimal('0.01')
+
+
+def convert_quantity(quantity, from_unit, to_unit):
+    """``quantity`` in ``from_unit`` expressed in ``to_unit``, rounded like stock quantities"""
+    return (quantity * UNIT_SIZES[from_unit][1] / UNIT_SIZES[to_unit][1]).quantize(QUANTITY_STEP, ROUND_HALF_UP)
+
+
+def bulk_adjust_stock(deltas):
+    """Add ``{item_id: delta}`` to the stock of many items with one CASE-based UPDATE"""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    change = models.Case(
+        *[models.When(pk=pk, then=models.Value(delta)) for pk, delta in deltas.items()],
+        output_field=models.DecimalField(),
+    )
+    updated = InventoryItem.objects.filter(pk__in=deltas).update(
+        quantity=models.F('quantity') + change,
+        updated_at=timezone.now(),
+    )
+    refresh_menu_availability(inventory_item_ids=deltas)
+    return updated
+
+
+def refresh_menu_availability(inventory_item_ids=None, menu_item_ids=None):
+    """Flip ``is_available`` on recipe dishes whose ingredient stock changed; returns the number flipped"""
+    from menu.catalog import bump_catalog_generation
+    from menu.models import MenuItem
+
+    components = Recipe.objects.all()
+    if inventory_item_ids is not None:
+        components = components.filter(menu_item__in=Recipe.objects.filter(
+            inventory_item__in=list(inventory_item_ids)
+        ).values('menu_item'))
+    if menu_item_ids is not None:
+        components = components.filter(menu_item__in=list(menu_item_ids))
+
+    current = {}
+    available = set()
+    short = set()
+    for menu_item_id, is_available, quantity, unit, stock, stock_unit in components.values_list(
+        'menu_item', 'menu_item__is_available', 'quantity', 'unit', 'inventory_item__quantity', 'inventory_item__unit'
+    ).order_by():
+        current[menu_item_id] = is_available
+        if quantity * UNIT_SIZES[unit][1] > stock * UNIT_SIZES[stock_unit][1]:
+            short.add(menu_item_id)
+        else:
+            available.add(menu_item_id)
+    available -= short
+
+    flips = [pk for pk, is_available in current.items() if is_available != (pk in available)]
+    if flips:
+        MenuItem.objects.filter(pk__in=flips).update(
+            is_available=models.Case(
+                models.When(pk__in=available, then=models.Value(True)),
+                default=models.Value(False),
+            ),
+            updated_at=timezone.now(),
+        )
+        bump_catalog_generation()
+    return len(flips)
+
+
+def ingredient_usage(order_ids):
+    """``{(order_id, order_number): {inventory_item_id: (quantity, cost_per_unit)}}`` for the given orders"""
+    rows = (
+        Recipe.objects.filter(menu_item__order_items__order_id__in=order_ids)
+        .values(
+            'menu_item__order_items__order_id', 'menu_item__order_items__order__order_number',
+            'inventory_item', 'inventory_item__unit', 'inventory_item__cost_per_unit', 'unit',
+        )
+        .annotate(used=models.Sum(
+            models.F('quantity') * models.F('menu_item__order_items__quantity'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=3),
+        ))
+        .order_by()
+    )
+    usage = defaultdict(dict)
+    for row in rows:
+        order = (row['menu_item__order_items__order_id'], row['menu_item__order_items__order__order_number'])
+        quantity = convert_quantity(Decimal(row['used']), row['unit'], row['inventory_item__unit'])
+        # The same item may appear under several recipe units
+        previous = usage[order].get(row['inventory_item'], (Decimal('0'), None))[0]
+        usage[order][row['inventory_item']] = (previous + quantity, row['inventory_item__cost_per_unit'])
+    return usage
+
+
+def record_transactions(entries):
+    """Apply unsaved IN/OUT entries to stock and bulk insert them with their running balances"""
+    def delta(entry):
+        return entry.quantity if entry.transaction_type == 'IN' else -entry.quantity
+
+    deltas = defaultdict(Decimal)
+    for entry in entries:
+        deltas[entry.item_id] += delta(entry)
+    with transaction.atomic():
+        bulk_adjust_stock(deltas)
+        balances = dict(InventoryItem.objects.filter(pk__in=deltas).order_by().values_list('pk', 'quantity'))
+        # Walk back from the final balance so each entry carries the stock right after it
+        for entry in reversed(entries):
+            entry.balance_after = balances[entry.item_id]
+            balances[entry.item_id] -= delta(entry)
+        return InventoryTransaction.objects.bulk_create(entries)
+
+
+def consume_order_ingredients(order_ids):
+    """Book the ingredients of completed orders as OUT entries, even below zero stock"""
+    usage = ingredient_usage(order_ids) if order_ids else {}
+    now = timezone.now()
+    entries = [
+        InventoryTransaction(
+            item_id=item_id,
+            transaction_type='OUT',
+            quantity=quantity,
+            unit_price=cost_per_unit,
+            date=now,
+            notes=f'Used by order #{order_number}',
+        )
+        for (order_id, order_number), items in usage.items()
+        for item_id, (quantity, cost_per_unit) in items.items()
+        if quantity
+    ]
+    if entries:
+        record_transactions(entries)
+    return len(entries)
+
+
+def _receipt_lines(lines, errors):
+    parsed = []
+    for number, line in enumerate(lines, 1):
+        try:
+            if isinstance(line['item'], (bool, float)):
+                raise TypeError
+            item_id = int(line['item'])
+            quantity = Decimal(str(line['quantity']))
+            unit_price = Decimal(str(line['unit_price']))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            errors[f'line {number}'] = ['item, quantity and unit_price are required numbers']
+            continue
+        if not quantity.is_finite() or quantity <= 0 or quantity != quantity.quantize(QUANTITY_STEP):
+            errors[f'line {number}'] = ['quantity must be positive with at most two decimals']
+        elif not unit_price.is_finite() or unit_price < 0 or unit_price != unit_price.quantize(QUANTITY_STEP):
+            errors[f'line {number}'] = ['unit_price must not be negative and have at most two decimals']
+        parsed.append((number, item_id, quantity, unit_price))
+    return parsed
+
+
+def receive_goods(supplier_id, lines, reference='', notes='', received_by=None):
+    """Validate and book a supplier delivery as a GoodsReceipt with one IN entry per line"""
+    errors = {}
+    supplier = Supplier.objects.filter(pk=supplier_id).first() if str(supplier_id).isdigit() else None
+    if supplier is None:
+        errors['supplier'] = ['Unknown supplier']
+    if not lines:
+        errors['lines'] = ['A receipt needs at least one line']
+    parsed = _receipt_lines(lines or [], errors)
+    items = InventoryItem.objects.in_bulk({item_id for _, item_id, _, _ in parsed})
+    for number, item_id, _, _ in parsed:
+        if item_id not in items:
+            errors.setdefault(f'line {number}', []).append(f'Unknown inventory item {item_id}')
+    if errors:
+        raise ValidationError(errors)
+
+    with transaction.atomic():
+        receipt = GoodsReceipt.objects.create(
+            supplier=supplier,
+            reference=reference,
+            notes=notes,
+            received_by=received_by,
+            total=sum(
+                (quantity * unit_price for _, _, quantity, unit_price in parsed), Decimal('0')
+            ).quantize(Decimal('0.01'), ROUND_HALF_UP),
+        )
+        GoodsReceiptLine.objects.bulk_create([
+            GoodsReceiptLine(receipt=receipt, item_id=item_id, quantity=quantity, unit_price=unit_price)
+            for _, item_id, quantity, unit_price in parsed
+        ])
+        label = f'Goods receipt #{receipt.pk} {reference}'.rstrip()
+        record_transactions([
+            InventoryTransaction(
+                item_id=item_id,
+                transaction_type='IN',
+                quantity=quantity,
+                unit_price=unit_price,
+                date=receipt.received_at,
+                notes=label,
+            )
+            for _, item_id, quantity, unit_price in parsed
+        ])
+    return receipt
@@ -0,0 +1,132 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import InventoryItem, InventoryTransaction, StockSnapshot
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+CENT = Decimal('0.01')
+DECIMAL = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def _cents(value):
+    # SQLite hands back computed decimals without their scale
+    return None if value is None else Decimal(value).quantize(CENT)
+
+
+def take_stock_snapshot():
+    """Copy every item's quantity and cost into StockSnapshot with one INSERT ... SELECT"""
+    taken_at = timezone.now()
+    snapshot, item = StockSnapshot._meta, InventoryItem._meta
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(snapshot.db_table)} (item_id, date, taken_at, quantity, cost_per_unit) '
+            f'SELECT id, %s, %s, quantity, cost_per_unit FROM {quote(item.db_table)}',
+            [
+                connection.ops.adapt_datefield_value(timezone.localdate(taken_at)),
+                connection.ops.adapt_datetimefield_value(taken_at),
+            ]
+        )
+        return cursor.rowcount
+
+
+def _replay_ledger(queryset, item, until):
+    """Annotate ``quantity_as_of``: ``base_quantity`` at ``base_at`` carried through the ledger to ``until``.
+
+    The newest ADJ in the window replaces the base, and IN/OUT entries
+    after it are added. Both lookups are correlated subqueries on the
+    (item, date) ledger index, so the cost grows with the items, not the
+    ledger. Rows without a base or ADJ get None.
+    """
+    window = InventoryTransaction.objects.filter(item=models.OuterRef(item), date__lte=until)
+    adjustment = window.filter(
+        transaction_type='ADJ', date__gt=Coalesce(models.OuterRef('base_at'), models.Value(EPOCH))
+    ).order_by('-date', '-id')
+    queryset = queryset.annotate(
+        adjusted_quantity=models.Subquery(adjustment.values('quantity')[:1]),
+        adjusted_at=models.Subquery(adjustment.values('date')[:1]),
+    )
+    movements = window.filter(
+        transaction_type__in=['IN', 'OUT'],
+        date__gt=Coalesce(models.OuterRef('adjusted_at'), models.OuterRef('base_at'), models.Value(EPOCH)),
+    ).values('item').annotate(net=models.Sum(models.Case(
+        models.When(transaction_type='IN', then=models.F('quantity')),
+        default=-models.F('quantity'),
+    ))).values('net')
+    return queryset.annotate(
+        quantity_as_of=models.ExpressionWrapper(
+            Coalesce('adjusted_quantity', 'base_quantity')
+            + Coalesce(models.Subquery(movements, output_field=DECIMAL), models.Value(Decimal('0'))),
+            output_field=DECIMAL,
+        )
+    )
+
+
+def stock_as_of(moment, items=None):
+    """Items annotated with ``quantity_as_of`` and ``cost_as_of`` at ``moment``.
+
+    Starts from each item's newest snapshot at or before ``moment`` and
+    replays only the ledger entries since then. ``quantity_as_of`` is None
+    for items with no snapshot yet at that moment.
+    """
+    snapshots = StockSnapshot.objects.filter(item=models.OuterRef('pk'), taken_at__lte=moment).order_by('-taken_at')
+    items = (items if items is not None else InventoryItem.objects.all()).annotate(
+        base_quantity=models.Subquery(snapshots.values('quantity')[:1]),
+        base_at=models.Subquery(snapshots.values('taken_at')[:1]),
+        cost_as_of=Coalesce(models.Subquery(snapshots.values('cost_per_unit')[:1]), 'cost_per_unit'),
+    )
+    return _replay_ledger(items, 'pk', moment)
+
+
+def stock_valuation(moment):
+    """Quantity and value of every item at ``moment`` plus the total value"""
+    rows = []
+    total = Decimal('0')
+    for row in stock_as_of(moment).order_by('name', 'id').values(
+        'id', 'name', 'unit', 'quantity_as_of', 'cost_as_of'
+    ):
+        quantity = _cents(row.pop('quantity_as_of'))
+        row['quantity'] = quantity
+        row['cost_per_unit'] = _cents(row.pop('cost_as_of'))
+        row['value'] = None if quantity is None else _cents(quantity * row['cost_per_unit'])
+        total += row['value'] or 0
+        rows.append(row)
+    return rows, total
+
+
+def stock_variance(day):
+    """Counted against expected stock for the last snapshot of each item on ``day``.
+
+    Expected stock is the previous snapshot carried through the ledger; the
+    difference shows stock that moved outside the ledger (waste, theft,
+    direct edits of the quantity). ``expected`` and ``variance`` are None
+    for an item's first snapshot.
+    """
+    later = StockSnapshot.objects.filter(
+        item=models.OuterRef('item'), date=day, taken_at__gt=models.OuterRef('taken_at')
+    )
+    previous = StockSnapshot.objects.filter(
+        item=models.OuterRef('item'), taken_at__lt=models.OuterRef('taken_at')
+    ).order_by('-taken_at')
+    closing = StockSnapshot.objects.filter(date=day).exclude(models.Exists(later)).annotate(
+        base_quantity=models.Subquery(previous.values('quantity')[:1]),
+        base_at=models.Subquery(previous.values('taken_at')[:1]),
+    )
+    rows = []
+    for row in _replay_ledger(closing, 'item', models.OuterRef('taken_at')).order_by('item__name', 'item').values(
+        'item', 'item__name', 'item__unit', 'quantity', 'quantity_as_of', 'cost_per_unit'
+    ):
+        expected = _cents(row['quantity_as_of'])
+        variance = None if expected is None else row['quantity'] - expected
+        rows.append({
+            'id': row['item'],
+            'name': row['item__name'],
+            'unit': row['item__unit'],
+            'counted': row['quantity'],
+            'expected': expected,
+            'variance': variance,
+            'variance_value': None if variance is None else _cents(variance * row['cost_per_unit']),
+        })
+    return rows
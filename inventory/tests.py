@@ -1,3 +1,508 @@
+import csv
+import gzip
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+from menu.catalog import catalog_generation, menu_catalog
+from menu.models import Category, MenuItem
+from orders.models import Order, OrderItem
+from orders.services import bulk_transition_orders, transition_order
+from restaurant_management.dates import day_range
+from restaurant_management.testing import QueryPlanMixin
+from .models import GoodsReceipt, InventoryItem, InventoryTransaction, Recipe, StockSnapshot, Supplier
+from .services import bulk_adjust_stock, ingredient_usage, receive_goods
+from .stock import stock_as_of, stock_variance, take_stock_snapshot
 
-# Create your tests here.
+
+class InventoryQueryShapeTests(TestCase):
+    def create_stock(self, count):
+        supplier = Supplier.objects.create(
+            name='Mill', contact_person='-', email='mill@example.com', phone='555', address='-'
+        )
+        for number in range(count):
+            item = InventoryItem.objects.create(
+                name=f'Flour {number}', unit='kg', quantity=Decimal('10'), reorder_level=Decimal('2'),
+                supplier=supplier, cost_per_unit=Decimal('1.20')
+            )
+            InventoryTransaction.objects.create(
+                item=item, transaction_type='IN', quantity=Decimal('5'), unit_price=Decimal('1.20')
+            )
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        for count in (2, 8):
+            self.create_stock(count)
+            with self.assertNumQueries(1):
+                [str(transaction) for transaction in InventoryTransaction.objects.for_list()]
+            with self.assertNumQueries(1):
+                [(str(item), str(item.supplier)) for item in InventoryItem.objects.for_list()]
+
+
+class InventoryQueryPlanTests(QueryPlanMixin, TestCase):
+    def test_hot_queries_use_indexes(self):
+        start, end = day_range(timezone.localdate())
+        self.assertNoFullScan(InventoryTransaction.objects.filter(date__gte=start, date__lt=end))
+        self.assertNoFullScan(InventoryTransaction.objects.filter(item_id=1, date__gte=start, date__lt=end))
+        self.assertNoFullScan(InventoryTransaction.objects.filter(item_id=1).order_by('-date')[:10])
+
+
+class InventoryLedgerTests(TestCase):
+    def setUp(self):
+        self.item = InventoryItem.objects.create(
+            name='Flour', unit='kg', quantity=Decimal('10'), reorder_level=Decimal('2'), cost_per_unit=Decimal('1.20')
+        )
+
+    def post(self, item, transaction_type, quantity):
+        return InventoryTransaction.objects.create(
+            item=item, transaction_type=transaction_type, quantity=Decimal(quantity), unit_price=Decimal('1.20')
+        )
+
+    def test_entries_record_the_resulting_balance(self):
+        self.assertEqual(self.post(self.item, 'IN', '5').balance_after, Decimal('15'))
+        self.assertEqual(self.post(self.item, 'OUT', '4').balance_after, Decimal('11'))
+        self.assertEqual(self.post(self.item, 'ADJ', '7').balance_after, Decimal('7'))
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('7'))
+
+    def test_stale_copies_do_not_lose_updates(self):
+        first, second = InventoryItem.objects.get(pk=self.item.pk), InventoryItem.objects.get(pk=self.item.pk)
+        self.post(first, 'OUT', '3')
+        self.post(second, 'OUT', '3')
+        second.name = 'Stale name'
+        self.post(second, 'IN', '1')
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('5'))
+        self.assertEqual(self.item.name, 'Flour')
+
+    def test_insufficient_stock_is_refused(self):
+        stale = InventoryItem.objects.get(pk=self.item.pk)
+        self.post(self.item, 'OUT', '8')
+        with self.assertRaises(ValidationError):
+            self.post(stale, 'OUT', '8')
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('2'))
+        self.assertEqual(InventoryTransaction.objects.count(), 1)
+
+    def test_editing_an_entry_does_not_move_stock_again(self):
+        entry = self.post(self.item, 'IN', '5')
+        entry.notes = 'Delivery note 42'
+        entry.save()
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('15'))
+
+
+class InventoryLedgerRaceTests(TestCase):
+    def setUp(self):
+        self.item = InventoryItem.objects.create(
+            name='Flour', unit='kg', quantity=Decimal('10'), reorder_level=Decimal('2'), cost_per_unit=Decimal('1.20')
+        )
+
+    def test_second_station_cannot_take_the_same_units(self):
+        # Station B books its OUT after station A loaded the item, just as A opens its transaction
+        def station_b_first(execute, sql, params, many, context):
+            if sql.startswith('SAVEPOINT') and not interleaved:
+                interleaved.append(True)
+                InventoryTransaction.objects.create(
+                    item=InventoryItem.objects.get(pk=self.item.pk), transaction_type='OUT',
+                    quantity=Decimal('8'), unit_price=Decimal('1.20')
+                )
+            return execute(sql, params, many, context)
+
+        interleaved = []
+        station_a = InventoryItem.objects.get(pk=self.item.pk)
+        self.assertEqual(station_a.quantity, Decimal('10'))
+        with connection.execute_wrapper(station_b_first), self.assertRaises(ValidationError):
+            InventoryTransaction.objects.create(
+                item=station_a, transaction_type='OUT', quantity=Decimal('8'), unit_price=Decimal('1.20')
+            )
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, Decimal('2'))
+        self.assertEqual(
+            list(InventoryTransaction.objects.values_list('quantity', 'balance_after')), [(Decimal('8'), Decimal('2'))]
+        )
+
+
+class InventoryAdminTests(TestCase):
+    def setUp(self):
+        self.item = InventoryItem.objects.create(
+            name='Flour', unit='kg', quantity=Decimal('10'), reorder_level=Decimal('2'), cost_per_unit=Decimal('1.20')
+        )
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def test_recorded_entries_cannot_move_stock_from_the_admin(self):
+        entry = InventoryTransaction.objects.create(
+            item=self.item, transaction_type='IN', quantity=Decimal('5'), unit_price=Decimal('1.20')
+        )
+        response = self.client.post(f'/admin/inventory/inventorytransaction/{entry.pk}/change/', {
+            'item': self.item.pk, 'transaction_type': 'OUT', 'quantity': '50', 'unit_price': '1.10', 'notes': 'Recount',
+        })
+        self.assertEqual(response.status_code, 302)
+        entry.refresh_from_db()
+        self.item.refresh_from_db()
+        self.assertEqual((entry.transaction_type, entry.quantity, entry.unit_price), ('IN', Decimal('5'), Decimal('1.10')))
+        self.assertEqual(self.item.quantity, Decimal('15'))
+
+    def test_item_edits_leave_stock_to_the_ledger(self):
+        fields = {
+            'name': 'Bread flour', 'description': '', 'unit': 'kg', 'quantity': '99',
+            'reorder_level': '3', 'supplier': '', 'cost_per_unit': '1.30',
+        }
+        for url in (f'/admin/inventory/inventoryitem/{self.item.pk}/change/', f'/inventory/{self.item.pk}/update/'):
+            self.assertEqual(self.client.post(url, fields).status_code, 302)
+        response = self.client.post('/admin/inventory/inventoryitem/', {
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1', 'form-0-id': self.item.pk,
+            'form-0-quantity': '99', 'form-0-reorder_level': '4', 'form-0-cost_per_unit': '1.30', '_save': 'Save',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.name, self.item.quantity, self.item.reorder_level), ('Bread flour', 10, 4))
+        self.assertFalse(InventoryTransaction.objects.exists())
+
+    def test_item_edits_keep_concurrent_ledger_moves(self):
+        # A station books an OUT right after the edit request has loaded the item
+        def station(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('SELECT') and 'FROM "inventory_inventoryitem"' in sql and not booked:
+                booked.append(True)
+                InventoryTransaction.objects.create(
+                    item_id=self.item.pk, transaction_type='OUT', quantity=Decimal('1'), unit_price=Decimal('1.20')
+                )
+            return result
+
+        fields = {
+            'name': 'Bread flour', 'description': '', 'unit': 'kg', 'reorder_level': '3', 'supplier': '',
+            'cost_per_unit': '1.30',
+        }
+        requests = [
+            (f'/admin/inventory/inventoryitem/{self.item.pk}/change/', fields),
+            (f'/inventory/{self.item.pk}/update/', fields),
+            ('/admin/inventory/inventoryitem/', {
+                'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1', 'form-0-id': self.item.pk,
+                'form-0-reorder_level': '4', 'form-0-cost_per_unit': '1.30', '_save': 'Save',
+            }),
+        ]
+        for url, data in requests:
+            booked = []
+            with connection.execute_wrapper(station):
+                self.assertEqual(self.client.post(url, data).status_code, 302)
+            self.assertTrue(booked)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.quantity, self.item.reorder_level), (7, 4))
+        self.assertEqual(InventoryTransaction.objects.order_by('-id').first().balance_after, self.item.quantity)
+
+
+class RecipeFixtures:
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Pizza')
+        cls.margherita = MenuItem.objects.create(name='Margherita', category=category, price=Decimal('9.00'))
+        cls.bread = MenuItem.objects.create(name='Garlic bread', category=category, price=Decimal('4.00'))
+
+    def setUp(self):
+        self.flour = InventoryItem.objects.create(
+            name='Flour', unit='kg', quantity=Decimal('10'), reorder_level=Decimal('2'), cost_per_unit=Decimal('1.20')
+        )
+        self.cheese = InventoryItem.objects.create(
+            name='Mozzarella', unit='kg', quantity=Decimal('1'), reorder_level=Decimal('1'), cost_per_unit=Decimal('9.00')
+        )
+        Recipe.objects.create(menu_item=self.margherita, inventory_item=self.flour, quantity=Decimal('250'), unit='g')
+        Recipe.objects.create(menu_item=self.margherita, inventory_item=self.cheese, quantity=Decimal('0.125'), unit='kg')
+        Recipe.objects.create(menu_item=self.bread, inventory_item=self.flour, quantity=Decimal('100'), unit='g')
+
+    def serve(self, *lines):
+        order = Order.objects.create(customer_name='Walk-in', status='SERVED')
+        for menu_item, quantity in lines:
+            OrderItem.objects.create(order=order, menu_item=menu_item, quantity=quantity, unit_price=menu_item.price)
+        return order
+
+    def stock(self, item):
+        item.refresh_from_db()
+        return item.quantity
+
+
+class RecipeConsumptionTests(RecipeFixtures, TestCase):
+    def test_completing_orders_consumes_their_ingredients(self):
+        first = self.serve((self.margherita, 2), (self.bread, 1))
+        second = self.serve((self.bread, 3))
+        with self.assertNumQueries(1):
+            usage = ingredient_usage([first.pk, second.pk])
+        self.assertEqual(usage[(first.pk, first.order_number)][self.flour.pk][0], Decimal('0.60'))
+        bulk_transition_orders([first.pk, second.pk], 'COMPLETED')
+        self.assertEqual(self.stock(self.flour), Decimal('9.10'))
+        self.assertEqual(self.stock(self.cheese), Decimal('0.75'))
+        entries = InventoryTransaction.objects.filter(item=self.flour).order_by('id')
+        self.assertEqual(
+            [(entry.transaction_type, entry.quantity, entry.balance_after) for entry in entries],
+            [('OUT', Decimal('0.60'), Decimal('9.40')), ('OUT', Decimal('0.30'), Decimal('9.10'))]
+        )
+        self.assertEqual(entries[0].notes, f'Used by order #{first.order_number}')
+
+    def test_served_food_is_booked_below_zero(self):
+        transition_order(self.serve((self.margherita, 10)).pk, 'SERVED', 'COMPLETED')
+        self.assertEqual(self.stock(self.cheese), Decimal('-0.25'))
+
+    def test_later_item_changes_do_not_consume_again(self):
+        order = self.serve((self.bread, 1))
+        transition_order(order.pk, 'SERVED', 'COMPLETED')
+        OrderItem.objects.create(order=order, menu_item=self.bread, quantity=1, unit_price=Decimal('4.00'))
+        self.assertEqual(self.stock(self.flour), Decimal('9.90'))
+
+
+class MenuAvailabilityTests(RecipeFixtures, TestCase):
+    def test_availability_follows_ingredient_stock(self):
+        self.assertTrue(MenuItem.objects.get(pk=self.margherita.pk).is_available)
+        listed = {item['name']: item['is_available'] for item in menu_catalog()['items']}
+        updated_at = MenuItem.objects.get(pk=self.margherita.pk).updated_at
+        InventoryTransaction.objects.create(
+            item=self.cheese, transaction_type='OUT', quantity=Decimal('0.90'), unit_price=Decimal('9.00')
+        )
+        self.assertFalse(MenuItem.objects.get(pk=self.margherita.pk).is_available)
+        self.assertGreater(MenuItem.objects.get(pk=self.margherita.pk).updated_at, updated_at)
+        # Every worker's cached catalog is keyed by the generation in the database
+        self.assertEqual(
+            {item['name']: item['is_available'] for item in menu_catalog()['items']},
+            dict(listed, Margherita=False),
+        )
+        self.assertTrue(MenuItem.objects.get(pk=self.bread.pk).is_available)
+        receive = InventoryTransaction(
+            item=self.cheese, transaction_type='IN', quantity=Decimal('0.05'), unit_price=Decimal('9.00')
+        )
+        generation = catalog_generation()
+        receive.save()
+        self.assertTrue(MenuItem.objects.get(pk=self.margherita.pk).is_available)
+        self.assertNotEqual(catalog_generation(), generation)
+
+    def test_bulk_stock_changes_flip_only_dependent_dishes(self):
+        soup = MenuItem.objects.create(
+            name='Soup', category=self.margherita.category, price=Decimal('5.00'), is_available=False
+        )
+        bulk_adjust_stock({self.flour.pk: Decimal('-9.95')})
+        available = dict(MenuItem.objects.values_list('name', 'is_available'))
+        self.assertEqual(available, {'Margherita': False, 'Garlic bread': False, 'Soup': False})
+        bulk_adjust_stock({self.flour.pk: Decimal('0.05')})
+        self.assertTrue(MenuItem.objects.get(pk=self.bread.pk).is_available)
+        self.assertFalse(MenuItem.objects.get(pk=self.margherita.pk).is_available)
+        self.assertFalse(MenuItem.objects.get(pk=soup.pk).is_available)
+
+    def test_recipe_changes_recheck_the_dish(self):
+        saffron = InventoryItem.objects.create(
+            name='Saffron', unit='g', quantity=Decimal('0'), reorder_level=Decimal('1'), cost_per_unit=Decimal('8.00')
+        )
+        recipe = Recipe.objects.create(menu_item=self.bread, inventory_item=saffron, quantity=Decimal('0.1'), unit='g')
+        self.assertFalse(MenuItem.objects.get(pk=self.bread.pk).is_available)
+        recipe.delete()
+        self.assertTrue(MenuItem.objects.get(pk=self.bread.pk).is_available)
+
+
+class GoodsReceiptTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier = Supplier.objects.create(
+            name='Mill', contact_person='-', email='mill@example.com', phone='555', address='-'
+        )
+        cls.flour = InventoryItem.objects.create(
+            name='Flour', unit='kg', quantity=Decimal('10'), reorder_level=Decimal('2'), cost_per_unit=Decimal('1.20')
+        )
+        cls.yeast = InventoryItem.objects.create(
+            name='Yeast', unit='g', quantity=Decimal('0'), reorder_level=Decimal('50'), cost_per_unit=Decimal('0.02')
+        )
+
+    def assertRejected(self, supplier_id, lines, keys):
+        with self.assertRaises(ValidationError) as raised:
+            receive_goods(supplier_id, lines)
+        self.assertEqual(sorted(raised.exception.message_dict), sorted(keys))
+        self.assertFalse(GoodsReceipt.objects.exists())
+        self.assertFalse(InventoryTransaction.objects.exists())
+
+    def test_invalid_receipts_book_nothing(self):
+        line = {'item': self.flour.pk, 'quantity': '5', 'unit_price': '1.10'}
+        self.assertRejected(self.supplier.pk + 1, [line], ['supplier'])
+        self.assertRejected('1; DROP', [line], ['supplier'])
+        self.assertRejected(self.supplier.pk, [], ['lines'])
+        self.assertRejected(self.supplier.pk, [line, {'item': self.flour.pk, 'quantity': '5'}], ['line 2'])
+        for quantity in ('0', '-1', '1.005', 'NaN', 'many', None):
+            self.assertRejected(self.supplier.pk, [dict(line, quantity=quantity)], ['line 1'])
+        for unit_price in ('-0.01', '1.234', 'Infinity'):
+            self.assertRejected(self.supplier.pk, [dict(line, unit_price=unit_price)], ['line 1'])
+        for item in (self.yeast.pk + 1, True, 1.5, 'flour'):
+            self.assertRejected(self.supplier.pk, [dict(line, item=item)], ['line 1'])
+        self.assertRejected(None, [line, dict(line, item=0)], ['supplier', 'line 2'])
+        self.flour.refresh_from_db()
+        self.assertEqual(self.flour.quantity, Decimal('10'))
+
+    def test_receipt_moves_stock_and_ledger_together(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            receipt = receive_goods(self.supplier.pk, [
+                {'item': self.flour.pk, 'quantity': '5', 'unit_price': '1.10'},
+                {'item': self.yeast.pk, 'quantity': 250, 'unit_price': '0.02'},
+                {'item': str(self.flour.pk), 'quantity': 2.5, 'unit_price': 1},
+            ], reference='DN-17')
+        self.assertEqual(receipt.total, Decimal('13.00'))
+        self.assertEqual(receipt.lines.count(), 3)
+        stock = dict(InventoryItem.objects.values_list('name', 'quantity'))
+        self.assertEqual(stock, {'Flour': Decimal('17.50'), 'Yeast': Decimal('250.00')})
+        entries = list(InventoryTransaction.objects.order_by('pk').values_list(
+            'item__name', 'transaction_type', 'quantity', 'balance_after', 'notes'
+        ))
+        label = f'Goods receipt #{receipt.pk} DN-17'
+        self.assertEqual(entries, [
+            ('Flour', 'IN', Decimal('5'), Decimal('15'), label),
+            ('Yeast', 'IN', Decimal('250'), Decimal('250'), label),
+            ('Flour', 'IN', Decimal('2.5'), Decimal('17.5'), label),
+        ])
+
+    def test_endpoint_reports_errors_by_line(self):
+        self.client.force_login(User.objects.create_user('clerk', password='pw'))
+        url = '/inventory/receipts/'
+        response = self.client.post(url, json.dumps({
+            'supplier': self.supplier.pk,
+            'lines': [{'item': self.flour.pk, 'quantity': '-2', 'unit_price': '1.10'}],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['line 1'])
+        self.assertEqual(self.client.post(url, '{"lines": {}}', content_type='application/json').status_code, 400)
+        response = self.client.post(url, json.dumps({
+            'supplier': self.supplier.pk,
+            'reference': 'DN-18',
+            'lines': [{'item': self.flour.pk, 'quantity': '4', 'unit_price': '1.10'}],
+        }), content_type='application/json')
+        self.assertEqual(response.json(), {
+            'success': True, 'receipt': GoodsReceipt.objects.get().pk, 'lines': 1, 'total': '4.40',
+        })
+        self.flour.refresh_from_db()
+        self.assertEqual(self.flour.quantity, Decimal('14'))
+
+
+class InventoryExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clerk')
+        supplier = Supplier.objects.create(
+            name='Mill', contact_person='-', email='mill@example.com', phone='555', address='-'
+        )
+        cls.flour = InventoryItem.objects.create(
+            name='Flour', unit='kg', quantity=Decimal('10'), reorder_level=Decimal('2'),
+            supplier=supplier, cost_per_unit=Decimal('1.20')
+        )
+        InventoryItem.objects.create(
+            name='Basil', unit='g', quantity=Decimal('40'), reorder_level=Decimal('20'), cost_per_unit=Decimal('0.05')
+        )
+        for day, transaction_type, quantity in ((1, 'IN', '5'), (2, 'OUT', '3'), (3, 'IN', '1.5')):
+            InventoryTransaction.objects.create(
+                item=cls.flour, transaction_type=transaction_type, quantity=Decimal(quantity),
+                unit_price=Decimal('1.20'), date=day_range(date(2024, 3, day))[0] + timedelta(hours=9)
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        return gzip.decompress(body) if params.get('gzip') == '1' else body
+
+    def test_inventory_csv_and_jsonl(self):
+        rows = list(csv.DictReader(StringIO(self.export('/inventory/export-inventory/').decode())))
+        self.assertEqual(
+            [(row['name'], row['quantity'], row['supplier']) for row in rows],
+            [('Basil', '40.00', ''), ('Flour', '13.50', 'Mill')],
+        )
+        lines = self.export('/inventory/export-inventory/', format='jsonl', gzip='1').decode().splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], ['Basil', 'Flour'])
+
+    def test_transactions_follow_the_period(self):
+        url = '/inventory/export-transactions/'
+        rows = list(csv.DictReader(StringIO(self.export(url).decode())))
+        self.assertEqual(
+            [(row['transaction_type'], row['quantity'], row['balance_after']) for row in rows],
+            [('IN', '5.00', '15.00'), ('OUT', '3.00', '12.00'), ('IN', '1.50', '13.50')],
+        )
+        lines = self.export(url, format='jsonl', start='2024-03-02', end='2024-03-03', gzip='1').decode().splitlines()
+        self.assertEqual([json.loads(line)['transaction_type'] for line in lines], ['OUT', 'IN'])
+        self.assertEqual(self.export(url, end='2024-03-01').decode().count('Flour'), 1)
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'format': 'xlsx'}).status_code, 400)
+
+
+class StockHistoryTests(TestCase):
+    def setUp(self):
+        self.opening = day_range(date(2024, 3, 1))[0] + timedelta(hours=8)
+        self.flour = InventoryItem.objects.create(
+            name='Flour', unit='kg', quantity=Decimal('10'), reorder_level=Decimal('2'), cost_per_unit=Decimal('1.20')
+        )
+        self.basil = InventoryItem.objects.create(
+            name='Basil', unit='g', quantity=Decimal('40'), reorder_level=Decimal('20'), cost_per_unit=Decimal('0.05')
+        )
+        StockSnapshot.objects.filter(item=self.flour).update(taken_at=self.opening, date=date(2024, 3, 1))
+        # Basil predates the snapshots, so its history is unknown
+        StockSnapshot.objects.filter(item=self.basil).delete()
+        ledger = [(1, 'IN', '5'), (2, 'OUT', '3'), (3, 'ADJ', '9'), (4, 'OUT', '1.5'), (5, 'IN', '2')]
+        for hours, transaction_type, quantity in ledger:
+            self.post(self.opening + timedelta(hours=hours), transaction_type, quantity)
+
+    def post(self, moment, transaction_type, quantity):
+        InventoryTransaction.objects.create(
+            item=self.flour, transaction_type=transaction_type, quantity=Decimal(quantity),
+            unit_price=Decimal('1.20'), date=moment
+        )
+
+    def quantities(self, moment):
+        return {item.name: item.quantity_as_of for item in stock_as_of(moment)}
+
+    def test_replay_matches_the_ledger_at_every_entry(self):
+        self.assertEqual(self.quantities(self.opening - timedelta(minutes=1)), {'Basil': None, 'Flour': None})
+        self.assertEqual(self.quantities(self.opening)['Flour'], 10)
+        balances = InventoryTransaction.objects.order_by('date').values_list('date', 'balance_after')
+        self.assertEqual([balance for _, balance in balances], [15, 12, 9, Decimal('7.5'), Decimal('9.5')])
+        for moment, balance in balances:
+            self.assertEqual(self.quantities(moment)['Flour'], balance)
+            self.assertEqual(self.quantities(moment + timedelta(minutes=30))['Flour'], balance)
+        self.flour.refresh_from_db()
+        self.assertEqual(self.quantities(timezone.now())['Flour'], self.flour.quantity)
+
+    def test_replay_starts_from_the_newest_snapshot(self):
+        self.assertEqual(take_stock_snapshot(), 2)
+        self.assertEqual(StockSnapshot.objects.count(), 3)
+        taken_at = StockSnapshot.objects.latest('taken_at').taken_at
+        self.post(taken_at + timedelta(hours=1), 'OUT', '0.5')
+        self.assertEqual(self.quantities(taken_at), {'Basil': 40, 'Flour': Decimal('9.5')})
+        self.assertEqual(self.quantities(taken_at + timedelta(hours=2)), {'Basil': 40, 'Flour': 9})
+        # Entries before the snapshot are not replayed again
+        self.post(taken_at - timedelta(minutes=1), 'IN', '100')
+        self.assertEqual(self.quantities(taken_at + timedelta(hours=2))['Flour'], 9)
+
+    def test_item_edits_keep_stock_on_the_ledger(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        fields = {
+            'name': 'Flour', 'description': 'Type 00', 'unit': 'kg', 'quantity': '50', 'reorder_level': '3',
+            'supplier': '', 'cost_per_unit': '1.20',
+        }
+        stale = InventoryItem.objects.get(pk=self.flour.pk)
+        self.post(timezone.now(), 'OUT', '0.5')
+        stale.save()
+        for url in (f'/inventory/{self.flour.pk}/update/', f'/admin/inventory/inventoryitem/{self.flour.pk}/change/'):
+            self.post(timezone.now(), 'OUT', '0.5')
+            self.assertEqual(self.client.post(url, fields).status_code, 302)
+        self.flour.refresh_from_db()
+        self.assertEqual((self.flour.description, self.flour.quantity), ('Type 00', 8))
+        self.assertEqual(self.quantities(timezone.now())['Flour'], self.flour.quantity)
+        take_stock_snapshot()
+        flour = next(row for row in stock_variance(timezone.localdate()) if row['name'] == 'Flour')
+        self.assertEqual((flour['counted'], flour['variance']), (8, 0))
+
+    def test_variance_shows_stock_moved_outside_the_ledger(self):
+        # A kilo spilled and was never booked
+        InventoryItem.objects.filter(pk=self.flour.pk).update(quantity=Decimal('8.5'))
+        take_stock_snapshot()
+        rows = stock_variance(timezone.localdate())
+        self.assertEqual(
+            [(row['name'], row['counted'], row['expected'], row['variance'], row['variance_value']) for row in rows],
+            [('Basil', 40, None, None, None), ('Flour', Decimal('8.5'), Decimal('9.5'), -1, Decimal('-1.20'))],
+        )
+        self.assertEqual(stock_variance(date(2024, 3, 1))[0]['expected'], None)
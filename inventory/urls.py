@@ -22,10 +22,14 @@ urlpatterns = [
     path('transactions/', views.TransactionListView.as_view(), name='transaction-list'),
     path('transactions/create/', views.TransactionCreateView.as_view(), name='transaction-create'),
     path('transactions/<int:pk>/', views.TransactionDetailView.as_view(), name='transaction-detail'),
+    path('receipts/', views.GoodsReceiptCreateView.as_view(), name='goods-receipt-create'),
     
     # Additional functionality
     path('low-stock/', views.LowStockItemsView.as_view(), name='low-stock'),
     path('reorder-report/', views.ReorderReportView.as_view(), name='reorder-report'),
     path('stock-adjustment/', views.StockAdjustmentView.as_view(), name='stock-adjustment'),
+    path('stock/as-of/', views.StockAsOfView.as_view(), name='stock-as-of'),
+    path('stock/variance/', views.StockVarianceView.as_view(), name='stock-variance'),
     path('export-inventory/', views.ExportInventoryView.as_view(), name='export-inventory'),
+    path('export-transactions/', views.ExportTransactionsView.as_view(), name='export-transactions'),
 ]
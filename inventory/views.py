@@ -1,11 +1,24 @@
+import json
+from datetime import timedelta
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
+from restaurant_management.dates import day_range
+from restaurant_management.exports import EXPORT_CHUNK_SIZE, StreamingExportMixin, period_lookups
+from restaurant_management.pagination import CursorPaginationMixin
 from .models import InventoryItem, Supplier, InventoryTransaction
+from .services import receive_goods
+from .stock import stock_valuation, stock_variance
 
 class InventoryItemListView(LoginRequiredMixin, ListView):
     model = InventoryItem
+    queryset = InventoryItem.objects.for_list()
     template_name = 'inventory/inventory_list.html'
     context_object_name = 'inventory_items'
     paginate_by = 10
@@ -18,7 +31,7 @@ class InventoryItemDetailView(LoginRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['transactions'] = self.object.transactions.all()[:10]
+        context['transactions'] = self.object.transactions.for_list()[:10]
         return context
 
 class InventoryItemCreateView(LoginRequiredMixin, CreateView):
@@ -35,7 +48,8 @@ class InventoryItemCreateView(LoginRequiredMixin, CreateView):
 class InventoryItemUpdateView(LoginRequiredMixin, UpdateView):
     model = InventoryItem
     template_name = 'inventory/inventory_form.html'
-    fields = ['name', 'description', 'unit', 'quantity', 'reorder_level', 'supplier', 'cost_per_unit']
+    # Stock changes go through the ledger (stock adjustment), not the item form
+    fields = ['name', 'description', 'unit', 'reorder_level', 'supplier', 'cost_per_unit']
     success_url = reverse_lazy('inventory:inventory-list')
 
     def form_valid(self, form):
@@ -86,15 +100,19 @@ class SupplierDeleteView(LoginRequiredMixin, DeleteView):
     template_name = 'inventory/supplier_confirm_delete.html'
     success_url = reverse_lazy('inventory:supplier-list')
 
-class TransactionListView(LoginRequiredMixin, ListView):
+class TransactionListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = InventoryTransaction
     template_name = 'inventory/transaction_list.html'
     context_object_name = 'transactions'
     paginate_by = 20
-    ordering = ['-date']
+    cursor_ordering = ['-date', '-id']
+
+    def get_queryset(self):
+        return InventoryTransaction.objects.for_list()
 
 class TransactionDetailView(LoginRequiredMixin, DetailView):
     model = InventoryTransaction
+    queryset = InventoryTransaction.objects.for_list()
     template_name = 'inventory/transaction_detail.html'
     context_object_name = 'transaction'
 
@@ -143,10 +161,89 @@ class StockAdjustmentView(LoginRequiredMixin, CreateView):
         form.instance.unit_price = form.instance.item.cost_per_unit
         return super().form_valid(form)
 
-class ExportInventoryView(LoginRequiredMixin, TemplateView):
-    template_name = 'inventory/export_inventory.html'
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['inventory_items'] = InventoryItem.objects.all().order_by('name')
-        return context
+class ExportInventoryView(LoginRequiredMixin, StreamingExportMixin, View):
+    """Current stock of every item as CSV or JSON lines"""
+    export_name = 'inventory'
+    export_columns = ['id', 'name', 'unit', 'quantity', 'reorder_level', 'cost_per_unit', 'supplier', 'updated_at']
+
+    def get_export_rows(self, fmt, start, end):
+        return InventoryItem.objects.order_by('name', 'id').values_list(
+            'id', 'name', 'unit', 'quantity', 'reorder_level', 'cost_per_unit', 'supplier__name', 'updated_at'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+class ExportTransactionsView(LoginRequiredMixin, StreamingExportMixin, View):
+    """The stock ledger, oldest first, optionally limited to ?start= / ?end="""
+    export_name = 'inventory-transactions'
+    export_columns = [
+        'id', 'date', 'item_id', 'item', 'transaction_type', 'quantity', 'unit_price', 'balance_after', 'notes'
+    ]
+
+    def get_export_rows(self, fmt, start, end):
+        return InventoryTransaction.objects.filter(**period_lookups('date', start, end)).order_by(
+            'date', 'id'
+        ).values_list(
+            'id', 'date', 'item_id', 'item__name', 'transaction_type', 'quantity', 'unit_price', 'balance_after', 'notes'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+# Goods receipts
+class GoodsReceiptCreateView(LoginRequiredMixin, View):
+    """Book a whole supplier delivery from JSON {"supplier", "reference", "notes", "lines": [...]}"""
+    def post(self, request):
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict) or not isinstance(payload.get('lines'), list) \
+                or not all(isinstance(line, dict) for line in payload['lines']):
+            return JsonResponse({'success': False, 'error': 'Invalid JSON payload'}, status=400)
+        try:
+            receipt = receive_goods(
+                payload.get('supplier'),
+                payload['lines'],
+                reference=str(payload.get('reference', ''))[:50],
+                notes=str(payload.get('notes', '')),
+                received_by=request.user,
+            )
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'error': 'Invalid receipt', 'errors': e.message_dict}, status=400)
+        return JsonResponse({
+            'success': True,
+            'receipt': receipt.pk,
+            'lines': len(payload['lines']),
+            'total': str(receipt.total),
+        })
+
+# Point-in-time stock
+def _parse_moment(value):
+    """Aware datetime from ISO date-time, or the end of an ISO date; None if malformed"""
+    try:
+        day = parse_date(value)
+        if day is not None:
+            return day_range(day)[1] - timedelta(microseconds=1)
+        moment = parse_datetime(value)
+    except ValueError:
+        return None
+    if moment is None or timezone.is_aware(moment):
+        return moment
+    return timezone.make_aware(moment)
+
+class StockAsOfView(LoginRequiredMixin, View):
+    """Quantity and value of every item at ?at= (a date means its end of day; default now)"""
+    def get(self, request):
+        moment = _parse_moment(request.GET['at']) if request.GET.get('at') else timezone.now()
+        if moment is None:
+            return JsonResponse({'success': False, 'error': 'at must be YYYY-MM-DD or an ISO date-time'}, status=400)
+        items, total = stock_valuation(moment)
+        return JsonResponse({'success': True, 'at': moment, 'items': items, 'total_value': total})
+
+class StockVarianceView(LoginRequiredMixin, View):
+    """Counted against ledger-expected stock for the snapshots taken on ?date="""
+    def get(self, request):
+        try:
+            day = parse_date(request.GET.get('date', ''))
+        except ValueError:
+            day = None
+        if day is None:
+            return JsonResponse({'success': False, 'error': 'date must be YYYY-MM-DD'}, status=400)
+        return JsonResponse({'success': True, 'date': day, 'items': stock_variance(day)})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MenuItem, Category
+from .models import MenuItem, MenuItemPrice, Category
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -7,6 +7,16 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name']
     ordering = ['name']
 
+class MenuItemPriceInline(admin.TabularInline):
+    model = MenuItemPrice
+    fields = ['price', 'effective_from']
+    readonly_fields = ['price', 'effective_from']
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'price', 'is_available']
@@ -14,3 +24,7 @@ class MenuItemAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     ordering = ['category', 'name']
     list_editable = ['price', 'is_available']
+    inlines = [MenuItemPriceInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
@@ -0,0 +1,63 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+
+# Generation served before any menu change has been recorded
+INITIAL_GENERATION = 'initial'
+
+
+def bump_catalog_generation():
+    """Give the catalog a new generation as part of the current transaction.
+
+    The generation is a row in the database, so every process sees the new
+    value as soon as the menu change commits, and a rollback discards both.
+    Values are random, so a cached catalog is never reused for other data.
+    """
+    from .models import CatalogGeneration
+    value = uuid.uuid4().hex
+    if not CatalogGeneration.objects.filter(pk=1).update(value=value):
+        CatalogGeneration.objects.update_or_create(pk=1, defaults={'value': value})
+
+
+def catalog_generation():
+    from .models import CatalogGeneration
+    return CatalogGeneration.objects.filter(pk=1).values_list('value', flat=True).first() or INITIAL_GENERATION
+
+
+def build_catalog():
+    from .models import Category, MenuItem
+    categories = [
+        {'id': category.pk, 'name': category.name, 'description': category.description, 'items': []}
+        for category in Category.objects.all()
+    ]
+    by_id = {category['id']: category for category in categories}
+    items = []
+    for menu_item in MenuItem.objects.for_list():
+        item = {
+            'id': menu_item.pk,
+            'name': menu_item.name,
+            'category': {'id': menu_item.category_id, 'name': menu_item.category.name},
+            'description': menu_item.description,
+            'price': str(menu_item.price),
+            'image_url': menu_item.image_url,
+            'is_available': menu_item.is_available,
+        }
+        items.append(item)
+        by_id[menu_item.category_id]['items'].append(item)
+    return {'categories': categories, 'items': items}
+
+
+def menu_catalog(generation=None):
+    """The whole menu as plain data, rebuilt only after a Category or MenuItem change.
+
+    Returns ``{"generation", "categories": [... {"items": [...]}], "items": [...]}``
+    with items in menu order (category name, then item name). Pass a
+    ``generation`` already read in this request to skip reading it again.
+    """
+    generation = generation or catalog_generation()
+    key = f'menu:catalog:{generation}'
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = dict(build_catalog(), generation=generation)
+        cache.set(key, catalog, getattr(settings, 'MENU_CATALOG_TIMEOUT', None))
+    return catalog
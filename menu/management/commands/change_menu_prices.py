@@ -0,0 +1,25 @@
+from decimal import Decimal, InvalidOperation
+from django.core.management.base import BaseCommand, CommandError
+from menu.models import Category
+from menu.pricing import change_category_prices
+
+
+class Command(BaseCommand):
+    help = 'Change every price in a category by a percentage (e.g. "--percent 5" or "--percent -10")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('category', help='Category name')
+        parser.add_argument('--percent', required=True, help='Percentage to add to each price')
+
+    def handle(self, *args, **options):
+        try:
+            percent = Decimal(options['percent'])
+        except InvalidOperation:
+            raise CommandError(f"Invalid percentage: {options['percent']}")
+        if not percent.is_finite():
+            raise CommandError(f"Invalid percentage: {options['percent']}")
+        category = Category.objects.filter(name=options['category']).first()
+        if category is None:
+            raise CommandError(f"Unknown category: {options['category']}")
+        repriced = change_category_prices(category.pk, percent)
+        self.stdout.write(self.style.SUCCESS(f'Repriced {repriced} items in {category.name}'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:15
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_price_history(apps, schema_editor):
+    # Earlier prices were overwritten; the current one is the best guess since creation
+    MenuItem = apps.get_model('menu', 'MenuItem')
+    MenuItemPrice = apps.get_model('menu', 'MenuItemPrice')
+    MenuItemPrice.objects.bulk_create([
+        MenuItemPrice(menu_item_id=pk, price=price, effective_from=created_at)
+        for pk, price, created_at in MenuItem.objects.values_list('pk', 'price', 'created_at').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=8, validators=[django.core.validators.MinValueValidator(0)])),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='menu.menuitem')),
+            ],
+            options={
+                'ordering': ['menu_item', '-effective_from'],
+                'indexes': [models.Index(fields=['menu_item', '-effective_from'], name='menuprice_item_from_idx')],
+            },
+        ),
+        migrations.RunPython(seed_price_history, migrations.RunPython.noop),
+    ]
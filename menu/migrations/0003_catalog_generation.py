@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_menu_item_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=32)),
+            ],
+        ),
+    ]
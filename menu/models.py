@@ -1,5 +1,9 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .catalog import bump_catalog_generation
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -14,6 +18,10 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class MenuItemQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('category')
+
 class MenuItem(models.Model):
     name = models.CharField(max_length=100)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='menu_items')
@@ -28,8 +36,52 @@ class MenuItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MenuItemQuerySet.as_manager()
+
     class Meta:
         ordering = ['category', 'name']
 
     def __str__(self):
         return f"{self.name} - {self.category.name}"
+
+class MenuItemPrice(models.Model):
+    """A menu item's price from ``effective_from`` until the next row for the same item"""
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='price_history')
+    price = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        validators=[MinValueValidator(0)]
+    )
+    effective_from = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['menu_item', '-effective_from']
+        indexes = [
+            # As-of lookups: the newest row at or before a moment for one item
+            models.Index(fields=['menu_item', '-effective_from'], name='menuprice_item_from_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.menu_item.name}: {self.price} from {self.effective_from:%Y-%m-%d %H:%M}"
+
+class CatalogGeneration(models.Model):
+    """Single row naming the current menu catalog; cached catalogs are keyed by ``value``"""
+    value = models.CharField(max_length=32)
+
+@receiver(post_save, sender=MenuItem)
+def record_price_change(sender, instance, created, update_fields=None, **kwargs):
+    """Append a history row whenever a save changes the price"""
+    if update_fields is not None and 'price' not in update_fields:
+        return
+    if not created:
+        latest = instance.price_history.order_by('-effective_from').values_list('price', flat=True).first()
+        if latest == instance.price:
+            return
+    MenuItemPrice.objects.create(menu_item=instance, price=instance.price)
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=MenuItem)
+def invalidate_menu_catalog(sender, **kwargs):
+    """Any menu change makes terminals fetch a fresh catalog"""
+    bump_catalog_generation()
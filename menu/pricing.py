@@ -0,0 +1,64 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import models, transaction
+from django.utils import timezone
+from .catalog import bump_catalog_generation
+from .models import MenuItem, MenuItemPrice
+
+PRICE_STEP = Decimal('0.01')
+
+
+def price_as_of(menu_item, moment):
+    """Subquery expression for an item's price at ``moment``.
+
+    Both arguments may be values or OuterRef()s, so a whole report period
+    can be joined in one query, e.g.
+    ``OrderItem.objects.annotate(list_price=price_as_of(OuterRef('menu_item'), OuterRef('order__created_at')))``.
+    """
+    return models.Subquery(
+        MenuItemPrice.objects.filter(menu_item=menu_item, effective_from__lte=moment)
+        .order_by('-effective_from').values('price')[:1],
+        output_field=models.DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def price_on(menu_item_id, moment):
+    """The price of one item at ``moment``, or None before its first recorded price"""
+    return (
+        MenuItemPrice.objects.filter(menu_item_id=menu_item_id, effective_from__lte=moment)
+        .order_by('-effective_from').values_list('price', flat=True).first()
+    )
+
+
+def change_category_prices(category_id, percent):
+    """Raise (or with a negative ``percent`` lower) every price in a category.
+
+    New prices are rounded half up to cents and written with one CASE
+    UPDATE; their history rows go in with one bulk insert sharing a single
+    ``effective_from``. Returns the number of items repriced.
+    """
+    factor = 1 + Decimal(str(percent)) / 100
+    now = timezone.now()
+    with transaction.atomic():
+        current = dict(
+            MenuItem.objects.select_for_update().filter(category_id=category_id)
+            .order_by().values_list('pk', 'price')
+        )
+        prices = {
+            pk: max((price * factor).quantize(PRICE_STEP, ROUND_HALF_UP), Decimal('0'))
+            for pk, price in current.items()
+        }
+        prices = {pk: price for pk, price in prices.items() if price != current[pk]}
+        if not prices:
+            return 0
+        MenuItem.objects.filter(pk__in=prices).update(
+            price=models.Case(
+                *[models.When(pk=pk, then=models.Value(price)) for pk, price in prices.items()],
+                output_field=models.DecimalField(),
+            ),
+            updated_at=now,
+        )
+        MenuItemPrice.objects.bulk_create([
+            MenuItemPrice(menu_item_id=pk, price=price, effective_from=now) for pk, price in prices.items()
+        ])
+        bump_catalog_generation()
+    return len(prices)
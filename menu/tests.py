@@ -1,3 +1,165 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.db.models import OuterRef
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from orders.models import Order, OrderItem
+from .catalog import catalog_generation, menu_catalog
+from .models import Category, MenuItem, MenuItemPrice
+from .pricing import change_category_prices, price_as_of, price_on
 
-# Create your tests here.
+
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Mains')
+        self.item = MenuItem.objects.create(name='Risotto', category=self.category, price=Decimal('12.00'))
+        self.opened = timezone.now() - timedelta(days=10)
+        self.changed = timezone.now() - timedelta(days=3)
+        self.item.price_history.update(effective_from=self.opened)
+        MenuItemPrice.objects.create(menu_item=self.item, price=Decimal('14.00'), effective_from=self.changed)
+        MenuItem.objects.filter(pk=self.item.pk).update(price=Decimal('14.00'))
+        self.item.refresh_from_db()
+
+    def test_saves_record_only_price_changes(self):
+        self.item.name = 'Mushroom risotto'
+        self.item.save()
+        self.item.price = Decimal('15.00')
+        self.item.save(update_fields=['name'])
+        self.assertEqual(self.item.price_history.count(), 2)
+        self.item.save()
+        self.assertEqual(self.item.price_history.order_by('-effective_from').first().price, Decimal('15.00'))
+        self.assertEqual(self.item.price_history.count(), 3)
+
+    def test_price_on_boundaries(self):
+        tick = timedelta(microseconds=1)
+        self.assertIsNone(price_on(self.item.pk, self.opened - tick))
+        self.assertEqual(price_on(self.item.pk, self.opened), Decimal('12.00'))
+        self.assertEqual(price_on(self.item.pk, self.changed - tick), Decimal('12.00'))
+        self.assertEqual(price_on(self.item.pk, self.changed), Decimal('14.00'))
+        self.assertEqual(price_on(self.item.pk, timezone.now()), Decimal('14.00'))
+
+    def test_price_as_of_joins_a_period_in_one_query(self):
+        for created_at in (self.opened - timedelta(days=1), self.changed - timedelta(hours=1), self.changed):
+            order = Order.objects.create(customer_name='Walk-in', created_at=created_at)
+            OrderItem.objects.create(order=order, menu_item=self.item, quantity=1, unit_price=Decimal('1.00'))
+        with self.assertNumQueries(1):
+            prices = list(
+                OrderItem.objects.annotate(
+                    list_price=price_as_of(OuterRef('menu_item'), OuterRef('order__created_at'))
+                ).order_by('order__created_at').values_list('list_price', flat=True)
+            )
+        self.assertEqual(prices, [None, Decimal('12.00'), Decimal('14.00')])
+
+    def test_category_price_change(self):
+        other = MenuItem.objects.create(name='Gnocchi', category=self.category, price=Decimal('9.99'))
+        MenuItem.objects.create(name='Tea', category=Category.objects.create(name='Drinks'), price=Decimal('3.00'))
+        generation = catalog_generation()
+        self.assertEqual(change_category_prices(self.category.pk, 5), 2)
+        self.assertNotEqual(catalog_generation(), generation)
+        prices = dict(MenuItem.objects.values_list('name', 'price'))
+        self.assertEqual(prices, {'Risotto': Decimal('14.70'), 'Gnocchi': Decimal('10.49'), 'Tea': Decimal('3.00')})
+        latest = MenuItemPrice.objects.filter(menu_item__in=[self.item, other]).order_by('-effective_from')[:2]
+        self.assertEqual(len({row.effective_from for row in latest}), 1)
+        self.assertEqual(price_on(other.pk, timezone.now()), Decimal('10.49'))
+
+    def test_price_change_command(self):
+        call_command('change_menu_prices', 'Mains', '--percent', '-10', stdout=StringIO())
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.price, Decimal('12.60'))
+        for percent in ['ten', 'nan', 'inf', '-Infinity', 'sNaN']:
+            with self.assertRaisesMessage(CommandError, 'Invalid percentage'):
+                call_command('change_menu_prices', 'Mains', f'--percent={percent}')
+        with self.assertRaisesMessage(CommandError, 'Unknown category'):
+            call_command('change_menu_prices', 'Desserts', '--percent', '5')
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.price, Decimal('12.60'))
+
+
+OTHER_WORKER_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-worker'}}
+LIST_TEMPLATE = {
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {'loaders': [('django.template.loaders.locmem.Loader', {
+        'menu/menu_list.html': '{% for item in menu_items %}{{ item.name }};{% endfor %}{{ categories|length }}',
+    })]},
+}
+
+
+class MenuCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.mains = Category.objects.create(name='Mains')
+        drinks = Category.objects.create(name='Drinks')
+        cls.risotto = MenuItem.objects.create(name='Risotto', category=cls.mains, price=Decimal('12.00'))
+        MenuItem.objects.create(name='Gnocchi', category=cls.mains, price=Decimal('9.50'), is_available=False)
+        MenuItem.objects.create(name='Tea', category=drinks, price=Decimal('3.00'))
+        cls.user = User.objects.create_user('waiter')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_catalog_is_built_once_per_generation(self):
+        with self.assertNumQueries(3):
+            catalog = menu_catalog()
+        with self.assertNumQueries(1):
+            self.assertEqual(menu_catalog(), catalog)
+        self.assertEqual([item['name'] for item in catalog['items']], ['Tea', 'Gnocchi', 'Risotto'])
+        self.assertEqual(
+            [(category['name'], [item['price'] for item in category['items']]) for category in catalog['categories']],
+            [('Drinks', ['3.00']), ('Mains', ['9.50', '12.00'])],
+        )
+        self.assertFalse(catalog['items'][1]['is_available'])
+
+    def test_changes_by_another_worker_are_seen(self):
+        generation = menu_catalog()['generation']
+        with override_settings(CACHES=OTHER_WORKER_CACHE):
+            self.risotto.name = 'Mushroom risotto'
+            self.risotto.save()
+        catalog = menu_catalog()
+        self.assertNotEqual(catalog['generation'], generation)
+        self.assertIn('Mushroom risotto', [item['name'] for item in catalog['items']])
+        with override_settings(CACHES=OTHER_WORKER_CACHE):
+            self.mains.delete()
+        self.assertEqual([item['name'] for item in menu_catalog()['items']], ['Tea'])
+
+    def test_rolled_back_changes_keep_the_generation(self):
+        generation = catalog_generation()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            MenuItem.objects.filter(pk=self.risotto.pk).delete()
+            self.assertNotEqual(catalog_generation(), generation)
+            raise RuntimeError
+        self.assertEqual(catalog_generation(), generation)
+
+    def test_catalog_view_answers_304_until_the_menu_changes(self):
+        response = self.client.get('/menu/catalog/')
+        self.assertEqual(len(response.json()['items']), 3)
+        with self.assertNumQueries(3):
+            # Session, user and the generation
+            self.assertEqual(self.client.get('/menu/catalog/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        MenuItem.objects.filter(pk=self.risotto.pk).update(price=Decimal('13.00'))
+        self.assertEqual(self.client.get('/menu/catalog/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.risotto.price = Decimal('13.00')
+        self.risotto.save()
+        response = self.client.get('/menu/catalog/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('13.00', [item['price'] for item in response.json()['items']])
+
+    @override_settings(TEMPLATES=[LIST_TEMPLATE])
+    def test_list_view_pages_through_the_catalog(self):
+        for number in range(10):
+            MenuItem.objects.create(name=f'Soda {number}', category=self.mains, price=Decimal('2.00'))
+        menu_catalog()
+        with self.assertNumQueries(3):
+            # Session, user and the generation; the catalog itself comes from the cache
+            response = self.client.get('/menu/')
+        self.assertEqual(response.content.decode().count(';'), 12)
+        self.assertTrue(response.content.decode().endswith(';2'))
+        self.assertEqual(self.client.get('/menu/?page=2').content.decode(), 'Soda 9;2')
+        self.assertEqual(self.client.get('/menu/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Category.objects.create(name='Desserts')
+        response = self.client.get('/menu/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.decode().endswith(';3'))
@@ -9,6 +9,7 @@ urlpatterns = [
     path('<int:pk>/', views.MenuItemDetailView.as_view(), name='menu-detail'),
     path('<int:pk>/update/', views.MenuItemUpdateView.as_view(), name='menu-update'),
     path('<int:pk>/delete/', views.MenuItemDeleteView.as_view(), name='menu-delete'),
+    path('catalog/', views.MenuCatalogView.as_view(), name='menu-catalog'),
     
     # Category URLs
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
@@ -1,22 +1,35 @@
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
+from django.http import JsonResponse
+from django.views import View
+from restaurant_management.conditional import ConditionalGetMixin
+from .catalog import catalog_generation, menu_catalog
 from .models import MenuItem, Category
 
-class MenuItemListView(LoginRequiredMixin, ListView):
+class MenuItemListView(LoginRequiredMixin, ConditionalGetMixin, ListView):
+    """Pages through the cached menu catalog instead of querying the menu tables"""
     model = MenuItem
     template_name = 'menu/menu_list.html'
     context_object_name = 'menu_items'
     paginate_by = 12
-    ordering = ['category', 'name']
+
+    def get_validator(self, request, *args, **kwargs):
+        self.generation = catalog_generation()
+        return f'menu-{self.generation}'
+
+    def get_queryset(self):
+        self.catalog = menu_catalog(self.generation)
+        return self.catalog['items']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = self.catalog['categories']
         return context
 
 class MenuItemDetailView(LoginRequiredMixin, DetailView):
     model = MenuItem
+    queryset = MenuItem.objects.for_list()
     template_name = 'menu/menu_detail.html'
     context_object_name = 'menu_item'
 
@@ -69,3 +82,12 @@ class CategoryDeleteView(LoginRequiredMixin, DeleteView):
     model = Category
     template_name = 'menu/category_confirm_delete.html'
     success_url = reverse_lazy('menu:category-list')
+
+class MenuCatalogView(LoginRequiredMixin, ConditionalGetMixin, View):
+    """The whole menu as JSON for order entry terminals"""
+    def get_validator(self, request, *args, **kwargs):
+        self.generation = catalog_generation()
+        return f'menu-{self.generation}'
+
+    def get(self, request):
+        return JsonResponse(menu_catalog(self.generation))
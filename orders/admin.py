@@ -1,5 +1,18 @@
 from django.contrib import admin
-from .models import Order, OrderItem, Table
+from .models import ArchivedOrder, ArchivedOrderItem, ArchiveSegment, Order, OrderEvent, OrderItem, Table
+from .search import search_backend
+from .services import bulk_transition_orders
+
+ADMIN_SEARCH_LIMIT = 1000
+
+
+def status_action(status, label):
+    def action(modeladmin, request, queryset):
+        updated, skipped = bulk_transition_orders(queryset.values_list('pk', flat=True), status)
+        modeladmin.message_user(request, f'{len(updated)} orders marked {status.lower()}, {len(skipped)} skipped')
+    action.__name__ = f'mark_{status.lower()}'
+    action.short_description = label
+    return action
 
 @admin.register(Table)
 class TableAdmin(admin.ModelAdmin):
@@ -20,13 +33,33 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ['status', 'created_at', 'server']
     search_fields = ['order_number', 'customer_name', 'notes']
     ordering = ['-created_at']
-    readonly_fields = ['order_number', 'created_at', 'updated_at']
+    # Status moves only through transition_order (the actions below); totals follow the items
+    readonly_fields = [
+        'order_number', 'status', 'subtotal', 'tax', 'total', 'created_at', 'updated_at', 'completed_at'
+    ]
     inlines = [OrderItemInline]
+    actions = [
+        status_action('PREPARING', 'Mark selected orders as preparing'),
+        status_action('READY', 'Mark selected orders as ready'),
+        status_action('SERVED', 'Mark selected orders as served'),
+        status_action('COMPLETED', 'Mark selected orders as completed'),
+        status_action('CANCELLED', 'Cancel selected orders'),
+    ]
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Status and totals may have moved since the page was loaded; write only what was edited
+        obj.save(update_fields=form.changed_data + ['updated_at'])
 
-    def get_readonly_fields(self, request, obj=None):
-        if obj and obj.status in ['COMPLETED', 'CANCELLED']:
-            return self.readonly_fields + ['status']
-        return self.readonly_fields
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
+    def get_search_results(self, request, queryset, search_term):
+        # Answered from the search index instead of LIKE '%term%' over every order
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=search_backend().search(search_term, limit=ADMIN_SEARCH_LIMIT)), False
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -39,3 +72,44 @@ class OrderItemAdmin(admin.ModelAdmin):
     def subtotal(self, obj):
         return obj.quantity * obj.unit_price
     subtotal.short_description = 'Subtotal'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'event_type', 'status', 'created_at']
+    list_filter = ['event_type', 'status']
+    ordering = ['-id']
+    readonly_fields = ['order', 'event_type', 'status', 'payload', 'created_at']
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ['menu_item', 'menu_item_name', 'quantity', 'unit_price', 'subtotal', 'notes', 'created_at']
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['order_number', 'table_number', 'server', 'status', 'total', 'created_at', 'archived_at']
+    list_filter = ['status', 'payment_status']
+    search_fields = ['order_number', 'customer_name']
+    ordering = ['-created_at']
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ['path', 'first_order_id', 'last_order_id', 'order_count', 'first_created_at', 'last_created_at']
+    ordering = ['-first_order_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
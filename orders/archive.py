@@ -0,0 +1,156 @@
+import gzip
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from .models import Order, ArchivedOrder, ArchivedOrderItem, ArchiveSegment
+
+
+def archive_directory():
+    return getattr(settings, 'ORDER_ARCHIVE_DIR', settings.BASE_DIR / 'archive')
+
+
+def _hour_key(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H')
+
+
+def _record(instance):
+    return {field.attname: field.value_from_object(instance) for field in instance._meta.concrete_fields}
+
+
+def _from_record(model, data):
+    values = {}
+    for field in model._meta.concrete_fields:
+        if field.attname in data:
+            values[field.attname] = field.to_python(data[field.attname])
+    return model(**values)
+
+
+def _segment_path(orders, directory):
+    return os.path.join(directory, f'orders-{orders[0].pk:012d}-{orders[-1].pk:012d}.jsonl.gz')
+
+
+def _write_segment(orders, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hourly = {}
+    with gzip.open(f'{path}.tmp', 'wt', encoding='utf-8') as segment:
+        for order in orders:
+            archived = ArchivedOrder.from_order(order)
+            line = _record(archived)
+            line.pop('archived_at')
+            line['items'] = [_record(ArchivedOrderItem.from_item(item)) for item in order.items.all()]
+            segment.write(json.dumps(line, cls=DjangoJSONEncoder) + '\n')
+            if order.status == 'COMPLETED':
+                sales, tax, count = hourly.get(_hour_key(order.created_at), ('0', '0', 0))
+                hourly[_hour_key(order.created_at)] = [
+                    str(Decimal(sales) + order.total), str(Decimal(tax) + order.tax), count + 1
+                ]
+    # The file takes its final name only once the batch's rows are gone for good
+    transaction.on_commit(lambda: os.replace(f'{path}.tmp', path))
+    created = [order.created_at for order in orders]
+    return ArchiveSegment.objects.create(
+        path=path,
+        first_order_id=orders[0].pk,
+        last_order_id=orders[-1].pk,
+        first_created_at=min(created),
+        last_created_at=max(created),
+        order_count=len(orders),
+        hourly_totals=hourly,
+    )
+
+
+def archive_orders(before, batch_size=500, fmt='db', directory=None):
+    """Move closed orders created before ``before`` out of the hot tables.
+
+    Each batch is copied and deleted in its own transaction, either into the
+    archive tables (``fmt='db'``) or into a gzipped JSONL segment file
+    (``fmt='jsonl'``). Returns the number of orders archived.
+    """
+    directory = directory or archive_directory()
+    archived = 0
+    while True:
+        path = None
+        try:
+            with transaction.atomic():
+                ids = list(
+                    Order.objects.select_for_update(skip_locked=True)
+                    .filter(status__in=Order.CLOSED_STATUSES, created_at__lt=before)
+                    .order_by('id')
+                    .values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    return archived
+                orders = list(Order.objects.for_detail().filter(pk__in=ids).order_by('id'))
+                if fmt == 'jsonl':
+                    path = _segment_path(orders, directory)
+                    _write_segment(orders, path)
+                else:
+                    ArchivedOrder.objects.bulk_create([ArchivedOrder.from_order(order) for order in orders])
+                    ArchivedOrderItem.objects.bulk_create([
+                        ArchivedOrderItem.from_item(item) for order in orders for item in order.items.all()
+                    ])
+                # Items and events go with their order through the cascade
+                Order.objects.filter(pk__in=ids).delete()
+        except Exception:
+            # The batch was rolled back, so its segment file must not survive it
+            if path is not None and os.path.exists(f'{path}.tmp'):
+                os.remove(f'{path}.tmp')
+            raise
+        archived += len(ids)
+
+
+def _read_segment(segment, pk):
+    with gzip.open(segment.path, 'rt', encoding='utf-8') as lines:
+        for line in lines:
+            data = json.loads(line)
+            if data['id'] == pk:
+                order = _from_record(ArchivedOrder, data)
+                order._segment_items = [_from_record(ArchivedOrderItem, item) for item in data['items']]
+                return order
+
+
+def find_order(pk):
+    """Look an order up in the hot table, then the archive table, then segment files.
+
+    Concurrent archivers skip each other's locked rows, so segment id ranges
+    can overlap; every segment whose range covers ``pk`` is searched.
+    """
+    order = Order.objects.for_detail().filter(pk=pk).first()
+    if order is None:
+        order = ArchivedOrder.objects.prefetch_related('items').filter(pk=pk).first()
+    if order is None:
+        for segment in ArchiveSegment.objects.filter(first_order_id__lte=pk, last_order_id__gte=pk):
+            order = _read_segment(segment, pk)
+            if order is not None:
+                break
+    return order
+
+
+def completed_order_totals(start, end):
+    """Sales, tax and count of COMPLETED orders created in [start, end) across all tiers.
+
+    Segment files only keep hourly totals, so their contribution is exact
+    for ranges that start and end on a UTC hour.
+    """
+    totals = {'sales': Decimal('0'), 'tax': Decimal('0'), 'count': 0}
+    for model in (Order, ArchivedOrder):
+        row = model.objects.filter(status='COMPLETED', created_at__gte=start, created_at__lt=end).aggregate(
+            sales=models.Sum('total', default=0),
+            tax=models.Sum('tax', default=0),
+            count=models.Count('id'),
+        )
+        for key in totals:
+            totals[key] += row[key]
+
+    segments = ArchiveSegment.objects.filter(first_created_at__lt=end, last_created_at__gte=start)
+    for hourly in segments.values_list('hourly_totals', flat=True):
+        for key, (sales, tax, count) in hourly.items():
+            hour = datetime.strptime(key, '%Y-%m-%dT%H').replace(tzinfo=dt_timezone.utc)
+            if start <= hour < end:
+                totals['sales'] += Decimal(sales)
+                totals['tax'] += Decimal(tax)
+                totals['count'] += count
+    return totals
@@ -0,0 +1,38 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from orders.archive import archive_directory, archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        'Move completed and cancelled orders older than --days into the archive tier. '
+        'Run it from cron (e.g. "15 3 * * * manage.py archive_orders") or keep it running with --every.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90),
+            help='Archive closed orders created more than this many days ago'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders moved per transaction')
+        parser.add_argument(
+            '--format', choices=['db', 'jsonl'], default='db',
+            help='Archive tables (db) or gzipped JSONL segment files (jsonl)'
+        )
+        parser.add_argument('--output-dir', help='Directory for JSONL segments')
+        parser.add_argument('--every', type=int, help='Repeat every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        directory = options['output_dir'] or archive_directory()
+        while True:
+            before = timezone.now() - timedelta(days=options['days'])
+            archived = archive_orders(before, options['batch_size'], options['format'], directory)
+            self.stdout.write(self.style.SUCCESS(f'Archived {archived} orders created before {before:%Y-%m-%d %H:%M}'))
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from orders.middleware import idempotency_cutoff
+from orders.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL_HOURS in one statement'
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=idempotency_cutoff()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
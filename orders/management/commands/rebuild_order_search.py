@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from orders.search import search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the order search index from the orders table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Orders indexed per batch')
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        with transaction.atomic():
+            indexed = backend.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} orders with {type(backend).__name__}'))
@@ -0,0 +1,51 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models.functions import Abs, Coalesce, Round
+from orders.models import Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Check stored order totals against the sum of their items and optionally repair them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Recompute the totals of mismatched orders')
+        parser.add_argument('--limit', type=int, default=20, help='Number of mismatches to list')
+
+    def handle(self, *args, **options):
+        item_sum = OrderItem.objects.filter(
+            order=models.OuterRef('pk')
+        ).values('order').annotate(
+            total=models.Sum('subtotal')
+        ).values('total')
+        expected = Coalesce(models.Subquery(item_sum), Decimal('0'), output_field=models.DecimalField())
+        expected_tax = Round(expected * Order.TAX_RATE, 2)
+
+        # Tolerate float rounding on backends that store decimals as REAL
+        mismatched = Order.objects.annotate(
+            expected_subtotal=expected,
+            subtotal_drift=Abs(models.F('subtotal') - expected),
+            tax_drift=Abs(models.F('tax') - expected_tax),
+            total_drift=Abs(models.F('total') - expected - expected_tax),
+        ).filter(
+            models.Q(subtotal_drift__gt=Decimal('0.005')) |
+            models.Q(tax_drift__gt=Decimal('0.005')) |
+            models.Q(total_drift__gt=Decimal('0.005'))
+        )
+
+        rows = list(mismatched.values_list('pk', 'order_number', 'subtotal', 'expected_subtotal'))
+        for pk, order_number, subtotal, expected_subtotal in rows[:options['limit']]:
+            self.stdout.write(f'Order #{order_number} (id {pk}): stored {subtotal}, items sum to {expected_subtotal}')
+        if len(rows) > options['limit']:
+            self.stdout.write(f'... and {len(rows) - options["limit"]} more')
+
+        if not rows:
+            self.stdout.write(self.style.SUCCESS('All order totals match their items'))
+            return
+
+        if options['fix']:
+            with transaction.atomic():
+                fixed = Order.objects.filter(pk__in=[row[0] for row in rows]).recalculate_totals()
+            self.stdout.write(self.style.SUCCESS(f'Recalculated totals for {fixed} orders'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(rows)} orders have drifted totals; rerun with --fix'))
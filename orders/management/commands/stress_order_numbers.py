@@ -0,0 +1,55 @@
+import multiprocessing
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections
+from orders.models import Order
+
+STRESS_MARKER = 'order-number-stress-test'
+
+
+def _create_orders(count):
+    # Forked children must not reuse the parent's database connection
+    connections.close_all()
+    created, failures = [], 0
+    for _ in range(count):
+        try:
+            order = Order.objects.create(customer_name=STRESS_MARKER)
+            created.append(order.order_number)
+        except IntegrityError:
+            failures += 1
+    connections.close_all()
+    return created, failures
+
+
+class Command(BaseCommand):
+    help = 'Create orders from several processes at once and check that no order number collides'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=500, help='Orders created per process')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated orders')
+
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('This stress test needs the fork start method')
+
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['processes']) as pool:
+            results = pool.map(_create_orders, [options['orders']] * options['processes'])
+
+        numbers = [number for created, _ in results for number in created]
+        failures = sum(failed for _, failed in results)
+        duplicates = [number for number, seen in Counter(numbers).items() if seen > 1]
+        stored = Order.objects.filter(customer_name=STRESS_MARKER, order_number__in=numbers).count()
+
+        self.stdout.write(
+            f'{len(numbers)} orders created by {options["processes"]} processes, '
+            f'{failures} failed inserts, {len(duplicates)} duplicate numbers, {stored} stored'
+        )
+        if not options['keep']:
+            Order.objects.filter(customer_name=STRESS_MARKER).delete()
+
+        if failures or duplicates or stored != len(numbers):
+            raise CommandError('Order number allocation produced collisions')
+        self.stdout.write(self.style.SUCCESS('No order number collisions'))
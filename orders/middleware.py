@@ -0,0 +1,105 @@
+import hashlib
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from .models import IdempotencyKey
+
+REPLAYED_HEADERS = ['Content-Type', 'Location']
+
+
+def idempotency_cutoff():
+    return timezone.now() - timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def claim_lease():
+    # A few times the worker timeout: a claim this old belongs to a worker that died mid-request
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE_SECONDS', 120))
+
+
+class IdempotencyMiddleware:
+    """Replay the stored response when a mutating request is resubmitted.
+
+    Clients send an ``Idempotency-Key`` header (or an ``idempotency_key``
+    form field). The first request claims the key by inserting a row, so a
+    concurrent duplicate gets 409 while it runs; later duplicates get the
+    stored response. Reusing a key for a different request gets 422.
+    Failed (5xx) requests release the key so they can be retried, and a
+    claim left without a response for longer than the lease (its worker
+    died) is taken over by the next retry.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD', 'OPTIONS', 'TRACE') or not request.user.is_authenticated:
+            return self.get_response(request)
+        # Read the body before POST so it stays available for hashing
+        body = request.body
+        key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key')
+        if not key:
+            return self.get_response(request)
+
+        digest = hashlib.sha256(b'\n'.join([request.method.encode(), request.get_full_path().encode(), body])).hexdigest()
+
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is not None and record.created_at < idempotency_cutoff():
+            record.delete()
+            record = None
+        if record is None:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(user=request.user, key=key, request_hash=digest)
+            except IntegrityError:
+                # A concurrent duplicate claimed the key first
+                record = IdempotencyKey.objects.get(user=request.user, key=key)
+            else:
+                return self.process(request, record)
+        if record.request_hash == digest and record.status_code is None and self.take_over(record):
+            return self.process(request, record)
+        return self.replay(record, digest)
+
+    def take_over(self, record):
+        """Claim a key whose lease ran out; only one retry wins the conditional UPDATE"""
+        now = timezone.now()
+        if record.claimed_at > now - claim_lease():
+            return False
+        claimed = IdempotencyKey.objects.filter(
+            pk=record.pk, status_code__isnull=True, claimed_at=record.claimed_at
+        ).update(claimed_at=now)
+        record.claimed_at = now
+        return bool(claimed)
+
+    def process(self, request, record):
+        # A worker that outlived its lease no longer owns the key and leaves it alone
+        claim = IdempotencyKey.objects.filter(pk=record.pk, claimed_at=record.claimed_at)
+        try:
+            response = self.get_response(request)
+        except Exception:
+            claim.delete()
+            raise
+        if response.status_code >= 500 or response.streaming:
+            claim.delete()
+            return response
+        claim.update(
+            status_code=response.status_code,
+            response_body=response.content,
+            response_headers={name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+        )
+        return response
+
+    def replay(self, record, digest):
+        if record.request_hash != digest:
+            return JsonResponse(
+                {'success': False, 'error': 'Idempotency key was already used for a different request'},
+                status=422
+            )
+        if record.status_code is None:
+            return JsonResponse({'success': False, 'error': 'Original request is still in progress'}, status=409)
+        response = HttpResponse(bytes(record.response_body), status=record.status_code)
+        for name, value in record.response_headers.items():
+            response[name] = value
+        response['Idempotent-Replayed'] = 'true'
+        return response
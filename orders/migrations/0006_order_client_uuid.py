@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
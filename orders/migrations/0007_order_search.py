@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE orders_order_fts USING fts5("
+        "order_number, customer_name, notes, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        'INSERT INTO orders_order_fts (rowid, order_number, customer_name, notes) '
+        'SELECT id, order_number, customer_name, notes FROM orders_order'
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS orders_order_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_client_uuid'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -1,9 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Round
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .signals import completed_totals_changed
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
 from menu.models import MenuItem
 from staff.models import Employee
 from django.utils import timezone
+from decimal import Decimal
+from collections import defaultdict
 
 class Table(models.Model):
     number = models.IntegerField(unique=True)
@@ -15,6 +21,40 @@ class Table(models.Model):
     def __str__(self):
         return f"Table {self.number} (Capacity: {self.capacity})"
 
+class InvalidTransition(Exception):
+    """The requested status change is not allowed from the order's status"""
+
+class StaleTransition(InvalidTransition):
+    """The order's status changed after the caller read it"""
+
+class OrderQuerySet(models.QuerySet):
+    # Named query shapes: each loads what the matching pages and __str__ touch
+    def for_list(self):
+        return self.select_related('table', 'server__user')
+
+    def for_detail(self):
+        return self.for_list().prefetch_related(
+            models.Prefetch('items', queryset=OrderItem.objects.for_list())
+        )
+
+    def for_kitchen(self):
+        return self.filter(
+            status__in=Order.KITCHEN_STATUSES
+        ).select_related('table').prefetch_related(
+            models.Prefetch('items', queryset=OrderItem.objects.select_related('menu_item'))
+        ).order_by('created_at', 'id')
+
+    def recalculate_totals(self):
+        """Recompute subtotal, tax and total from the items in one UPDATE"""
+        item_sum = OrderItem.objects.filter(
+            order=models.OuterRef('pk')
+        ).values('order').annotate(
+            total=models.Sum('subtotal')
+        ).values('total')
+        return self.update(**Order.totals_from_subtotal(
+            Coalesce(models.Subquery(item_sum), Decimal('0'), output_field=models.DecimalField())
+        ))
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -37,6 +77,21 @@ class Order(models.Model):
         ('MOBILE', 'Mobile Payment'),
     ]
 
+    # Allowed status changes; COMPLETED and CANCELLED are final
+    TRANSITIONS = {
+        'PENDING': ['PREPARING', 'CANCELLED'],
+        'PREPARING': ['READY', 'CANCELLED'],
+        'READY': ['SERVED', 'CANCELLED'],
+        'SERVED': ['COMPLETED'],
+        'COMPLETED': [],
+        'CANCELLED': [],
+    }
+
+    KITCHEN_STATUSES = ['PENDING', 'PREPARING', 'READY']
+    CLOSED_STATUSES = ['COMPLETED', 'CANCELLED']
+
+    TAX_RATE = Decimal('0.10')
+
     order_number = models.CharField(max_length=10, unique=True)
     table = models.ForeignKey(
         Table,
@@ -87,29 +142,127 @@ class Order(models.Model):
         default=0
     )
     notes = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by terminals that create orders offline, so a replayed sync is not inserted twice
+    client_uuid = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    # A default rather than auto_now_add so synced orders keep the terminal's timestamp
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    is_archived = False
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Daily/hourly analytics: status equality plus a created_at range
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # Keyset pagination and status-agnostic day ranges
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            # Floor and kitchen screens only look at open orders
+            models.Index(
+                fields=['created_at'],
+                name='order_open_created_idx',
+                condition=models.Q(status__in=['PENDING', 'PREPARING', 'READY'])
+            ),
+        ]
 
     def __str__(self):
-        return f"Order #{self.order_number} - {self.customer_name or 'Table ' + str(self.table.number)}"
+        if self.customer_name or not self.table_id:
+            return f"Order #{self.order_number} - {self.customer_name or 'Walk-in'}"
+        return f"Order #{self.order_number} - Table {self.table.number}"
+
+    @classmethod
+    def totals_from_subtotal(cls, subtotal):
+        """Update kwargs deriving tax and total from a subtotal expression"""
+        tax = Round(subtotal * cls.TAX_RATE, 2)
+        return {
+            'subtotal': subtotal,
+            'tax': tax,
+            'total': subtotal + tax,
+            'updated_at': timezone.now(),
+        }
+
+    @classmethod
+    def apply_subtotal_delta(cls, order_id, delta):
+        """Shift an order's subtotal by delta and re-derive tax and total atomically"""
+        if not delta:
+            return 0
+        # Sales already counted for a completed order move by the difference
+        completed = cls.objects.filter(pk=order_id, status='COMPLETED')
+        before = completed.select_for_update().values_list('tax', 'total').first()
+        updated = cls.objects.filter(pk=order_id).update(
+            **cls.totals_from_subtotal(models.F('subtotal') + delta)
+        )
+        if before is not None:
+            tax, total, created_at = completed.values_list('tax', 'total', 'created_at').get()
+            completed_totals_changed.send(sender=cls, changes=[{
+                'order_id': order_id,
+                'created_at': created_at,
+                'sales': total - before[1],
+                'tax': tax - before[0],
+                'count': 0,
+            }])
+        return updated
+
+    def save(self, *args, **kwargs):
+        if not self.order_number:
+            from .numbering import allocator
+            self.order_number = allocator.next_number()
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if created:
+                OrderEvent.record(self.pk, 'CREATED', self.status, {
+                    'order_number': self.order_number,
+                    'table': self.table_id,
+                })
+
+    @property
+    def line_items(self):
+        return self.items.all()
 
     def calculate_totals(self):
-        # Calculate subtotal
-        self.subtotal = sum(item.subtotal for item in self.items.all())
-        # Calculate tax (assuming 10% tax rate)
-        self.tax = self.subtotal * 0.1
-        # Calculate total
-        self.total = self.subtotal + self.tax
-        self.save()
+        # Full recomputation; item writes normally go through apply_subtotal_delta
+        Order.objects.filter(pk=self.pk).recalculate_totals()
+        self.refresh_from_db(fields=['subtotal', 'tax', 'total', 'updated_at'])
 
     def mark_completed(self):
-        self.status = 'COMPLETED'
-        self.completed_at = timezone.now()
-        self.save()
+        from .services import transition_order
+        changes = transition_order(self.pk, self.status, 'COMPLETED')
+        for field, value in changes.items():
+            setattr(self, field, value)
+
+class OrderNumberSequence(models.Model):
+    """Last order number handed out per business day"""
+    date = models.DateField(unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date}: {self.last_value}"
+
+class OrderItemQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('order__table', 'menu_item')
+
+    def delete(self):
+        # Lock the rows first so the subtracted subtotals are the deleted ones
+        with transaction.atomic(using=self.db):
+            deltas = defaultdict(Decimal)
+            for order_id, subtotal in self.select_for_update().values_list('order_id', 'subtotal'):
+                deltas[order_id] -= subtotal
+            result = super().delete()
+            for order_id, delta in deltas.items():
+                Order.apply_subtotal_delta(order_id, delta)
+            OrderEvent.objects.bulk_create([
+                OrderEvent(order_id=order_id, event_type='ITEMS', payload={'removed': True})
+                for order_id in deltas
+            ])
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
 
 class OrderItem(models.Model):
     order = models.ForeignKey(
@@ -137,6 +290,8 @@ class OrderItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderItemQuerySet.as_manager()
+
     class Meta:
         ordering = ['created_at']
 
@@ -146,6 +301,248 @@ class OrderItem(models.Model):
     def save(self, *args, **kwargs):
         # Calculate subtotal before saving
         self.subtotal = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
-        # Update order totals
-        self.order.calculate_totals()
+        with transaction.atomic():
+            previous_order_id, previous = self.order_id, Decimal('0')
+            if self.pk:
+                row = OrderItem.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('order_id', 'subtotal').first()
+                if row:
+                    previous_order_id, previous = row
+            super().save(*args, **kwargs)
+            # Apply only the change in subtotal to the order
+            if previous_order_id != self.order_id:
+                Order.apply_subtotal_delta(previous_order_id, -previous)
+                previous = Decimal('0')
+            Order.apply_subtotal_delta(self.order_id, self.subtotal - previous)
+            OrderEvent.record(self.order_id, 'ITEMS', payload={'item': self.pk})
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            subtotal = OrderItem.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('subtotal', flat=True).first()
+            result = super().delete(*args, **kwargs)
+            if subtotal is not None:
+                Order.apply_subtotal_delta(self.order_id, -subtotal)
+                OrderEvent.record(self.order_id, 'ITEMS', payload={'removed': True})
+        return result
+
+class OrderEvent(models.Model):
+    """Append-only feed of order changes followed by the kitchen and expo displays"""
+    EVENT_TYPES = [
+        ('CREATED', 'Order Created'),
+        ('ITEMS', 'Items Changed'),
+        ('STATUS', 'Status Changed'),
+    ]
+
+    # Which events each display station follows
+    STATION_FILTERS = {
+        'kitchen': models.Q(event_type__in=['CREATED', 'ITEMS']) | models.Q(status__in=['PREPARING', 'CANCELLED']),
+        'expo': models.Q(status__in=['READY', 'SERVED', 'COMPLETED', 'CANCELLED']),
+    }
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='events'
+    )
+    event_type = models.CharField(max_length=10, choices=EVENT_TYPES)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} - order {self.order_id}"
+
+    @classmethod
+    def record(cls, order_id, event_type, status='', payload=None):
+        return cls.objects.create(
+            order_id=order_id,
+            event_type=event_type,
+            status=status,
+            payload=payload or {}
+        )
+
+    def as_dict(self):
+        return {
+            'id': self.pk,
+            'order': self.order_id,
+            'type': self.event_type,
+            'status': self.status,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat(),
+        }
+
+class ArchivedOrder(models.Model):
+    """Closed order moved out of the hot Order table; keeps the original id"""
+    id = models.BigIntegerField(primary_key=True)
+    order_number = models.CharField(max_length=10, unique=True)
+    table_number = models.IntegerField(null=True, blank=True)
+    server = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_orders'
+    )
+    customer_name = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    payment_method = models.CharField(
+        max_length=20,
+        choices=Order.PAYMENT_METHOD_CHOICES,
+        null=True,
+        blank=True
+    )
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    tax = models.DecimalField(max_digits=10, decimal_places=2)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='archorder_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_number} - {self.customer_name or 'Table ' + str(self.table_number)} (archived)"
+
+    @classmethod
+    def from_order(cls, order):
+        return cls(
+            id=order.pk,
+            order_number=order.order_number,
+            table_number=order.table.number if order.table_id else None,
+            server_id=order.server_id,
+            customer_name=order.customer_name,
+            status=order.status,
+            payment_status=order.payment_status,
+            payment_method=order.payment_method,
+            subtotal=order.subtotal,
+            tax=order.tax,
+            total=order.total,
+            notes=order.notes,
+            created_at=order.created_at,
+            updated_at=order.updated_at,
+            completed_at=order.completed_at,
+        )
+
+    @property
+    def line_items(self):
+        # Orders read back from a segment file carry their items in memory
+        if hasattr(self, '_segment_items'):
+            return self._segment_items
+        return self.items.all()
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    menu_item = models.ForeignKey(
+        MenuItem,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_order_items'
+    )
+    menu_item_name = models.CharField(max_length=100)
+    quantity = models.IntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.quantity}x {self.menu_item_name}"
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(
+            id=item.pk,
+            order_id=item.order_id,
+            menu_item_id=item.menu_item_id,
+            menu_item_name=item.menu_item.name,
+            quantity=item.quantity,
+            unit_price=item.unit_price,
+            subtotal=item.subtotal,
+            notes=item.notes,
+            created_at=item.created_at,
+        )
+
+class ArchiveSegment(models.Model):
+    """Compressed JSONL file holding archived orders, with the totals reports need"""
+    path = models.CharField(max_length=255, unique=True)
+    first_order_id = models.BigIntegerField()
+    last_order_id = models.BigIntegerField()
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    order_count = models.IntegerField()
+    # Completed-order totals per UTC hour: {"2024-03-01T13": ["sales", "tax", count]}
+    hourly_totals = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['first_order_id']
+        indexes = [
+            models.Index(fields=['first_order_id', 'last_order_id'], name='archseg_order_range_idx'),
+            models.Index(fields=['first_created_at', 'last_created_at'], name='archseg_created_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.path} ({self.order_count} orders)"
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a mutating request sent with an Idempotency-Key"""
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    request_hash = models.CharField(max_length=64)
+    # Null while the first request is still being processed
+    status_code = models.IntegerField(null=True, blank=True)
+    response_body = models.BinaryField(blank=True)
+    response_headers = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    # When the request now in progress took the key; a retry may take it over once the lease runs out
+    claimed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'in progress'})"
+
+# Saves touching these fields reindex the order. Queryset .update() and bulk_create() send no
+# post_save: code using them on these fields must call search_backend().index() itself
+# (sync and counter orders do), or run the rebuild_order_search command afterwards.
+SEARCH_FIELDS = {'order_number', 'customer_name', 'notes'}
+
+@receiver(post_save, sender=Order)
+def index_order(sender, instance, update_fields=None, **kwargs):
+    """Keep the order search index in step with saved orders"""
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        from .search import search_backend
+        search_backend().index([instance])
+
+@receiver(post_delete, sender=Order)
+def unindex_order(sender, instance, **kwargs):
+    from .search import search_backend
+    search_backend().remove([instance.pk])
@@ -0,0 +1,129 @@
+import os
+import threading
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+from .models import OrderNumberSequence
+
+MAX_DAILY_ORDERS = 9999
+
+
+def format_order_number(day, value):
+    """Human-friendly ticket number: YYMMDD plus a four digit daily counter"""
+    return f"{day:%y%m%d}{value:04d}"
+
+
+class OrderNumberAllocator:
+    """Hands out per-day order numbers from blocks reserved in OrderNumberSequence.
+
+    Each worker process reserves ``block_size`` numbers with a single
+    ``UPDATE ... SET last_value = last_value + n`` and serves allocations from
+    memory until the block runs out. Blocks are disjoint across processes, so
+    numbers never collide; numbers left over when a process exits are skipped.
+
+    The reservation runs inside the caller's transaction when there is one;
+    the unused part of the block only becomes shared once that transaction
+    commits, so a rollback cannot leak numbers that another worker will reuse.
+    Until then later allocations in the same transaction keep drawing on it,
+    so a long transaction reserves one block rather than one per order.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', 20)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._day = None
+        self._next = 1
+        self._end = 0
+        # Uncommitted blocks by thread, since each thread has its own transaction
+        self._pending = {}
+
+    def next_number(self):
+        return self.allocate(1)[0]
+
+    def allocate(self, count):
+        """Return ``count`` unused order numbers for today"""
+        day = timezone.localdate()
+        with self._lock:
+            # Blocks reserved before a fork belong to the parent process
+            if self._pid != os.getpid() or self._day != day:
+                self._reset()
+                self._day = day
+
+            values = list(range(self._next, min(self._next + count, self._end + 1)))
+            self._next += len(values)
+
+            pending = self._pending_block(day)
+            if pending is not None and len(values) < count:
+                values.extend(pending.take(count - len(values)))
+
+            missing = count - len(values)
+            if missing:
+                start, end = self._reserve(day, max(self.block_size, missing))
+                values.extend(range(start, start + missing))
+                pending = _PendingBlock(self, day, start + missing, end)
+                self._pending[threading.get_ident()] = pending
+                transaction.on_commit(pending.publish)
+
+        if values[-1] > MAX_DAILY_ORDERS:
+            raise ValidationError("Daily order number capacity exhausted")
+        return [format_order_number(day, value) for value in values]
+
+    def _reserve(self, day, size):
+        with transaction.atomic():
+            updated = OrderNumberSequence.objects.filter(date=day).update(
+                last_value=models.F('last_value') + size
+            )
+            if not updated:
+                OrderNumberSequence.objects.get_or_create(date=day)
+                OrderNumberSequence.objects.filter(date=day).update(
+                    last_value=models.F('last_value') + size
+                )
+            # The row stays locked by our UPDATE, so this reads our own increment
+            end = OrderNumberSequence.objects.filter(date=day).values_list(
+                'last_value', flat=True
+            ).get()
+        return end - size + 1, end
+
+    def _pending_block(self, day):
+        pending = self._pending.get(threading.get_ident())
+        if pending is None or pending.day != day:
+            return None
+        # A commit runs the callback and a rollback discards it, along with the reservation
+        connection = transaction.get_connection()
+        if not any(callback == pending.publish for _, callback, _ in connection.run_on_commit):
+            del self._pending[threading.get_ident()]
+            return None
+        return pending
+
+    def _publish(self, day, start, end):
+        with self._lock:
+            if self._pid == os.getpid() and self._day == day and self._next > self._end:
+                self._next, self._end = start, end
+
+
+class _PendingBlock:
+    """Rest of a block reserved in a transaction that has not committed yet"""
+
+    def __init__(self, allocator, day, start, end):
+        self.allocator = allocator
+        self.day = day
+        self.next = start
+        self.end = end
+
+    def take(self, count):
+        values = range(self.next, min(self.next + count, self.end + 1))
+        self.next += len(values)
+        return values
+
+    def publish(self):
+        if self.allocator._pending.get(threading.get_ident()) is self:
+            del self.allocator._pending[threading.get_ident()]
+        self.allocator._publish(self.day, self.next, self.end)
+
+
+allocator = OrderNumberAllocator()
@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from .models import Order
+
+FTS_TABLE = 'orders_order_fts'
+
+
+class DatabaseSearchBackend:
+    """Plain ORM lookups; works everywhere and needs no index maintenance"""
+
+    def index(self, orders):
+        pass
+
+    def remove(self, ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, term, limit=20):
+        return list(
+            Order.objects.filter(
+                Q(order_number__startswith=term) | Q(customer_name__icontains=term) | Q(notes__icontains=term)
+            ).order_by('-id').values_list('id', flat=True)[:limit]
+        )
+
+    def rebuild(self, batch_size=2000):
+        self.clear()
+        indexed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Order.objects.filter(pk__gt=last_id).order_by('pk')
+                .only('id', 'order_number', 'customer_name', 'notes')[:batch_size]
+            )
+            if not batch:
+                return indexed
+            self.index(batch)
+            indexed += len(batch)
+            last_id = batch[-1].pk
+
+
+class SQLiteSearchBackend(DatabaseSearchBackend):
+    """FTS5 trigram index keyed by order id, so any substring of three or more characters matches"""
+
+    def index(self, orders):
+        rows = [(order.pk, order.order_number, order.customer_name, order.notes) for order in orders]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            self._delete(cursor, [row[0] for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, order_number, customer_name, notes) VALUES (%s, %s, %s, %s)',
+                rows
+            )
+
+    def remove(self, ids):
+        if ids:
+            with connection.cursor() as cursor:
+                self._delete(cursor, list(ids))
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def _delete(self, cursor, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+
+    def search(self, term, limit=20):
+        term = term.strip()
+        if len(term) < 3:
+            # Trigrams need three characters; short terms only make sense as a ticket prefix
+            return list(
+                Order.objects.filter(order_number__startswith=term)
+                .order_by('-id').values_list('id', flat=True)[:limit]
+            )
+        phrase = '"' + term.replace('"', '""') + '"'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s',
+                [phrase, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backend = None
+
+
+def search_backend():
+    """The backend named by ORDER_SEARCH_BACKEND, or FTS5 on SQLite and ORM lookups elsewhere"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'ORDER_SEARCH_BACKEND', None)
+        if path is None:
+            path = 'orders.search.SQLiteSearchBackend' if connection.vendor == 'sqlite' \
+                else 'orders.search.DatabaseSearchBackend'
+        _backend = import_string(path)()
+    return _backend
+
+
+def search_orders(term, limit=20):
+    """Orders matching ``term`` in number, customer name or notes, newest first"""
+    ids = search_backend().search(term, limit)
+    return Order.objects.for_list().filter(pk__in=ids).order_by('-id')
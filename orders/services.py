@@ -0,0 +1,455 @@
+import uuid
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from menu.models import MenuItem
+from .models import InvalidTransition, Order, OrderEvent, OrderItem, StaleTransition, Table
+from .search import search_backend
+from .signals import completed_totals_changed
+
+
+# Order and item amounts are DECIMAL(10, 2)
+AMOUNT_LIMIT = Decimal('100000000')
+# Ids and quantities must fit the database's integer columns
+ID_LIMIT = 2 ** 63
+QUANTITY_LIMIT = 2 ** 31
+
+
+def _to_price(value, field):
+    try:
+        price = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValidationError(f"Invalid {field}: {value!r}")
+    if not price.is_finite() or price < 0 or price >= AMOUNT_LIMIT:
+        raise ValidationError(f"{field} must be between 0 and {AMOUNT_LIMIT - Decimal('0.01')}")
+    if price != price.quantize(Decimal('0.01')):
+        raise ValidationError(f"{field} must have at most two decimals")
+    return price
+
+
+def _subtotal(quantity, unit_price):
+    subtotal = quantity * unit_price
+    if subtotal >= AMOUNT_LIMIT:
+        raise ValidationError(f"Line total {subtotal} is too large")
+    return subtotal
+
+
+def _to_text(value, field, max_length=None):
+    if not isinstance(value, str):
+        raise ValidationError(f"Invalid {field}: {value!r}")
+    if max_length is not None and len(value) > max_length:
+        raise ValidationError(f"{field} must be at most {max_length} characters")
+    return value
+
+
+def _to_datetime(value, field):
+    moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise ValidationError(f"Invalid {field}: {value!r}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _to_quantity(value):
+    try:
+        if isinstance(value, (bool, float)):
+            raise TypeError
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Invalid quantity: {value!r}")
+    if not 1 <= quantity < QUANTITY_LIMIT:
+        raise ValidationError(f"Quantity must be between 1 and {QUANTITY_LIMIT - 1}")
+    return quantity
+
+
+def _to_id(value, field):
+    # bool is an int subclass but never a valid id
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value < ID_LIMIT:
+        raise ValidationError(f"Invalid {field}: {value!r}")
+    return value
+
+
+def _menu_item_id(entry):
+    if not isinstance(entry, dict):
+        raise ValidationError(f"Invalid item: {entry!r}")
+    if 'menu_item' not in entry:
+        raise ValidationError("Each item needs a menu_item")
+    return _to_id(entry['menu_item'], 'menu_item')
+
+
+def save_order_items(order, items, replace=False):
+    """Create or update (by ``id``) an order's items in one transaction; ``replace`` deletes unlisted lines"""
+    if not items and not replace:
+        raise ValidationError("No items given")
+
+    menu_ids = set()
+    existing_ids = set()
+    for entry in items:
+        menu_ids.add(_menu_item_id(entry))
+        if entry.get('id'):
+            existing_ids.add(_to_id(entry['id'], 'id'))
+
+    with transaction.atomic():
+        menu_items = MenuItem.objects.in_bulk(menu_ids)
+        missing = menu_ids - set(menu_items)
+        if missing:
+            raise ValidationError(f"Unknown menu items: {sorted(missing)}")
+
+        existing = {}
+        if existing_ids:
+            existing = order.items.select_for_update().in_bulk(existing_ids)
+            unknown = existing_ids - set(existing)
+            if unknown:
+                raise ValidationError(f"Unknown order items: {sorted(unknown)}")
+
+        now = timezone.now()
+        delta = Decimal('0')
+        to_create = []
+        to_update = []
+        for entry in items:
+            menu_item = menu_items[entry['menu_item']]
+            quantity = _to_quantity(entry.get('quantity', 1))
+            if entry.get('unit_price') is not None:
+                unit_price = _to_price(entry['unit_price'], 'unit_price')
+            else:
+                unit_price = menu_item.price
+
+            if entry.get('id'):
+                item = existing[entry['id']]
+                item.menu_item = menu_item
+                item.quantity = quantity
+                item.unit_price = unit_price
+                delta -= item.subtotal
+                item.subtotal = _subtotal(quantity, unit_price)
+                item.notes = _to_text(entry.get('notes', item.notes), 'notes')
+                item.updated_at = now
+                to_update.append(item)
+            else:
+                to_create.append(OrderItem(
+                    order=order,
+                    menu_item=menu_item,
+                    quantity=quantity,
+                    unit_price=unit_price,
+                    subtotal=_subtotal(quantity, unit_price),
+                    notes=_to_text(entry.get('notes', ''), 'notes')
+                ))
+            delta += quantity * unit_price
+
+        if replace:
+            # The item queryset delete subtracts the removed lines itself
+            order.items.exclude(pk__in=existing_ids).delete()
+        if to_update:
+            OrderItem.objects.bulk_update(
+                to_update,
+                ['menu_item', 'quantity', 'unit_price', 'subtotal', 'notes', 'updated_at']
+            )
+        if to_create:
+            OrderItem.objects.bulk_create(to_create)
+
+        Order.apply_subtotal_delta(order.pk, delta)
+        OrderEvent.record(order.pk, 'ITEMS', payload={'count': len(items), 'replace': replace})
+        order.refresh_from_db(fields=['subtotal', 'tax', 'total', 'updated_at'])
+
+    return to_update + to_create
+
+
+def _send_completions(queryset):
+    completed_totals_changed.send(sender=Order, changes=[
+        {'order_id': pk, 'created_at': created_at, 'sales': total, 'tax': tax, 'count': 1}
+        for pk, created_at, total, tax in queryset.values_list('pk', 'created_at', 'total', 'tax')
+    ])
+
+
+def transition_order(order_id, from_status, to_status):
+    """Compare-and-set status change that also logs an OrderEvent; returns the written fields"""
+    if to_status not in Order.TRANSITIONS.get(from_status, []):
+        raise InvalidTransition(f"Cannot change an order from {from_status} to {to_status}")
+
+    now = timezone.now()
+    changes = {'status': to_status, 'updated_at': now}
+    if to_status == 'COMPLETED':
+        changes['completed_at'] = now
+
+    with transaction.atomic():
+        updated = Order.objects.filter(pk=order_id, status=from_status).update(**changes)
+        if not updated:
+            raise StaleTransition(f"Order is no longer {from_status}")
+        OrderEvent.record(order_id, 'STATUS', to_status, {'from': from_status})
+        if to_status == 'COMPLETED':
+            _send_completions(Order.objects.filter(pk=order_id))
+    return changes
+
+
+
+def bulk_transition_orders(order_ids, to_status):
+    """Move every order allowed to reach ``to_status`` with one UPDATE; returns (updated ids, skipped ids)"""
+    sources = [status for status, targets in Order.TRANSITIONS.items() if to_status in targets]
+    if not sources:
+        raise InvalidTransition(f"No order can change to {to_status}")
+    order_ids = set(order_ids)
+
+    now = timezone.now()
+    changes = {'status': to_status, 'updated_at': now}
+    if to_status == 'COMPLETED':
+        changes['completed_at'] = now
+
+    with transaction.atomic():
+        current = dict(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status__in=sources)
+            .values_list('pk', 'status')
+        )
+        if current:
+            Order.objects.filter(pk__in=current, status__in=sources).update(**changes)
+            OrderEvent.objects.bulk_create([
+                OrderEvent(order_id=pk, event_type='STATUS', status=to_status, payload={'from': from_status})
+                for pk, from_status in current.items()
+            ])
+            if to_status == 'COMPLETED':
+                _send_completions(Order.objects.filter(pk__in=current))
+    return sorted(current), sorted(order_ids - set(current))
+
+def _totals(items):
+    # Same rounding as Order.totals_from_subtotal() applies in SQL
+    subtotal = sum((item.subtotal for item in items), Decimal('0'))
+    tax = (subtotal * Order.TAX_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    if subtotal + tax >= AMOUNT_LIMIT:
+        raise ValidationError(f"Order total {subtotal + tax} is too large")
+    return {'subtotal': subtotal, 'tax': tax, 'total': subtotal + tax}
+
+
+def _build_synced_order(record, menu_items, tables, now):
+    """Validate one offline record and return the unsaved order, its items and status steps"""
+    errors = []
+    table = None
+    if record.get('table') is not None:
+        table = tables.get(record['table']) if type(record['table']) is int else None
+        if table is None:
+            errors.append(f"Unknown table: {record['table']!r}")
+
+    created_at = now
+    if record.get('created_at'):
+        created_at = _to_datetime(record['created_at'], 'created_at')
+
+    entries = record.get('items') or []
+    if not isinstance(entries, list):
+        raise ValidationError("items must be a list")
+    items = []
+    for entry in entries:
+        menu_item = menu_items.get(_menu_item_id(entry))
+        if menu_item is None:
+            errors.append(f"Unknown menu item: {entry['menu_item']!r}")
+            continue
+        quantity = _to_quantity(entry.get('quantity', 1))
+        if entry.get('unit_price') is not None:
+            unit_price = _to_price(entry['unit_price'], 'unit_price')
+        else:
+            unit_price = menu_item.price
+        items.append(OrderItem(
+            menu_item=menu_item,
+            quantity=quantity,
+            unit_price=unit_price,
+            subtotal=_subtotal(quantity, unit_price),
+            notes=_to_text(entry.get('notes', ''), 'notes')
+        ))
+    if not items:
+        errors.append("No items given")
+
+    status = 'PENDING'
+    steps = []
+    completed_at = None
+    history = record.get('status_history') or []
+    if not isinstance(history, list) or not all(isinstance(step, dict) for step in history):
+        raise ValidationError("status_history must be a list of objects")
+    for step in history:
+        to_status = step.get('status')
+        if to_status not in Order.TRANSITIONS.get(status, []):
+            errors.append(f"Cannot change an order from {status} to {to_status}")
+            break
+        at = _to_datetime(step['at'], 'status_history.at') if step.get('at') else now
+        if to_status == 'COMPLETED':
+            completed_at = at
+        steps.append((status, to_status))
+        status = to_status
+
+    payment_status, payment_method = 'UNPAID', None
+    payments = record.get('payments') or []
+    if payments:
+        if not isinstance(payments, list) or not all(isinstance(payment, dict) for payment in payments):
+            raise ValidationError("payments must be a list of objects")
+        # Orders keep a single payment; the latest one recorded on the terminal wins
+        payment_method = payments[-1].get('method')
+        payment_status = payments[-1].get('status', 'PAID')
+        if not isinstance(payment_method, str) or payment_method not in dict(Order.PAYMENT_METHOD_CHOICES):
+            errors.append(f"Invalid payment method: {payment_method!r}")
+        if not isinstance(payment_status, str) or payment_status not in dict(Order.PAYMENT_STATUS_CHOICES):
+            errors.append(f"Invalid payment status: {payment_status!r}")
+
+    customer_name = _to_text(
+        record.get('customer_name', ''), 'customer_name', Order._meta.get_field('customer_name').max_length
+    )
+    notes = _to_text(record.get('notes', ''), 'notes')
+    if errors:
+        raise ValidationError(errors)
+
+    order = Order(
+        table=table,
+        customer_name=customer_name,
+        notes=notes,
+        status=status,
+        payment_status=payment_status,
+        payment_method=payment_method,
+        **_totals(items),
+        created_at=created_at,
+        completed_at=completed_at,
+    )
+    return order, items, steps
+
+
+def sync_orders(records, server=None):
+    """Bulk-insert orders recorded offline by POS terminals; returns one result per record, in input order"""
+    now = timezone.now()
+    results = []
+    pending = []
+    seen = set()
+    for record in records:
+        try:
+            client_uuid = uuid.UUID(str(record.get('client_uuid')))
+        except ValueError:
+            results.append({'client_uuid': record.get('client_uuid'), 'result': 'error',
+                            'errors': ['Invalid client_uuid']})
+            continue
+        result = {'client_uuid': str(client_uuid)}
+        if client_uuid in seen:
+            result.update(result='error', errors=['client_uuid repeated in batch'])
+        else:
+            seen.add(client_uuid)
+            pending.append((client_uuid, record, result))
+        results.append(result)
+
+    # Malformed ids are left out here and reported per record below
+    menu_ids = [
+        entry.get('menu_item') for _, record, _ in pending
+        if isinstance(record.get('items'), list) for entry in record['items'] if isinstance(entry, dict)
+    ]
+    table_ids = [record.get('table') for _, record, _ in pending]
+    menu_items = MenuItem.objects.in_bulk({pk for pk in menu_ids if isinstance(pk, int)})
+    tables = Table.objects.in_bulk({pk for pk in table_ids if isinstance(pk, int)})
+
+    with transaction.atomic():
+        existing = dict(
+            Order.objects.filter(client_uuid__in=seen).values_list('client_uuid', 'order_number')
+        )
+        batch = []
+        for client_uuid, record, result in pending:
+            if client_uuid in existing:
+                result.update(result='duplicate', order_number=existing[client_uuid])
+                continue
+            try:
+                order, items, steps = _build_synced_order(record, menu_items, tables, now)
+            except ValidationError as e:
+                result.update(result='error', errors=e.messages)
+                continue
+            order.client_uuid = client_uuid
+            order.server = server
+            batch.append((order, items, steps, result))
+
+        if not batch:
+            return results
+
+        from .numbering import allocator
+        for (order, _, _, _), number in zip(batch, allocator.allocate(len(batch))):
+            order.order_number = number
+        Order.objects.bulk_create([order for order, _, _, _ in batch])
+
+        items, events = [], []
+        for order, order_items, steps, result in batch:
+            for item in order_items:
+                item.order = order
+                items.append(item)
+            events.append(OrderEvent(order=order, event_type='CREATED', status='PENDING', payload={
+                'order_number': order.order_number,
+                'table': order.table_id,
+            }))
+            events.append(OrderEvent(order=order, event_type='ITEMS', payload={
+                'count': len(order_items),
+                'replace': False,
+            }))
+            events.extend(
+                OrderEvent(order=order, event_type='STATUS', status=to_status, payload={'from': from_status})
+                for from_status, to_status in steps
+            )
+            result.update(result='created', id=order.pk, order_number=order.order_number, total=str(order.total))
+        OrderItem.objects.bulk_create(items)
+        OrderEvent.objects.bulk_create(events)
+        # bulk_create sends no post_save, so the search index is fed here
+        search_backend().index([order for order, _, _, _ in batch])
+        completed_totals_changed.send(sender=Order, changes=[
+            {'order_id': order.pk, 'created_at': order.created_at, 'sales': order.total, 'tax': order.tax, 'count': 1}
+            for order, _, _, _ in batch if order.status == 'COMPLETED'
+        ])
+
+    return results
+
+
+def create_counter_order(items, server=None, table=None, customer_name='', notes='', payment_method=None):
+    """Create a complete order with its items, at menu prices, and optionally mark it paid"""
+    if not items:
+        raise ValidationError("No items given")
+    if payment_method is not None and (
+        not isinstance(payment_method, str) or payment_method not in dict(Order.PAYMENT_METHOD_CHOICES)
+    ):
+        raise ValidationError(f"Invalid payment method: {payment_method!r}")
+    customer_name = _to_text(customer_name, 'customer_name', Order._meta.get_field('customer_name').max_length)
+    notes = _to_text(notes, 'notes')
+
+    menu_items = MenuItem.objects.order_by().in_bulk({_menu_item_id(entry) for entry in items})
+
+    errors = []
+    order_items = []
+    for entry in items:
+        menu_item = menu_items.get(entry['menu_item'])
+        if menu_item is None:
+            errors.append(f"Unknown menu item: {entry['menu_item']!r}")
+        elif not menu_item.is_available:
+            errors.append(f"{menu_item.name} is not available")
+        else:
+            quantity = _to_quantity(entry.get('quantity', 1))
+            order_items.append(OrderItem(
+                menu_item=menu_item,
+                quantity=quantity,
+                unit_price=menu_item.price,
+                subtotal=_subtotal(quantity, menu_item.price),
+                notes=_to_text(entry.get('notes', ''), 'notes')
+            ))
+    if errors:
+        raise ValidationError(errors)
+
+    from .numbering import allocator
+    order = Order(
+        order_number=allocator.next_number(),
+        table=table,
+        server=server,
+        customer_name=customer_name,
+        notes=notes,
+        payment_status='PAID' if payment_method else 'UNPAID',
+        payment_method=payment_method,
+        **_totals(order_items),
+    )
+    with transaction.atomic():
+        Order.objects.bulk_create([order])
+        for item in order_items:
+            item.order = order
+        OrderItem.objects.bulk_create(order_items)
+        OrderEvent.objects.bulk_create([
+            OrderEvent(order=order, event_type='CREATED', status=order.status, payload={
+                'order_number': order.order_number,
+                'table': order.table_id,
+            }),
+            OrderEvent(order=order, event_type='ITEMS', payload={'count': len(order_items), 'replace': False}),
+        ])
+        search_backend().index([order])
+    return order
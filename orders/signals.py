@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent inside the writing transaction whenever completed-order sales move.
+# ``changes`` is a list of dicts with order_id, created_at, sales, tax and
+# count deltas (count is 1 for a completion and 0 for a later total change).
+completed_totals_changed = Signal()
@@ -0,0 +1,90 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+
+def snapshot_key(order_id, version, kind='json'):
+    return f'order:{order_id}:v{version}:{kind}'
+
+
+def snapshot_timeout():
+    return getattr(settings, 'ORDER_SNAPSHOT_TIMEOUT', 3600)
+
+
+def order_version(order_id):
+    """Current snapshot version of an order, derived from the rows its snapshot is built from.
+
+    For a hot order this is one aggregate query over the order, its items,
+    table number, server name and menu item names, so a write by any process
+    changes it without a shared cache. Archived orders no longer change, so
+    the archive row or the segments that may hold the order identify them.
+    """
+    from .models import ArchivedOrder, ArchiveSegment, Order
+    row = Order.objects.filter(pk=order_id).order_by('pk').values_list(
+        'updated_at', 'table__number', 'server__user__first_name', 'server__user__last_name'
+    ).annotate(
+        item_count=Count('items'),
+        items_updated=Max('items__updated_at'),
+        names_updated=Max('items__menu_item__updated_at'),
+    ).first()
+    if row is None:
+        row = ArchivedOrder.objects.filter(pk=order_id).values_list(
+            'archived_at', 'server__user__first_name', 'server__user__last_name'
+        ).first()
+    if row is None:
+        row = tuple(ArchiveSegment.objects.filter(
+            first_order_id__lte=order_id, last_order_id__gte=order_id
+        ).values_list('pk', flat=True))
+    return hashlib.md5(repr(row).encode()).hexdigest()[:16]
+
+
+def serialize_order(order):
+    table_number = order.table_number if order.is_archived else (order.table.number if order.table_id else None)
+    server = order.server
+    return {
+        'id': order.pk,
+        'order_number': order.order_number,
+        'table': table_number,
+        'server': server.user.get_full_name() if server else None,
+        'customer_name': order.customer_name,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'payment_status': order.payment_status,
+        'payment_method': order.payment_method,
+        'subtotal': str(order.subtotal),
+        'tax': str(order.tax),
+        'total': str(order.total),
+        'notes': order.notes,
+        'archived': order.is_archived,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat(),
+        'completed_at': order.completed_at.isoformat() if order.completed_at else None,
+        'items': [
+            {
+                'id': item.pk,
+                'menu_item': item.menu_item_id,
+                'name': item.menu_item_name if order.is_archived else item.menu_item.name,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'subtotal': str(item.subtotal),
+                'notes': item.notes,
+            }
+            for item in order.line_items
+        ],
+    }
+
+
+def order_snapshot(order_id):
+    """(version, serialized order) from the cache, building it on a miss; None if the order is unknown"""
+    version = order_version(order_id)
+    key = snapshot_key(order_id, version)
+    data = cache.get(key)
+    if data is None:
+        from .archive import find_order
+        order = find_order(order_id)
+        if order is None:
+            return version, None
+        data = serialize_order(order)
+        cache.set(key, data, snapshot_timeout())
+    return version, data
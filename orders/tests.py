@@ -1,3 +1,1136 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from menu.models import Category, MenuItem
+from restaurant_management.dates import day_range, hour_range
+from restaurant_management.pagination import CursorPaginator, InvalidCursor
+from restaurant_management.testing import QueryPlanMixin
+from staff.models import Employee
+from .archive import _segment_path, _write_segment, archive_orders, find_order
+from .models import (
+    ArchiveSegment, IdempotencyKey, InvalidTransition, Order, OrderEvent, OrderItem, OrderNumberSequence, Table
+)
+from .numbering import OrderNumberAllocator
+from .search import DatabaseSearchBackend, search_orders
+from .signals import completed_totals_changed
+from .services import (
+    bulk_transition_orders, create_counter_order, save_order_items, sync_orders, transition_order
+)
 
-# Create your tests here.
+
+class OrderNumberAllocatorTests(TransactionTestCase):
+    def test_interleaved_workers_never_collide(self):
+        workers = [OrderNumberAllocator(block_size=7) for _ in range(5)]
+        numbers = [workers[i % 5].next_number() for i in range(500)]
+        self.assertEqual(len(numbers), len(set(numbers)))
+        self.assertTrue(all(len(number) == 10 for number in numbers))
+
+    def test_block_served_from_memory(self):
+        worker = OrderNumberAllocator(block_size=50)
+        worker.next_number()
+        with self.assertNumQueries(0):
+            for _ in range(49):
+                worker.next_number()
+
+    def test_rolled_back_reservation_is_not_reused(self):
+        first, second = OrderNumberAllocator(block_size=10), OrderNumberAllocator(block_size=10)
+        try:
+            with transaction.atomic():
+                first.next_number()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        numbers = [first.next_number() for _ in range(15)] + [second.next_number() for _ in range(15)]
+        self.assertEqual(len(numbers), len(set(numbers)))
+        self.assertEqual(OrderNumberSequence.objects.get().last_value, 40)
+
+    def test_one_transaction_reserves_blocks_as_it_needs_them(self):
+        worker = OrderNumberAllocator(block_size=20)
+        with transaction.atomic():
+            numbers = [worker.next_number() for _ in range(2000)]
+        self.assertEqual(len(set(numbers)), 2000)
+        self.assertEqual(OrderNumberSequence.objects.get().last_value, 2000)
+        # The committed remainder is served without another reservation
+        with transaction.atomic():
+            numbers += worker.allocate(5)
+        self.assertEqual(OrderNumberSequence.objects.get().last_value, 2020)
+        self.assertEqual(len(set(numbers)), 2005)
+
+    def test_rolled_back_savepoint_drops_its_pending_block(self):
+        first, second = OrderNumberAllocator(block_size=10), OrderNumberAllocator(block_size=10)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    first.next_number()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # The reservation above was undone, so its block is free for others
+            numbers = [second.next_number(), first.next_number()]
+        self.assertEqual(len(set(numbers)), 2)
+        self.assertEqual(OrderNumberSequence.objects.get().last_value, 20)
+
+    def test_orders_get_a_number_on_create(self):
+        orders = [Order.objects.create(customer_name='Walk-in') for _ in range(3)]
+        self.assertEqual(len({order.order_number for order in orders}), 3)
+
+
+class OrderQueryShapeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.menu_items = [
+            MenuItem.objects.create(name=f'Dish {i}', category=category, price=Decimal('9.50'))
+            for i in range(3)
+        ]
+        user = User.objects.create_user('server', first_name='Sam', last_name='Server')
+        cls.server = Employee.objects.create(
+            user=user, position='WAITER', phone='555', address='-', emergency_contact='-',
+            emergency_phone='555', date_hired=date(2024, 1, 1), hourly_rate=Decimal('12.00')
+        )
+
+    def create_orders(self, count):
+        for _ in range(count):
+            table = Table.objects.create(number=Table.objects.count() + 1, capacity=4)
+            order = Order.objects.create(table=table, server=self.server)
+            for menu_item in self.menu_items:
+                OrderItem.objects.create(order=order, menu_item=menu_item, quantity=1, unit_price=menu_item.price)
+
+    def render_orders(self, queryset):
+        # What the list, detail and kitchen pages touch per row
+        for order in queryset:
+            str(order)
+            str(order.server)
+            for item in order.items.all():
+                str(item)
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        for count in (2, 8):
+            self.create_orders(count)
+            with self.assertNumQueries(1):
+                [(str(order), str(order.server)) for order in Order.objects.for_list()]
+            with self.assertNumQueries(2):
+                self.render_orders(Order.objects.for_detail())
+            with self.assertNumQueries(2):
+                [[str(item) for item in order.items.all()] for order in Order.objects.for_kitchen()]
+            with self.assertNumQueries(1):
+                [str(item) for item in OrderItem.objects.for_list()]
+
+
+class OrderQueryPlanTests(QueryPlanMixin, TestCase):
+    def test_hot_queries_use_indexes(self):
+        today = timezone.localdate()
+        start, end = day_range(today)
+        hour_start, hour_end = hour_range(today, 12)
+        self.assertNoFullScan(Order.objects.filter(status='COMPLETED', created_at__gte=start, created_at__lt=end))
+        self.assertNoFullScan(Order.objects.filter(status='COMPLETED', created_at__gte=hour_start, created_at__lt=hour_end))
+        self.assertNoFullScan(Order.objects.filter(created_at__gte=start, created_at__lt=end))
+        self.assertNoFullScan(Order.objects.filter(
+            status__in=Order.KITCHEN_STATUSES, created_at__gte=start, created_at__lt=end
+        ))
+        self.assertNoFullScan(Order.objects.for_kitchen())
+        paginator = CursorPaginator(Order.objects.all(), ['-created_at', '-id'], 10)
+        seek = paginator._seek([end, 100], reverse=False)
+        self.assertNoFullScan(Order.objects.filter(seek).order_by('-created_at', '-id')[:11])
+
+
+ORDER_LIST_TEMPLATE = {
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'OPTIONS': {'loaders': [('django.template.loaders.locmem.Loader', {
+        'orders/order_list.html': (
+            '{% for order in orders %}{{ order.customer_name }};{% endfor %}'
+            '|{{ page_obj.previous_cursor|default:"" }}|{{ page_obj.next_cursor|default:"" }}|{{ total_count }}'
+        ),
+    })]},
+}
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('server')
+        cls.orders = [Order.objects.create(customer_name=f'Guest {i}') for i in range(7)]
+        # Two runs of identical timestamps so pages have to break ties on -id
+        stamp = timezone.now()
+        Order.objects.filter(pk__in=[order.pk for order in cls.orders[:4]]).update(created_at=stamp)
+        Order.objects.filter(pk__in=[order.pk for order in cls.orders[4:]]).update(created_at=stamp - timedelta(hours=1))
+
+    def setUp(self):
+        self.paginator = CursorPaginator(Order.objects.all(), ['-created_at', '-id'], 3)
+
+    def names(self, page):
+        return [order.customer_name for order in page]
+
+    def test_next_and_previous_round_trip(self):
+        first = self.paginator.page()
+        self.assertEqual(self.names(first), ['Guest 3', 'Guest 2', 'Guest 1'])
+        self.assertFalse(first.has_previous())
+        second = self.paginator.page(first.next_cursor)
+        self.assertEqual(self.names(second), ['Guest 0', 'Guest 6', 'Guest 5'])
+        third = self.paginator.page(second.next_cursor)
+        self.assertEqual(self.names(third), ['Guest 4'])
+        self.assertFalse(third.has_next())
+        self.assertIsNone(third.next_cursor)
+        back = self.paginator.page(third.previous_cursor)
+        self.assertEqual(self.names(back), self.names(second))
+        self.assertTrue(back.has_next() and back.has_previous())
+        self.assertEqual(self.names(self.paginator.page(back.previous_cursor)), self.names(first))
+
+    def test_duplicate_sort_keys_are_neither_skipped_nor_repeated(self):
+        seen, token = [], None
+        for _ in range(4):
+            page = CursorPaginator(Order.objects.all(), ['-created_at', '-id'], 1).page(token)
+            seen += [order.pk for order in page]
+            token = page.next_cursor
+        self.assertEqual(seen, [order.pk for order in reversed(self.orders[:4])])
+
+    def test_malformed_cursors_are_rejected(self):
+        for token in ['garbage', 'W10', 'WyJzaWRld2F5cyIsIjEiLCIyIl0', self.paginator.page().next_cursor[:-4]]:
+            with self.assertRaises(InvalidCursor):
+                self.paginator.page(token)
+        other = CursorPaginator(Order.objects.all(), ['-id'], 3).page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(other)
+
+    def test_empty_result(self):
+        page = CursorPaginator(Order.objects.none(), ['-created_at', '-id'], 3).page()
+        self.assertEqual(list(page), [])
+        self.assertFalse(page.has_other_pages())
+        self.assertIsNone(page.next_cursor)
+        self.assertIsNone(page.previous_cursor)
+
+    @override_settings(TEMPLATES=[ORDER_LIST_TEMPLATE])
+    def test_list_view_pages_by_cursor(self):
+        self.client.force_login(self.user)
+        content = self.client.get('/orders/?total=1').content.decode()
+        names, previous, following, total = content.split('|')
+        self.assertEqual(names.count(';'), 7)
+        self.assertEqual((previous, following, total), ('', '', '7'))
+        Order.objects.bulk_create(Order(customer_name=f'Regular {i}', order_number=f'R{i}') for i in range(5))
+        first = self.client.get('/orders/').content.decode()
+        following = first.split('|')[2]
+        self.assertTrue(following)
+        self.assertNotEqual(self.client.get('/orders/', {'cursor': following}).content.decode(), first)
+        # A mangled or stale cursor falls back to the first page instead of failing
+        self.assertEqual(self.client.get('/orders/', {'cursor': 'not-a-cursor'}).content.decode(), first)
+        Order.objects.all().delete()
+        self.assertEqual(self.client.get('/orders/', {'cursor': following}).content.decode(), '|||')
+
+
+class OrderItemsBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.menu_items = [
+            MenuItem.objects.create(name=f'Dish {i}', category=category, price=Decimal('4.00'))
+            for i in range(20)
+        ]
+        cls.user = User.objects.create_user('server')
+
+    def setUp(self):
+        self.order = Order.objects.create(customer_name='Walk-in')
+        self.client.force_login(self.user)
+
+    def entries(self, count):
+        return [{'menu_item': menu_item.pk, 'quantity': 2} for menu_item in self.menu_items[:count]]
+
+    def post(self, payload):
+        return self.client.post(
+            f'/orders/{self.order.pk}/items/bulk/', json.dumps(payload), content_type='application/json'
+        )
+
+    def test_query_count_does_not_grow_with_items(self):
+        for count in (5, 20):
+            order = Order.objects.create(customer_name='Walk-in')
+            with self.assertNumQueries(8):
+                save_order_items(order, self.entries(count))
+            self.assertEqual(order.subtotal, Decimal('8.00') * count)
+            self.assertEqual(order.total, order.subtotal + order.tax)
+
+    def test_endpoint_adds_and_replaces_items(self):
+        response = self.post({'items': self.entries(3)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['subtotal'], '24.00')
+        first = response.json()['items'][0]
+        response = self.post({'replace': True, 'items': [{'id': first, 'menu_item': self.menu_items[0].pk, 'quantity': 1}]})
+        self.assertEqual(response.json()['subtotal'], '4.00')
+        self.assertEqual(list(self.order.items.values_list('pk', flat=True)), [first])
+
+    def test_bad_entries_are_rejected(self):
+        menu_item = self.menu_items[0].pk
+        for items in (
+            [5],
+            ['dish'],
+            [{'quantity': 1}],
+            [{'menu_item': [menu_item]}],
+            [{'menu_item': str(menu_item)}],
+            [{'menu_item': True}],
+            [{'menu_item': menu_item, 'id': [1]}],
+            [{'menu_item': 999999}],
+            [{'menu_item': menu_item, 'quantity': 0}],
+            [{'menu_item': menu_item, 'unit_price': '-5'}],
+            [{'menu_item': menu_item, 'unit_price': '1.005'}],
+            [{'menu_item': menu_item, 'unit_price': 'NaN'}],
+            [{'menu_item': menu_item, 'unit_price': '1e30'}],
+            [{'menu_item': menu_item, 'unit_price': '99999999999.99'}],
+            [{'menu_item': menu_item, 'unit_price': '100000000'}],
+            [{'menu_item': menu_item, 'unit_price': '99999999.99', 'quantity': 2}],
+            [{'menu_item': menu_item, 'quantity': 2 ** 40}],
+            [{'menu_item': menu_item, 'quantity': 1.5}],
+            [{'menu_item': 10 ** 30}],
+            [{'menu_item': menu_item, 'notes': ['no salt']}],
+        ):
+            with self.subTest(items=items):
+                response = self.post({'items': items})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal('0'))
+        self.assertFalse(self.order.items.exists())
+
+
+class OrderTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('5.00'))
+        cls.steak = MenuItem.objects.create(name='Steak', category=category, price=Decimal('21.55'))
+
+    def setUp(self):
+        self.order = Order.objects.create(customer_name='Walk-in')
+
+    def assertTotals(self, order, subtotal):
+        order.refresh_from_db()
+        tax = (Decimal(subtotal) * Order.TAX_RATE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        self.assertEqual((order.subtotal, order.tax, order.total), (Decimal(subtotal), tax, Decimal(subtotal) + tax))
+
+    def add(self, menu_item, quantity, order=None):
+        return OrderItem.objects.create(
+            order=order or self.order, menu_item=menu_item, quantity=quantity, unit_price=menu_item.price
+        )
+
+    def test_item_writes_move_totals_by_their_delta(self):
+        soup = self.add(self.soup, 2)
+        steak = self.add(self.steak, 1)
+        self.assertTotals(self.order, '31.55')
+        soup.quantity = 3
+        soup.save()
+        self.assertTotals(self.order, '36.55')
+        steak.delete()
+        self.assertTotals(self.order, '15.00')
+        self.add(self.steak, 2)
+        self.order.items.filter(menu_item=self.soup).delete()
+        self.assertTotals(self.order, '43.10')
+
+    def test_moving_an_item_moves_its_subtotal(self):
+        other = Order.objects.create(customer_name='Bar')
+        steak = self.add(self.steak, 2)
+        steak.order = other
+        steak.save()
+        self.assertTotals(self.order, '0')
+        self.assertTotals(other, '43.10')
+
+    def test_tax_is_rounded_on_the_running_subtotal(self):
+        for _ in range(3):
+            self.add(self.steak, 1)
+        self.assertTotals(self.order, '64.65')
+
+    def test_completed_orders_report_sales_deltas(self):
+        item = self.add(self.soup, 1)
+        self.order.status = 'SERVED'
+        self.order.save()
+        self.order.mark_completed()
+        changes = []
+
+        def collect(sender, **kwargs):
+            changes.extend(kwargs['changes'])
+
+        completed_totals_changed.connect(collect)
+        try:
+            item.quantity = 3
+            item.save()
+        finally:
+            completed_totals_changed.disconnect(collect)
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['sales'], Decimal('11.00'))
+        self.assertEqual(changes[0]['tax'], Decimal('1.00'))
+        self.assertEqual(changes[0]['count'], 0)
+
+    def test_reconcile_finds_no_drift(self):
+        self.add(self.soup, 2)
+        self.add(self.steak, 3)
+        out = StringIO()
+        call_command('reconcile_order_totals', stdout=out)
+        self.assertIn('All order totals match', out.getvalue())
+        Order.objects.filter(pk=self.order.pk).update(subtotal=Decimal('1.00'))
+        call_command('reconcile_order_totals', '--fix', stdout=StringIO())
+        self.assertTotals(self.order, '74.65')
+
+
+@override_settings(ORDER_EVENT_STREAM_TIMEOUT=0.05, ORDER_EVENT_POLL_INTERVAL=0.01)
+class OrderEventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('expo')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        self.order = Order.objects.create(customer_name='Walk-in')
+
+    def ids(self, body):
+        return [int(line[4:]) for line in body.splitlines() if line.startswith('id: ')]
+
+    async def stream(self, *args, **kwargs):
+        response = await self.async_client.get('/orders/events/stream/', *args, **kwargs)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        return self.ids(body)
+
+    async def test_resumes_after_the_last_event_id(self):
+        created = await self.order.events.aget()
+        self.assertEqual(await self.stream(), [])
+        await sync_to_async(transition_order)(self.order.pk, 'PENDING', 'PREPARING')
+        preparing = await self.order.events.alatest('pk')
+        self.assertEqual(await self.stream(headers={'Last-Event-ID': str(created.pk)}), [preparing.pk])
+        self.assertEqual(await self.stream({'last_event_id': 0}), [created.pk, preparing.pk])
+
+    async def test_station_filter(self):
+        await sync_to_async(transition_order)(self.order.pk, 'PENDING', 'PREPARING')
+        await sync_to_async(transition_order)(self.order.pk, 'PREPARING', 'READY')
+        events = {status: pk async for status, pk in self.order.events.values_list('status', 'pk')}
+        self.assertEqual(await self.stream({'last_event_id': 0, 'station': 'expo'}), [events['READY']])
+        self.assertEqual(
+            await self.stream({'last_event_id': 0, 'station': 'kitchen'}), [events['PENDING'], events['PREPARING']]
+        )
+        response = await self.async_client.get('/orders/events/stream/', {'station': 'bar'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_stream_waits_without_blocking_the_loop(self):
+        created = await self.order.events.aget()
+        with override_settings(ORDER_EVENT_STREAM_TIMEOUT=0.5):
+            stream = asyncio.create_task(self.stream({'last_event_id': created.pk}))
+            await asyncio.sleep(0.1)
+            self.assertFalse(stream.done())
+            await sync_to_async(transition_order)(self.order.pk, 'PENDING', 'PREPARING')
+            preparing = await self.order.events.alatest('pk')
+            self.assertEqual(await stream, [preparing.pk])
+
+    @override_settings(ORDER_EVENT_STREAM_TIMEOUT=300)
+    def test_wsgi_requests_answer_one_poll(self):
+        with mock.patch('orders.views.asyncio.sleep') as sleep:
+            response = self.client.get('/orders/events/stream/', {'last_event_id': 0})
+            body = b''.join(response.streaming_content).decode()
+        sleep.assert_not_called()
+        self.assertTrue(body.startswith('retry: 2000'))
+        self.assertEqual(self.ids(body), [self.order.events.get().pk])
+
+
+class KitchenBoardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook')
+        category = Category.objects.create(name='Mains')
+        cls.soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('5.00'))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_lists_open_tickets_with_the_stream_cursor(self):
+        orders = [Order.objects.create(customer_name=f'Guest {i}') for i in range(4)]
+        for order in orders:
+            OrderItem.objects.create(order=order, menu_item=self.soup, quantity=2, unit_price=self.soup.price)
+        transition_order(orders[0].pk, 'PENDING', 'PREPARING')
+        transition_order(orders[1].pk, 'PENDING', 'CANCELLED')
+        with self.assertNumQueries(5):
+            # Session, user, the event cursor, the tickets and their items
+            board = self.client.get('/orders/kitchen/').json()
+        self.assertEqual([order['id'] for order in board['orders']], [orders[0].pk, orders[2].pk, orders[3].pk])
+        self.assertEqual(board['orders'][0]['status'], 'PREPARING')
+        self.assertEqual(board['orders'][0]['items'], [{'name': 'Soup', 'quantity': 2, 'notes': ''}])
+        self.assertEqual(board['last_event_id'], OrderEvent.objects.latest('pk').pk)
+
+
+class OrderArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('5.00'))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.orders = []
+        for quantity in range(1, 5):
+            order = Order.objects.create(customer_name=f'Guest {quantity}', status='COMPLETED')
+            OrderItem.objects.create(order=order, menu_item=self.soup, quantity=quantity, unit_price=Decimal('5.00'))
+            self.orders.append(order)
+        self.before = timezone.now() + timedelta(minutes=1)
+
+    def assertArchived(self, order, archived):
+        self.assertIsNotNone(archived, f'Order {order.pk} not found')
+        self.assertEqual((archived.pk, archived.order_number), (order.pk, order.order_number))
+        items = [(item.menu_item_name, item.quantity) for item in archived.line_items]
+        self.assertEqual(items, [('Soup', item.quantity) for item in order.items.all()])
+
+    def test_archive_tables_round_trip(self):
+        expected = list(Order.objects.for_detail().order_by('id'))
+        self.assertEqual(archive_orders(self.before, batch_size=3), 4)
+        self.assertFalse(Order.objects.exists())
+        for order in expected:
+            self.assertArchived(order, find_order(order.pk))
+
+    def test_segment_files_round_trip(self):
+        expected = list(Order.objects.for_detail().order_by('id'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive_orders(self.before, batch_size=3, fmt='jsonl', directory=self.directory), 4)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assertTrue(all(name.endswith('.jsonl.gz') for name in os.listdir(self.directory)))
+        for order in expected:
+            self.assertArchived(order, find_order(order.pk))
+
+    def test_overlapping_segments_are_all_searched(self):
+        # Two archivers skipping each other's locked rows write interleaved id ranges
+        expected = list(Order.objects.for_detail().order_by('id'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for orders in (expected[0::2], expected[1::2]):
+                _write_segment(orders, _segment_path(orders, self.directory))
+        Order.objects.all().delete()
+        self.assertEqual(ArchiveSegment.objects.filter(
+            first_order_id__lte=expected[2].pk, last_order_id__gte=expected[2].pk
+        ).count(), 2)
+        for order in expected:
+            self.assertArchived(order, find_order(order.pk))
+        self.assertIsNone(find_order(expected[-1].pk + 1))
+
+    def test_rolled_back_batch_leaves_no_file(self):
+        with mock.patch.object(ArchiveSegment.objects, 'create', side_effect=RuntimeError):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+                archive_orders(self.before, fmt='jsonl', directory=self.directory)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(Order.objects.count(), 4)
+
+
+class OrderSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('5.00'))
+        cls.table = Table.objects.create(number=7, capacity=4)
+
+    def ticket(self, **fields):
+        return dict({
+            'client_uuid': str(uuid.uuid4()),
+            'table': self.table.pk,
+            'items': [{'menu_item': self.soup.pk, 'quantity': 2}, {'menu_item': self.soup.pk, 'unit_price': '4.50'}],
+            'status_history': [{'status': 'PREPARING'}, {'status': 'READY'}, {'status': 'SERVED'}, {'status': 'COMPLETED'}],
+            'payments': [{'method': 'CARD'}],
+        }, **fields)
+
+    def test_resync_reports_duplicates(self):
+        tickets = [self.ticket() for _ in range(3)]
+        first = sync_orders(tickets)
+        self.assertEqual([result['result'] for result in first], ['created'] * 3)
+        self.assertEqual(first[0]['total'], '15.95')
+        second = sync_orders(tickets)
+        self.assertEqual([result['result'] for result in second], ['duplicate'] * 3)
+        self.assertEqual(
+            [result['order_number'] for result in second], [result['order_number'] for result in first]
+        )
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(OrderItem.objects.count(), 6)
+
+    def test_query_count_does_not_grow_with_tickets(self):
+        OrderNumberSequence.objects.create(date=timezone.localdate())
+        for count in (2, 10):
+            # A fresh allocator reserves one block per batch
+            with mock.patch('orders.numbering.allocator', OrderNumberAllocator(block_size=20)), \
+                    self.assertNumQueries(16):
+                results = sync_orders([self.ticket() for _ in range(count)])
+            self.assertEqual([result['result'] for result in results], ['created'] * count)
+
+    def test_bad_tickets_are_reported_and_skipped(self):
+        bad = [
+            self.ticket(items=[{'menu_item': self.soup.pk, 'unit_price': '-5'}]),
+            self.ticket(items=[5]),
+            self.ticket(items=[{'menu_item': [self.soup.pk]}]),
+            self.ticket(items={'menu_item': self.soup.pk}),
+            self.ticket(table=[self.table.pk]),
+            self.ticket(table=True),
+            self.ticket(status_history=['COMPLETED']),
+            self.ticket(payments=['CASH']),
+            self.ticket(client_uuid='not-a-uuid'),
+            self.ticket(status_history=5),
+            self.ticket(status_history={'status': 'PREPARING'}),
+            self.ticket(status_history=[{'status': 'PREPARING', 'at': 5}]),
+            self.ticket(payments=[{'method': 'CASH'}, 'CARD']),
+            self.ticket(payments=[{'method': ['CASH']}]),
+            self.ticket(payments=[{'method': 'CASH', 'status': {'paid': True}}]),
+            self.ticket(customer_name={'first': 'Ana'}),
+            self.ticket(customer_name='A' * 101),
+            self.ticket(notes=['no salt']),
+            self.ticket(items=[{'menu_item': self.soup.pk, 'notes': 7}]),
+        ]
+        results = sync_orders(bad + [self.ticket()])
+        self.assertEqual([result['result'] for result in results], ['error'] * len(bad) + ['created'])
+        self.assertEqual(Order.objects.get().total, Decimal('15.95'))
+
+    def test_endpoint_reports_malformed_fields(self):
+        self.client.force_login(User.objects.create_user('terminal'))
+        response = self.client.post('/orders/sync/', json.dumps({'orders': [
+            self.ticket(status_history=5), self.ticket(customer_name={'first': 'Ana'}), self.ticket(),
+        ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['result'] for result in results], ['error', 'error', 'created'])
+        self.assertEqual(results[0]['errors'], ['status_history must be a list of objects'])
+
+
+class CounterOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Drinks')
+        cls.menu_items = [
+            MenuItem.objects.create(name=f'Drink {i}', category=category, price=Decimal('3.00'))
+            for i in range(10)
+        ]
+        cls.user = User.objects.create_user('cashier')
+
+    def post(self, payload):
+        self.client.force_login(self.user)
+        return self.client.post('/orders/counter/', json.dumps(payload), content_type='application/json')
+
+    def test_query_count_does_not_grow_with_items(self):
+        OrderNumberSequence.objects.create(date=timezone.localdate())
+        for count in (2, 10):
+            items = [{'menu_item': menu_item.pk, 'quantity': 2} for menu_item in self.menu_items[:count]]
+            with mock.patch('orders.numbering.allocator', OrderNumberAllocator(block_size=20)), \
+                    self.assertNumQueries(12):
+                order = create_counter_order(items, payment_method='CASH')
+            self.assertEqual(order.subtotal, Decimal('6.00') * count)
+            self.assertEqual(order.items.count(), count)
+            self.assertEqual(order.payment_status, 'PAID')
+
+    def test_endpoint_creates_the_order(self):
+        response = self.post({'items': [{'menu_item': self.menu_items[0].pk, 'quantity': 3}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['total'], response.json()['payment_status']), ('9.90', 'UNPAID'))
+
+    def test_bad_input_is_rejected(self):
+        MenuItem.objects.filter(pk=self.menu_items[1].pk).update(is_available=False)
+        for payload in (
+            {'items': []},
+            {'items': [5]},
+            {'items': [{'menu_item': [self.menu_items[0].pk]}]},
+            {'items': [{'menu_item': self.menu_items[1].pk}]},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'payment_method': 'IOU'},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'table': 999},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'table': 'abc'},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'table': [1]},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'table': 1.5},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'table': 10 ** 30},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'customer_name': ['Ana']},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'customer_name': 'A' * 101},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'notes': {'allergy': 'nuts'}},
+            {'items': [{'menu_item': self.menu_items[0].pk, 'notes': 5}]},
+            {'items': [{'menu_item': self.menu_items[0].pk}], 'payment_method': ['CASH']},
+        ):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class IdempotencyMiddlewareTests(TestCase):
+    path = '/orders/counter/'
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Drinks')
+        cls.tea = MenuItem.objects.create(name='Tea', category=category, price=Decimal('2.50'))
+        cls.user = User.objects.create_user('cashier')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def body(self, quantity=1):
+        return json.dumps({'items': [{'menu_item': self.tea.pk, 'quantity': quantity}]})
+
+    def post(self, body, key='ticket-1'):
+        return self.client.post(self.path, body, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post(self.body())
+        second = self.post(self.body())
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], 'application/json')
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.post(self.body(), key='ticket-2')
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_client_errors_are_replayed_too(self):
+        self.assertEqual(self.post(json.dumps({'items': [5]})).status_code, 400)
+        replay = self.post(json.dumps({'items': [5]}))
+        self.assertEqual((replay.status_code, replay['Idempotent-Replayed']), (400, 'true'))
+
+    def test_reused_key_with_another_request_is_refused(self):
+        self.post(self.body())
+        self.assertEqual(self.post(self.body(quantity=2)).status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_duplicate_of_an_in_flight_request_conflicts(self):
+        body = self.body()
+        digest = hashlib.sha256(b'\n'.join([b'POST', self.path.encode(), body.encode()])).hexdigest()
+        IdempotencyKey.objects.create(user=self.user, key='ticket-1', request_hash=digest)
+        response = self.post(body)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_abandoned_claim_is_taken_over_after_the_lease(self):
+        body = self.body()
+        digest = hashlib.sha256(b'\n'.join([b'POST', self.path.encode(), body.encode()])).hexdigest()
+        # The worker handling the first attempt died before storing a response
+        IdempotencyKey.objects.create(
+            user=self.user, key='ticket-1', request_hash=digest, claimed_at=timezone.now() - timedelta(minutes=5)
+        )
+        IdempotencyKey.objects.create(
+            user=self.user, key='ticket-2', request_hash='other', claimed_at=timezone.now() - timedelta(minutes=5)
+        )
+        response = self.post(body)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        replay = self.post(body)
+        self.assertEqual((replay.content, replay['Idempotent-Replayed']), (response.content, 'true'))
+        self.assertEqual(self.post(body, key='ticket-2').status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_worker_that_lost_its_claim_does_not_store_a_response(self):
+        def slow_worker(*args, **kwargs):
+            # A retry took the key over while this request was still running
+            IdempotencyKey.objects.update(claimed_at=timezone.now() + timedelta(seconds=1))
+            return create_counter_order(*args, **kwargs)
+
+        with mock.patch('orders.views.create_counter_order', side_effect=slow_worker):
+            self.assertEqual(self.post(self.body()).status_code, 200)
+        self.assertIsNone(IdempotencyKey.objects.get().status_code)
+
+    def test_server_errors_release_the_key(self):
+        with mock.patch('orders.views.create_counter_order', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post(self.body())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post(self.body()).status_code, 200)
+
+    def test_expired_keys_are_claimed_afresh(self):
+        self.post(self.body())
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        response = self.post(self.body())
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class OrderSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('5.00'))
+        cls.user = User.objects.create_user('server', first_name='Sam', last_name='Server')
+        cls.server = Employee.objects.create(
+            user=cls.user, position='WAITER', phone='555', address='-', emergency_contact='-',
+            emergency_phone='555', date_hired=date(2024, 1, 1), hourly_rate=Decimal('12.00')
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.table = Table.objects.create(number=3, capacity=2)
+        self.order = Order.objects.create(table=self.table, server=self.server)
+        self.url = f'/orders/{self.order.pk}/?format=json'
+
+    def get(self, etag=None):
+        if etag:
+            return self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        return self.client.get(self.url)
+
+    def test_unchanged_order_answers_304(self):
+        response = self.get()
+        self.assertEqual(response.json()['table'], 3)
+        with self.assertNumQueries(3):
+            # Session, user and the version query
+            self.assertEqual(self.get(response['ETag']).status_code, 304)
+
+    def test_every_snapshot_input_moves_the_version(self):
+        changes = [
+            lambda: OrderItem.objects.create(order=self.order, menu_item=self.soup, quantity=1, unit_price=Decimal('0')),
+            lambda: self.order.items.update(notes='No salt', updated_at=timezone.now()),
+            lambda: transition_order(self.order.pk, 'PENDING', 'PREPARING'),
+            lambda: Table.objects.filter(pk=self.table.pk).update(number=4),
+            lambda: User.objects.filter(pk=self.user.pk).update(first_name='Sasha'),
+            lambda: MenuItem.objects.filter(pk=self.soup.pk).update(name='Broth', updated_at=timezone.now()),
+            lambda: self.order.items.all().delete(),
+        ]
+        etag = self.get()['ETag']
+        for change in changes:
+            change()
+            response = self.get(etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+        snapshot = self.get().json()
+        self.assertEqual((snapshot['table'], snapshot['server'], snapshot['status']), (4, 'Sasha Server', 'PREPARING'))
+
+    def test_archived_orders_are_served(self):
+        OrderItem.objects.create(order=self.order, menu_item=self.soup, quantity=2, unit_price=Decimal('5.00'))
+        Order.objects.filter(pk=self.order.pk).update(status='COMPLETED')
+        etag = self.get()['ETag']
+        archive_orders(timezone.now() + timedelta(minutes=1))
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['archived'])
+        self.assertEqual(response.json()['items'][0]['name'], 'Soup')
+        self.assertEqual(self.get(response['ETag']).status_code, 304)
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('5.00'))
+        cls.pie = MenuItem.objects.create(name='Pie', category=category, price=Decimal('8.00'))
+        cls.user = User.objects.create_user('manager')
+        cls.days = [date(2024, 3, day) for day in (1, 2, 3)]
+        for number, day in enumerate(cls.days, 1):
+            order = Order.objects.create(customer_name=f'Guest {number}', status='COMPLETED')
+            if number != 2:
+                OrderItem.objects.create(order=order, menu_item=cls.soup, quantity=number, unit_price=Decimal('5.00'))
+                OrderItem.objects.create(order=order, menu_item=cls.pie, quantity=1, unit_price=Decimal('8.00'))
+            Order.objects.filter(pk=order.pk).update(created_at=day_range(day)[0] + timedelta(hours=12))
+        # The oldest order lives in the archive tables
+        archive_orders(day_range(cls.days[0])[1])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        response = self.client.get('/orders/export/', params)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        return gzip.decompress(body) if params.get('gzip') == '1' else body
+
+    def test_csv_has_one_row_per_item(self):
+        self.assertFalse(Order.objects.filter(customer_name='Guest 1').exists())
+        rows = list(csv.DictReader(StringIO(self.export().decode())))
+        self.assertEqual(
+            [(row['customer_name'], row['menu_item'], row['quantity']) for row in rows],
+            [('Guest 1', 'Soup', '1'), ('Guest 1', 'Pie', '1'), ('Guest 2', '', ''),
+             ('Guest 3', 'Soup', '3'), ('Guest 3', 'Pie', '1')],
+        )
+
+    def test_jsonl_nests_items_per_order(self):
+        orders = [json.loads(line) for line in self.export(format='jsonl').decode().splitlines()]
+        self.assertEqual([order['customer_name'] for order in orders], ['Guest 1', 'Guest 2', 'Guest 3'])
+        self.assertEqual(
+            [[(item['menu_item'], item['item_subtotal']) for item in order['items']] for order in orders],
+            [[('Soup', '5.00'), ('Pie', '8.00')], [], [('Soup', '15.00'), ('Pie', '8.00')]],
+        )
+
+    def test_period_filters_and_gzip(self):
+        body = self.export(format='jsonl', start='2024-03-02', end='2024-03-02', gzip='1')
+        self.assertEqual([json.loads(line)['customer_name'] for line in body.decode().splitlines()], ['Guest 2'])
+        self.assertEqual(self.export(start='2024-03-01', gzip='1'), self.export())
+        self.assertEqual(self.export(end='2024-03-01').decode().count('Guest'), 2)
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'format': 'xml'}, {'start': '03/01/2024'}, {'end': '2024-02-30'}):
+            response = self.client.get('/orders/export/', params)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
+
+
+class TableListConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('host')
+        cls.tables = [Table.objects.create(number=number, capacity=4) for number in (1, 2, 3)]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def poll(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/orders/tables/', {'format': 'json'}, **headers)
+
+    def test_unchanged_floor_answers_304(self):
+        response = self.poll()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([table['number'] for table in response.json()['tables']], [1, 2, 3])
+        with self.assertNumQueries(3):
+            # Session, user and the validator aggregate
+            self.assertEqual(self.poll(response['ETag']).status_code, 304)
+
+    def test_changes_invalidate_the_etag(self):
+        etag = self.poll()['ETag']
+        table = self.tables[1]
+        table.is_occupied = True
+        table.save()
+        response = self.poll(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['tables'][1]['is_occupied'])
+        etag = response['ETag']
+        # A deletion leaves the latest updated_at alone; the row count still moves
+        self.tables[0].delete()
+        response = self.poll(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([table['number'] for table in response.json()['tables']], [2, 3])
+
+    def test_etag_is_per_rendering(self):
+        etag = self.poll()['ETag']
+        self.client.force_login(User.objects.create_user('other-host'))
+        self.assertEqual(self.poll(etag).status_code, 200)
+
+
+class OrderEditRaceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('5.00'))
+        cls.user = User.objects.create_superuser('manager', 'manager@example.com', 'pw')
+        cls.server = Employee.objects.create(
+            user=cls.user, position='MANAGER', phone='555', address='-', emergency_contact='-',
+            emergency_phone='555', date_hired=date(2024, 1, 1), hourly_rate=Decimal('12.00')
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.order = Order.objects.create(server=self.server, customer_name='Walk-in')
+
+    def post_while_kitchen_works(self, url, data):
+        # The kitchen moves the order on right after the edit request has loaded it
+        def kitchen(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('SELECT') and 'FROM "orders_order"' in sql and not moved:
+                moved.append(True)
+                transition_order(self.order.pk, 'PENDING', 'PREPARING')
+                save_order_items(self.order, [{'menu_item': self.soup.pk, 'quantity': 1}])
+            return result
+
+        moved = []
+        with connection.execute_wrapper(kitchen):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(moved)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.customer_name, 'Ana')
+        self.assertEqual(
+            (self.order.status, self.order.subtotal, self.order.total),
+            ('PREPARING', Decimal('5.00'), Decimal('5.50')),
+        )
+
+    def test_edit_view_keeps_concurrent_status_and_totals(self):
+        self.post_while_kitchen_works(f'/orders/{self.order.pk}/update/', {'customer_name': 'Ana', 'notes': ''})
+
+    def test_admin_keeps_concurrent_status_and_totals(self):
+        self.post_while_kitchen_works(f'/admin/orders/order/{self.order.pk}/change/', {
+            'server': self.server.pk, 'customer_name': 'Ana', 'payment_status': 'UNPAID',
+            'notes': '', 'items-TOTAL_FORMS': '0', 'items-INITIAL_FORMS': '0',
+        })
+
+
+class OrderStatusViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('manager', 'manager@example.com', 'pw')
+        cls.server = Employee.objects.create(
+            user=cls.user, position='MANAGER', phone='555', address='-', emergency_contact='-',
+            emergency_phone='555', date_hired=date(2024, 1, 1), hourly_rate=Decimal('12.00')
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.order = Order.objects.create(server=self.server, customer_name='Walk-in')
+
+    def test_transition_redirects_to_the_order(self):
+        response = self.client.post(f'/orders/{self.order.pk}/mark-preparing/', {'expected_status': 'PENDING'})
+        self.assertRedirects(response, f'/orders/{self.order.pk}/', fetch_redirect_response=False)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'PREPARING')
+
+    def test_stale_expected_status_answers_409(self):
+        # Another screen moved the order after this one rendered it as PENDING
+        transition_order(self.order.pk, 'PENDING', 'PREPARING')
+        response = self.client.post(f'/orders/{self.order.pk}/mark-cancelled/', {'expected_status': 'PENDING'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'PREPARING')
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'PREPARING')
+
+    def test_disallowed_transition_answers_409(self):
+        response = self.client.post(f'/orders/{self.order.pk}/mark-completed/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'PENDING')
+
+    def test_admin_form_cannot_change_status(self):
+        response = self.client.post(f'/admin/orders/order/{self.order.pk}/change/', {
+            'server': self.server.pk, 'customer_name': 'Walk-in', 'status': 'COMPLETED', 'payment_status': 'UNPAID',
+            'notes': '', 'items-TOTAL_FORMS': '0', 'items-INITIAL_FORMS': '0',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.completed_at), ('PENDING', None))
+        self.assertEqual(list(self.order.events.values_list('event_type', flat=True)), ['CREATED'])
+
+
+class BulkStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('manager', 'manager@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_orders(self, *statuses):
+        orders = [Order.objects.create(customer_name='Walk-in') for _ in statuses]
+        for order, status in zip(orders, statuses):
+            Order.objects.filter(pk=order.pk).update(status=status, total=Decimal('11.00'), tax=Decimal('1.00'))
+        return [order.pk for order in orders]
+
+    def test_only_allowed_sources_move(self):
+        ids = self.create_orders('SERVED', 'PENDING', 'SERVED', 'COMPLETED')
+        completions = []
+        receiver = lambda changes, **kwargs: completions.extend(changes)
+        completed_totals_changed.connect(receiver)
+        self.addCleanup(completed_totals_changed.disconnect, receiver)
+        updated, skipped = bulk_transition_orders(ids + [ids[-1] + 100], 'COMPLETED')
+        self.assertEqual((updated, skipped), ([ids[0], ids[2]], [ids[1], ids[3], ids[-1] + 100]))
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[pk] for pk in ids], ['COMPLETED', 'PENDING', 'COMPLETED', 'COMPLETED'])
+        self.assertEqual(Order.objects.filter(pk__in=updated, completed_at__isnull=False).count(), 2)
+        self.assertEqual(
+            sorted(OrderEvent.objects.filter(event_type='STATUS').values_list('order_id', 'payload')),
+            [(ids[0], {'from': 'SERVED'}), (ids[2], {'from': 'SERVED'})],
+        )
+        self.assertEqual(sorted(change['order_id'] for change in completions), updated)
+        with self.assertRaises(InvalidTransition):
+            bulk_transition_orders(ids, 'PENDING')
+
+    def test_query_count_does_not_grow_with_orders(self):
+        for count in (3, 60):
+            ids = self.create_orders(*['READY'] * count)
+            with self.assertNumQueries(5):
+                updated, _ = bulk_transition_orders(ids, 'SERVED')
+            self.assertEqual(len(updated), count)
+
+    def test_endpoint_takes_json_and_form_posts(self):
+        ids = self.create_orders('PENDING', 'PENDING', 'READY')
+        response = self.client.post(
+            '/orders/bulk-status/', json.dumps({'status': 'PREPARING', 'orders': ids}), content_type='application/json'
+        )
+        self.assertEqual(response.json(), {
+            'success': True, 'status': 'PREPARING', 'updated': ids[:2], 'skipped': ids[2:],
+        })
+        response = self.client.post('/orders/bulk-status/', {'status': 'CANCELLED', 'orders': [str(pk) for pk in ids]})
+        self.assertEqual(response.json()['updated'], ids)
+
+    def test_endpoint_rejects_malformed_ids(self):
+        ids = self.create_orders('PENDING')
+        for payload in (
+            {'status': 'PREPARING', 'orders': '12'},
+            {'status': 'PREPARING', 'orders': {'id': ids[0]}},
+            {'status': 'PREPARING', 'orders': [str(ids[0])]},
+            {'status': 'PREPARING', 'orders': [True]},
+            {'status': 'PREPARING', 'orders': [1.0]},
+            {'status': 'PREPARING', 'orders': [10 ** 30]},
+            {'status': 'PREPARING', 'orders': []},
+            {'status': ['PREPARING'], 'orders': ids},
+            {'status': 'PENDING', 'orders': ids},
+        ):
+            with self.subTest(payload=payload):
+                response = self.client.post('/orders/bulk-status/', json.dumps(payload), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/orders/bulk-status/', {'status': 'PREPARING', 'orders': ['x']}).status_code, 400)
+        self.assertEqual(Order.objects.get().status, 'PENDING')
+
+    def test_admin_actions_transition_the_selection(self):
+        ids = self.create_orders('READY', 'PENDING')
+        response = self.client.post('/admin/orders/order/', {
+            'action': 'mark_served', '_selected_action': [str(pk) for pk in ids],
+        })
+        self.assertEqual(response.status_code, 302)
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[pk] for pk in ids], ['SERVED', 'PENDING'])
+        self.client.post('/admin/orders/order/', {'action': 'mark_cancelled', '_selected_action': [str(pk) for pk in ids]})
+        self.assertEqual(dict(Order.objects.values_list('pk', 'status'))[ids[1]], 'CANCELLED')
+
+
+class OrderSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('manager', 'manager@example.com', 'pw')
+
+    def setUp(self):
+        self.margaret = Order.objects.create(customer_name='Margaret Hale', notes='Table by the window')
+        self.john = Order.objects.create(customer_name='John Thornton', notes='No onions, extra gravy')
+
+    def found(self, term):
+        return [order.customer_name for order in search_orders(term)]
+
+    def test_substrings_match_any_field(self):
+        self.assertEqual(self.found('garet'), ['Margaret Hale'])
+        self.assertEqual(self.found('onion'), ['John Thornton'])
+        self.assertEqual(self.found('on'), [])
+        self.assertEqual(self.found('"window'), [])
+        self.assertEqual(self.found(self.john.order_number[:8]), ['John Thornton', 'Margaret Hale'])
+        self.assertEqual(self.found(self.margaret.order_number[-5:]), ['Margaret Hale'])
+
+    def test_saves_and_deletes_reindex(self):
+        self.margaret.customer_name = 'Margaret Thornton'
+        self.margaret.save(update_fields=['customer_name'])
+        self.assertEqual(self.found('Thornton'), ['John Thornton', 'Margaret Thornton'])
+        self.assertEqual(self.found('Hale'), [])
+        self.john.delete()
+        self.assertEqual(self.found('Thornton'), ['Margaret Thornton'])
+        self.assertEqual(self.found('onion'), [])
+
+    def test_queryset_updates_need_a_rebuild(self):
+        Order.objects.filter(pk=self.john.pk).update(customer_name='Mr Bell')
+        self.assertEqual(self.found('Bell'), [])
+        call_command('rebuild_order_search', stdout=StringIO())
+        self.assertEqual(self.found('Bell'), ['Mr Bell'])
+        self.assertEqual(self.found('Thornton'), [])
+
+    def test_orders_written_in_bulk_are_indexed(self):
+        category = Category.objects.create(name='Mains')
+        soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('5.00'))
+        create_counter_order([{'menu_item': soup.pk}], customer_name='Nicholas Higgins')
+        sync_orders([{'client_uuid': str(uuid.uuid4()), 'customer_name': 'Bessy Higgins', 'items': [{'menu_item': soup.pk}]}])
+        self.assertEqual(self.found('Higgins'), ['Bessy Higgins', 'Nicholas Higgins'])
+
+    def test_database_backend_fallback(self):
+        with mock.patch('orders.search._backend', DatabaseSearchBackend()):
+            self.assertEqual(self.found('garet'), ['Margaret Hale'])
+            self.assertEqual(self.found('ONION'), ['John Thornton'])
+            self.assertEqual(self.found(self.john.order_number), ['John Thornton'])
+            self.assertEqual(self.found(self.john.order_number[-4:]), [])
+
+    def test_endpoint_and_admin_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/orders/search/', {'q': 'thorn'})
+        self.assertEqual([order['id'] for order in response.json()['results']], [self.john.pk])
+        self.assertEqual(self.client.get('/orders/search/', {'q': ' '}).status_code, 400)
+        response = self.client.get('/admin/orders/order/', {'q': 'Hale'})
+        self.assertEqual([order.pk for order in response.context['cl'].result_list], [self.margaret.pk])
@@ -10,6 +10,13 @@ urlpatterns = [
     path('<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('<int:pk>/update/', views.OrderUpdateView.as_view(), name='order-update'),
     path('<int:pk>/delete/', views.OrderDeleteView.as_view(), name='order-delete'),
+    path('kitchen/', views.KitchenBoardView.as_view(), name='kitchen-board'),
+    path('events/stream/', views.OrderEventStreamView.as_view(), name='order-event-stream'),
+    path('<int:pk>/items/bulk/', views.OrderItemsBulkView.as_view(), name='order-items-bulk'),
+    path('sync/', views.OrderSyncView.as_view(), name='order-sync'),
+    path('counter/', views.CounterOrderCreateView.as_view(), name='order-counter-create'),
+    path('search/', views.OrderSearchView.as_view(), name='order-search'),
+    path('export/', views.OrderExportView.as_view(), name='order-export'),
     
     # Table URLs
     path('tables/', views.TableListView.as_view(), name='table-list'),
@@ -24,4 +31,5 @@ urlpatterns = [
     path('<int:pk>/mark-served/', views.MarkOrderServedView.as_view(), name='mark-served'),
     path('<int:pk>/mark-completed/', views.MarkOrderCompletedView.as_view(), name='mark-completed'),
     path('<int:pk>/mark-cancelled/', views.MarkOrderCancelledView.as_view(), name='mark-cancelled'),
+    path('bulk-status/', views.OrderBulkStatusView.as_view(), name='order-bulk-status'),
 ]
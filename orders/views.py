@@ -1,26 +1,76 @@
+import asyncio
+import json
+import time
+from itertools import chain, groupby
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib import messages
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
-from .models import Order, Table, OrderItem
+from django.http import Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from menu.catalog import menu_catalog
+from restaurant_management.conditional import ConditionalGetMixin, queryset_validator
+from restaurant_management.exports import EXPORT_CHUNK_SIZE, StreamingExportMixin, period_lookups
+from restaurant_management.pagination import CursorPaginationMixin
+from .models import ArchivedOrder, InvalidTransition, Order, OrderEvent, OrderItem, Table
+from .search import search_orders
+from .services import (
+    ID_LIMIT, bulk_transition_orders, create_counter_order, save_order_items, sync_orders, transition_order
+)
+from .snapshots import order_snapshot, order_version
 
-class OrderListView(LoginRequiredMixin, ListView):
+class OrderListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Order
     template_name = 'orders/order_list.html'
     context_object_name = 'orders'
     paginate_by = 10
-    ordering = ['-created_at']
+    cursor_ordering = ['-created_at', '-id']
+
+    def get_queryset(self):
+        return Order.objects.for_list()
 
-class OrderDetailView(LoginRequiredMixin, DetailView):
+class OrderDetailView(LoginRequiredMixin, ConditionalGetMixin, DetailView):
+    """Order page and ?format=json payload, served from the versioned snapshot cache.
+
+    The ETag carries the snapshot version, so an unchanged ticket answers
+    If-None-Match with 304. Each poll still pays the order_version() aggregate
+    (one query over the order, its items and their names): the version is read
+    from the rows rather than a stored counter, so writes from any process are
+    seen without signals keeping a counter in step.
+    """
     model = Order
     template_name = 'orders/order_detail.html'
     context_object_name = 'order'
 
+    def get_validator(self, request, *args, **kwargs):
+        return f"order-{kwargs['pk']}-{order_version(kwargs['pk'])}"
+
+    def get(self, request, *args, **kwargs):
+        # Closed orders may have moved to the archive tables or segment files
+        _, snapshot = order_snapshot(self.kwargs['pk'])
+        if snapshot is None:
+            raise Http404('Order not found')
+        if request.GET.get('format') == 'json':
+            return JsonResponse(snapshot)
+        self.object = snapshot
+        return self.render_to_response(self.get_context_data(object=snapshot))
+
 class OrderCreateView(LoginRequiredMixin, CreateView):
     model = Order
     template_name = 'orders/order_form.html'
     fields = ['table', 'customer_name', 'notes']
     success_url = reverse_lazy('orders:order-list')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['menu'] = menu_catalog()['categories']
+        return context
+
     def form_valid(self, form):
         form.instance.server = self.request.user.employee_profile
         return super().form_valid(form)
@@ -28,8 +78,15 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
 class OrderUpdateView(LoginRequiredMixin, UpdateView):
     model = Order
     template_name = 'orders/order_form.html'
-    fields = ['table', 'customer_name', 'status', 'notes']
-    
+    # Status only changes through the Mark*View transitions
+    fields = ['table', 'customer_name', 'notes']
+
+    def form_valid(self, form):
+        # Status and totals may have moved since the order was loaded; write only what the form edits
+        self.object = form.save(commit=False)
+        self.object.save(update_fields=self.fields + ['updated_at'])
+        return HttpResponseRedirect(self.get_success_url())
+
     def get_success_url(self):
         return reverse_lazy('orders:order-detail', kwargs={'pk': self.object.pk})
 
@@ -38,11 +95,22 @@ class OrderDeleteView(LoginRequiredMixin, DeleteView):
     template_name = 'orders/order_confirm_delete.html'
     success_url = reverse_lazy('orders:order-list')
 
-class TableListView(LoginRequiredMixin, ListView):
+class TableListView(LoginRequiredMixin, ConditionalGetMixin, ListView):
+    """Floor plan page and ?format=json payload for terminals polling table occupancy"""
     model = Table
     template_name = 'orders/table_list.html'
     context_object_name = 'tables'
 
+    def get_validator(self, request, *args, **kwargs):
+        return f'tables-{queryset_validator(Table.objects.all())}'
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.GET.get('format') == 'json':
+            return JsonResponse({'tables': list(
+                self.object_list.order_by('number').values('id', 'number', 'capacity', 'is_occupied')
+            )})
+        return super().render_to_response(context, **response_kwargs)
+
 class TableDetailView(LoginRequiredMixin, DetailView):
     model = Table
     template_name = 'orders/table_detail.html'
@@ -66,16 +134,25 @@ class TableDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('orders:table-list')
 
 # Order Status Management Views
-from django.views import View
-from django.shortcuts import get_object_or_404, redirect
-from django.contrib import messages
-
 class OrderStatusUpdateView(LoginRequiredMixin, View):
+    """Compare-and-set status change; clients may post the status they saw as expected_status"""
+    success_message = 'Order #{order_number} status updated to {status}'
+
     def post(self, request, pk, status):
-        order = get_object_or_404(Order, pk=pk)
-        order.status = status
-        order.save()
-        messages.success(request, f'Order #{order.order_number} status updated to {status}')
+        current = Order.objects.filter(pk=pk).values_list('status', 'order_number').first()
+        if current is None:
+            raise Http404('No order found matching the query')
+        expected, order_number = current
+        expected = request.POST.get('expected_status', expected)
+        try:
+            transition_order(pk, expected, status)
+        except InvalidTransition as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e),
+                'status': Order.objects.filter(pk=pk).values_list('status', flat=True).first(),
+            }, status=409)
+        messages.success(request, self.success_message.format(order_number=order_number, status=status))
         return redirect('orders:order-detail', pk=pk)
 
 class MarkOrderPreparingView(OrderStatusUpdateView):
@@ -91,12 +168,303 @@ class MarkOrderServedView(OrderStatusUpdateView):
         return super().post(request, pk, 'SERVED')
 
 class MarkOrderCompletedView(OrderStatusUpdateView):
+    success_message = 'Order #{order_number} has been completed'
+
     def post(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
-        order.mark_completed()
-        messages.success(request, f'Order #{order.order_number} has been completed')
-        return redirect('orders:order-detail', pk=pk)
+        return super().post(request, pk, 'COMPLETED')
 
 class MarkOrderCancelledView(OrderStatusUpdateView):
     def post(self, request, pk):
         return super().post(request, pk, 'CANCELLED')
+
+# Bulk item entry
+class OrderItemsBulkView(LoginRequiredMixin, View):
+    """Add or replace all items of an order from one JSON payload"""
+    def post(self, request, pk):
+        order = get_object_or_404(Order, pk=pk)
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict) or not isinstance(payload.get('items', []), list):
+            return JsonResponse({'success': False, 'error': 'Invalid JSON payload'}, status=400)
+        try:
+            items = save_order_items(
+                order,
+                payload.get('items', []),
+                replace=bool(payload.get('replace', False))
+            )
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'error': e.messages}, status=400)
+        return JsonResponse({
+            'success': True,
+            'items': [item.pk for item in items],
+            'subtotal': str(order.subtotal),
+            'tax': str(order.tax),
+            'total': str(order.total),
+        })
+
+# Bulk status changes
+class OrderBulkStatusView(LoginRequiredMixin, View):
+    """Move many orders to one status; takes JSON {"status", "orders"} or the same form fields"""
+    def post(self, request):
+        if request.content_type == 'application/json':
+            try:
+                payload = json.loads(request.body)
+            except ValueError:
+                payload = None
+            if not isinstance(payload, dict):
+                return JsonResponse({'success': False, 'error': 'Invalid JSON payload'}, status=400)
+            status, order_ids = payload.get('status'), payload.get('orders', [])
+        else:
+            status, order_ids = request.POST.get('status'), request.POST.getlist('orders')
+            try:
+                order_ids = [int(pk) for pk in order_ids]
+            except ValueError:
+                order_ids = None
+        if not isinstance(order_ids, list) or not all(type(pk) is int and 0 < pk < ID_LIMIT for pk in order_ids):
+            return JsonResponse({'success': False, 'error': 'Order ids must be a list of integers'}, status=400)
+        if not isinstance(status, str):
+            return JsonResponse({'success': False, 'error': 'Missing status'}, status=400)
+        if not order_ids:
+            return JsonResponse({'success': False, 'error': 'No orders given'}, status=400)
+        try:
+            updated, skipped = bulk_transition_orders(order_ids, status)
+        except InvalidTransition as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        return JsonResponse({'success': True, 'status': status, 'updated': updated, 'skipped': skipped})
+
+# Counter service
+class CounterOrderCreateView(LoginRequiredMixin, View):
+    """Create an order with all its items, and optionally its payment, from one JSON payload"""
+    def post(self, request):
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict) or not isinstance(payload.get('items'), list):
+            return JsonResponse({'success': False, 'error': 'Invalid JSON payload'}, status=400)
+        table = None
+        if payload.get('table') is not None:
+            try:
+                if isinstance(payload['table'], (bool, float)):
+                    raise TypeError
+                table = Table.objects.filter(pk=int(payload['table'])).first()
+            except (OverflowError, TypeError, ValueError):
+                return JsonResponse({'success': False, 'error': 'Invalid table'}, status=400)
+            if table is None:
+                return JsonResponse({'success': False, 'error': 'Unknown table'}, status=400)
+        try:
+            order = create_counter_order(
+                payload['items'],
+                server=getattr(request.user, 'employee_profile', None),
+                table=table,
+                customer_name=payload.get('customer_name', ''),
+                notes=payload.get('notes', ''),
+                payment_method=payload.get('payment_method'),
+            )
+        except ValidationError as e:
+            return JsonResponse({'success': False, 'error': e.messages}, status=400)
+        return JsonResponse({
+            'success': True,
+            'id': order.pk,
+            'order_number': order.order_number,
+            'subtotal': str(order.subtotal),
+            'tax': str(order.tax),
+            'total': str(order.total),
+            'payment_status': order.payment_status,
+        })
+
+# Offline terminal sync
+class OrderSyncView(LoginRequiredMixin, View):
+    """Replay a batch of orders queued by an offline POS terminal"""
+    def post(self, request):
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict) or not isinstance(payload.get('orders'), list) \
+                or not all(isinstance(record, dict) for record in payload['orders']):
+            return JsonResponse({'success': False, 'error': 'Invalid JSON payload'}, status=400)
+        try:
+            results = sync_orders(payload['orders'], server=getattr(request.user, 'employee_profile', None))
+        except IntegrityError:
+            # Another sync inserted one of these orders concurrently; a retry reports it as a duplicate
+            return JsonResponse({'success': False, 'error': 'Conflicting sync in progress, retry'}, status=409)
+        return JsonResponse({'success': True, 'results': results})
+
+# Order search
+class OrderSearchView(LoginRequiredMixin, View):
+    """Find orders by ticket number, customer name or notes"""
+    def get(self, request):
+        term = request.GET.get('q', '').strip()
+        if not term:
+            return JsonResponse({'success': False, 'error': 'Missing search term'}, status=400)
+        try:
+            limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+        except ValueError:
+            limit = 20
+        return JsonResponse({
+            'success': True,
+            'results': [
+                {
+                    'id': order.pk,
+                    'order_number': order.order_number,
+                    'customer_name': order.customer_name,
+                    'table': order.table.number if order.table_id else None,
+                    'status': order.status,
+                    'total': str(order.total),
+                    'created_at': order.created_at.isoformat(),
+                }
+                for order in search_orders(term, limit)
+            ],
+        })
+
+# Kitchen and expo display stream
+class KitchenBoardView(LoginRequiredMixin, View):
+    """Open tickets for the kitchen display, oldest first.
+
+    Displays load this once and then follow the event stream from the
+    returned last_event_id, which is read before the tickets so no change
+    in between is missed.
+    """
+    def get(self, request):
+        last_event_id = OrderEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        return JsonResponse({
+            'success': True,
+            'last_event_id': last_event_id,
+            'orders': [
+                {
+                    'id': order.pk,
+                    'order_number': order.order_number,
+                    'table': order.table.number if order.table_id else None,
+                    'status': order.status,
+                    'notes': order.notes,
+                    'created_at': order.created_at.isoformat(),
+                    'items': [
+                        {'name': item.menu_item.name, 'quantity': item.quantity, 'notes': item.notes}
+                        for item in order.items.all()
+                    ],
+                }
+                for order in Order.objects.for_kitchen()
+            ],
+        })
+
+class OrderEventStreamView(LoginRequiredMixin, View):
+    """Server-Sent Events feed of OrderEvent rows.
+
+    Resumes after the Last-Event-ID header (or ?last_event_id=) and can be
+    limited to one display with ?station=kitchen|expo. Without a cursor the
+    stream starts at the newest event; displays load KitchenBoardView first.
+    Streams end after ORDER_EVENT_STREAM_TIMEOUT seconds and browsers
+    reconnect with their cursor.
+
+    Long-lived streams need the ASGI application (restaurant_management.asgi
+    under uvicorn or daphne), where an open stream is a coroutine sleeping
+    between polls rather than a worker. Under WSGI each request answers a
+    single poll and browsers reconnect after the retry delay.
+    """
+    batch_size = 100
+    retry = 'retry: 2000\n\n'
+
+    def get(self, request):
+        station = request.GET.get('station')
+        if station and station not in OrderEvent.STATION_FILTERS:
+            return JsonResponse({'success': False, 'error': f'Unknown station {station}'}, status=400)
+
+        cursor = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        try:
+            cursor = int(cursor)
+        except (TypeError, ValueError):
+            cursor = OrderEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+        events = OrderEvent.objects.all()
+        if station:
+            events = events.filter(OrderEvent.STATION_FILTERS[station])
+
+        content = self.stream(events, cursor) if isinstance(request, ASGIRequest) else self.poll(events, cursor)
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def fetch(self, events, cursor):
+        # Primary key range scan; only new events are read
+        return events.filter(pk__gt=cursor).order_by('pk')[:self.batch_size]
+
+    def render(self, event):
+        return f'id: {event.pk}\nevent: {event.event_type.lower()}\ndata: {json.dumps(event.as_dict())}\n\n'
+
+    def poll(self, events, cursor):
+        yield self.retry
+        for event in self.fetch(events, cursor):
+            yield self.render(event)
+
+    async def stream(self, events, cursor):
+        poll_interval = getattr(settings, 'ORDER_EVENT_POLL_INTERVAL', 1)
+        deadline = time.monotonic() + getattr(settings, 'ORDER_EVENT_STREAM_TIMEOUT', 300)
+        last_sent = time.monotonic()
+        yield self.retry
+        while time.monotonic() < deadline:
+            batch = [event async for event in self.fetch(events, cursor)]
+            for event in batch:
+                cursor = event.pk
+                yield self.render(event)
+            if batch:
+                last_sent = time.monotonic()
+                if len(batch) == self.batch_size:
+                    continue
+            elif time.monotonic() - last_sent > 15:
+                last_sent = time.monotonic()
+                yield ': keep-alive\n\n'
+            await asyncio.sleep(poll_interval)
+
+# Exports
+ORDER_EXPORT_COLUMNS = [
+    'id', 'order_number', 'created_at', 'status', 'table', 'customer_name', 'payment_status',
+    'payment_method', 'subtotal', 'tax', 'total', 'completed_at',
+]
+ORDER_ITEM_EXPORT_COLUMNS = ['item_id', 'menu_item', 'quantity', 'unit_price', 'item_subtotal']
+
+class OrderExportView(LoginRequiredMixin, StreamingExportMixin, View):
+    """Orders with their items from the hot and archive tables, oldest first.
+
+    CSV has one row per item with the order columns repeated; JSON lines
+    have one order per line with its items nested. Orders moved to JSONL
+    archive segments are already files and are not included.
+    """
+    export_name = 'orders'
+
+    def get_export_columns(self, fmt):
+        if fmt == 'jsonl':
+            return ORDER_EXPORT_COLUMNS + ['items']
+        return ORDER_EXPORT_COLUMNS + ORDER_ITEM_EXPORT_COLUMNS
+
+    def get_export_rows(self, fmt, start, end):
+        item_fields = ['items__id', 'items__quantity', 'items__unit_price', 'items__subtotal']
+        tiers = [
+            (ArchivedOrder.objects.all(), 'table_number', 'items__menu_item_name'),
+            (Order.objects.all(), 'table__number', 'items__menu_item__name'),
+        ]
+        rows = chain.from_iterable(
+            orders.filter(**period_lookups('created_at', start, end)).order_by('created_at', 'id', 'items__id')
+            .values_list(
+                'id', 'order_number', 'created_at', 'status', table, 'customer_name', 'payment_status',
+                'payment_method', 'subtotal', 'tax', 'total', 'completed_at',
+                item_fields[0], item_name, *item_fields[1:],
+            ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            for orders, table, item_name in tiers
+        )
+        if fmt == 'jsonl':
+            return self.nest_items(rows)
+        return rows
+
+    def nest_items(self, rows):
+        width = len(ORDER_EXPORT_COLUMNS)
+        # Rows arrive sorted by order, so each order's items are consecutive
+        for _, order_rows in groupby(rows, key=lambda row: row[0]):
+            order_rows = list(order_rows)
+            items = [
+                dict(zip(ORDER_ITEM_EXPORT_COLUMNS, row[width:])) for row in order_rows if row[width] is not None
+            ]
+            yield order_rows[0][:width] + (items,)
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from reports.models import AnalyticsOutbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold queued completed-order deltas into SalesAnalytics, DailyReport and DashboardMetric. '
+        'Drains the outbox once, or keeps polling with --every.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Outbox rows applied per transaction')
+        parser.add_argument('--every', type=float, help='Poll the outbox every N seconds instead of draining once')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            while True:
+                applied = AnalyticsOutbox.drain(options['batch_size'])
+                processed += applied
+                if applied < options['batch_size']:
+                    break
+            if processed or not options['every']:
+                self.stdout.write(self.style.SUCCESS(f'Applied {processed} analytics deltas'))
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
@@ -1,11 +1,14 @@
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import receiver
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
-from orders.models import Order
+from orders.archive import completed_order_totals
+from orders.signals import completed_totals_changed
 from inventory.models import InventoryTransaction
 from staff.models import Employee
 from django.utils import timezone
 from decimal import Decimal
+from restaurant_management.dates import day_range, hour_range, month_range
 
 class DailyReport(models.Model):
     date = models.DateField(unique=True)
@@ -61,27 +64,27 @@ class DailyReport(models.Model):
         return f"Daily Report - {self.date}"
 
     def generate_report(self):
-        # Get all completed orders for the day
-        orders = Order.objects.filter(
-            created_at__date=self.date,
-            status='COMPLETED'
-        )
+        with transaction.atomic():
+            AnalyticsOutbox.flush()
+            self._generate_report()
+
+    def _generate_report(self):
+        # Get all completed orders for the day, hot and archived
+        start, end = day_range(self.date)
+        totals = completed_order_totals(start, end)
         
         # Calculate sales metrics
-        self.total_orders = orders.count()
-        self.total_sales = orders.aggregate(
-            total=models.Sum('total', default=0)
-        )['total']
-        self.total_tax = orders.aggregate(
-            tax=models.Sum('tax', default=0)
-        )['tax']
+        self.total_orders = totals['count']
+        self.total_sales = totals['sales']
+        self.total_tax = totals['tax']
         
         if self.total_orders > 0:
             self.average_order_value = self.total_sales / self.total_orders
         
         # Calculate inventory costs
         inventory_transactions = InventoryTransaction.objects.filter(
-            date__date=self.date
+            date__gte=start,
+            date__lt=end
         )
         self.inventory_cost = inventory_transactions.aggregate(
             cost=models.Sum(
@@ -95,7 +98,7 @@ class DailyReport(models.Model):
         attendances = Attendance.objects.filter(
             schedule__date=self.date,
             status='PRESENT'
-        )
+        ).select_related('employee')
         
         labor_cost = Decimal('0')
         for attendance in attendances:
@@ -167,9 +170,10 @@ class MonthlyReport(models.Model):
 
     def generate_report(self):
         # Get all daily reports for the month
+        first_day, next_month = month_range(self.year, self.month)
         daily_reports = DailyReport.objects.filter(
-            date__year=self.year,
-            date__month=self.month
+            date__gte=first_day,
+            date__lt=next_month
         )
         
         # Aggregate metrics from daily reports
@@ -226,24 +230,94 @@ class SalesAnalytics(models.Model):
     @classmethod
     def update_analytics(cls, date, hour):
         """Update or create analytics for a specific hour"""
-        orders = Order.objects.filter(
-            created_at__date=date,
-            created_at__hour=hour,
-            status='COMPLETED'
-        )
-        
-        total_sales = orders.aggregate(
-            total=models.Sum('total', default=0)
-        )['total']
-        order_count = orders.count()
-        
-        analytics, _ = cls.objects.update_or_create(
-            date=date,
-            hour=hour,
-            defaults={
-                'total_sales': total_sales,
-                'order_count': order_count,
-                'average_order_value': total_sales / order_count if order_count > 0 else 0
-            }
-        )
+        start, end = hour_range(date, hour)
+        with transaction.atomic():
+            AnalyticsOutbox.flush()
+            totals = completed_order_totals(start, end)
+            total_sales = totals['sales']
+            order_count = totals['count']
+
+            analytics, _ = cls.objects.update_or_create(
+                date=date,
+                hour=hour,
+                defaults={
+                    'total_sales': total_sales,
+                    'order_count': order_count,
+                    'average_order_value': total_sales / order_count if order_count > 0 else 0
+                }
+            )
         return analytics
+
+class AnalyticsOutbox(models.Model):
+    """Completed-order sales deltas waiting to be folded into the rollups"""
+    # No foreign key: the order may be archived before the worker runs
+    order_id = models.BigIntegerField()
+    order_created_at = models.DateTimeField()
+    sales = models.DecimalField(max_digits=10, decimal_places=2)
+    tax = models.DecimalField(max_digits=10, decimal_places=2)
+    order_count = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name_plural = 'Analytics outbox'
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.sales:+} ({self.order_count:+})"
+
+    @classmethod
+    def drain(cls, batch_size=500, wait=False):
+        """Apply one batch of pending deltas to the hourly, daily and dashboard rollups.
+
+        Deltas are summed per bucket first, so each touched hour and day is
+        updated once. Rows another worker is applying are skipped unless
+        ``wait`` is set; ``batch_size=None`` takes every pending row. Returns
+        the number of outbox rows processed.
+        """
+        from dashboard.models import DashboardMetric
+        from restaurant_management.rollups import add_to_rollup
+
+        with transaction.atomic():
+            pending = cls.objects.select_for_update(skip_locked=not wait).order_by('id')
+            entries = list(pending if batch_size is None else pending[:batch_size])
+            hourly, daily = {}, {}
+            for entry in entries:
+                local = timezone.localtime(entry.order_created_at)
+                for buckets, key in ((hourly, (local.date(), local.hour)), (daily, local.date())):
+                    sales, tax, count = buckets.get(key, (Decimal('0'), Decimal('0'), 0))
+                    buckets[key] = (sales + entry.sales, tax + entry.tax, count + entry.order_count)
+
+            for (date, hour), (sales, tax, count) in hourly.items():
+                add_to_rollup(SalesAnalytics, {'date': date, 'hour': hour}, sales, count)
+            for date, (sales, tax, count) in daily.items():
+                add_to_rollup(
+                    DailyReport, {'date': date}, sales, count,
+                    count_field='total_orders', total_tax=tax, net_profit=sales - tax
+                )
+                add_to_rollup(DashboardMetric, {'date': date}, sales, count, count_field='total_orders')
+
+            cls.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+        return len(entries)
+
+    @classmethod
+    def flush(cls):
+        """Apply every pending delta, waiting for rows another worker holds.
+
+        Full recomputes call this in their own transaction before reading the
+        orders, so a later drain cannot add deltas they already counted.
+        """
+        return cls.drain(batch_size=None, wait=True)
+
+@receiver(completed_totals_changed)
+def enqueue_analytics(sender, changes, **kwargs):
+    """Write the deltas in the same transaction as the order change"""
+    AnalyticsOutbox.objects.bulk_create([
+        AnalyticsOutbox(
+            order_id=change['order_id'],
+            order_created_at=change['created_at'],
+            sales=change['sales'],
+            tax=change['tax'],
+            order_count=change['count'],
+        )
+        for change in changes
+    ])
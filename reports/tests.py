@@ -1,3 +1,76 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.utils import timezone
+from dashboard.models import DashboardMetric
+from menu.models import Category, MenuItem
+from orders.models import Order, OrderItem
+from orders.services import transition_order
+from restaurant_management.rollups import add_to_rollup
+from .models import AnalyticsOutbox, DailyReport, SalesAnalytics
 
-# Create your tests here.
+
+class AnalyticsOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.soup = MenuItem.objects.create(name='Soup', category=category, price=Decimal('10.00'))
+
+    def complete_order(self, quantity=1):
+        order = Order.objects.create(customer_name='Walk-in', status='SERVED')
+        OrderItem.objects.create(order=order, menu_item=self.soup, quantity=quantity, unit_price=Decimal('10.00'))
+        transition_order(order.pk, 'SERVED', 'COMPLETED')
+        return order
+
+    def assertRollups(self, sales, count):
+        now = timezone.localtime()
+        hour = SalesAnalytics.objects.get(date=now.date(), hour=now.hour)
+        day = DailyReport.objects.get(date=now.date())
+        metric = DashboardMetric.objects.get(date=now.date())
+        self.assertEqual((hour.total_sales, hour.order_count), (Decimal(sales), count))
+        self.assertEqual((day.total_sales, day.total_orders), (Decimal(sales), count))
+        self.assertEqual((metric.total_sales, metric.total_orders), (Decimal(sales), count))
+
+    def test_drain_folds_deltas_into_the_rollups(self):
+        self.complete_order(1)
+        order = self.complete_order(2)
+        OrderItem.objects.create(order=order, menu_item=self.soup, quantity=1, unit_price=Decimal('10.00'))
+        self.assertEqual(AnalyticsOutbox.drain(), 3)
+        self.assertRollups('44.00', 2)
+        self.assertEqual(DailyReport.objects.get().total_tax, Decimal('4.00'))
+        self.assertEqual(DashboardMetric.objects.get().average_order_value, Decimal('22.00'))
+        self.assertEqual(AnalyticsOutbox.drain(), 0)
+        self.assertRollups('44.00', 2)
+
+    def test_drain_respects_the_batch_size(self):
+        for _ in range(3):
+            self.complete_order()
+        self.assertEqual(AnalyticsOutbox.drain(batch_size=2), 2)
+        self.assertEqual(AnalyticsOutbox.drain(batch_size=2), 1)
+        self.assertRollups('33.00', 3)
+
+    def test_recompute_absorbs_pending_deltas(self):
+        self.complete_order(1)
+        AnalyticsOutbox.drain()
+        self.complete_order(2)
+        today = timezone.localdate()
+        DashboardMetric.update_metrics(today)
+        DailyReport.objects.get(date=today).generate_report()
+        now = timezone.localtime()
+        SalesAnalytics.update_analytics(now.date(), now.hour)
+        self.assertFalse(AnalyticsOutbox.objects.exists())
+        self.assertEqual(AnalyticsOutbox.drain(), 0)
+        self.assertRollups('33.00', 2)
+
+    def test_one_dashboard_row_per_date(self):
+        today = timezone.localdate()
+        add_to_rollup(DashboardMetric, {'date': today}, Decimal('10.00'), 1, count_field='total_orders')
+        add_to_rollup(DashboardMetric, {'date': today}, Decimal('5.00'), 1, count_field='total_orders')
+        metric = DashboardMetric.objects.get()
+        self.assertEqual((metric.total_sales, metric.total_orders), (Decimal('15.00'), 2))
+        self.assertEqual(metric.average_order_value, Decimal('7.50'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DashboardMetric.objects.create(date=today)
+        add_to_rollup(DashboardMetric, {'date': today - timedelta(days=1)}, Decimal('1.00'), 1, count_field='total_orders')
+        self.assertEqual(DashboardMetric.objects.count(), 2)
@@ -3,6 +3,8 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.db.models import Sum, Avg, Count
+from restaurant_management.dates import day_range
+from restaurant_management.pagination import CursorPaginationMixin
 from .models import DailyReport, MonthlyReport, SalesAnalytics
 from orders.models import Order
 from inventory.models import InventoryTransaction
@@ -29,11 +31,11 @@ class ReportsDashboardView(LoginRequiredMixin, TemplateView):
         
         return context
 
-class DailyReportListView(LoginRequiredMixin, ListView):
+class DailyReportListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = DailyReport
     template_name = 'reports/daily_report_list.html'
     context_object_name = 'reports'
-    ordering = ['-date']
+    cursor_ordering = ['-date', '-id']
     paginate_by = 30
 
 class DailyReportDetailView(LoginRequiredMixin, DetailView):
@@ -122,7 +124,7 @@ class SalesAnalyticsView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        today = timezone.now().date()
+        today = timezone.localdate()
         
         # Get today's analytics
         context['today_analytics'] = SalesAnalytics.objects.filter(
@@ -130,9 +132,11 @@ class SalesAnalyticsView(LoginRequiredMixin, TemplateView):
         ).order_by('hour')
         
         # Calculate daily totals
+        start, end = day_range(today)
         context['daily_totals'] = Order.objects.filter(
-            created_at__date=today,
-            status='COMPLETED'
+            status='COMPLETED',
+            created_at__gte=start,
+            created_at__lt=end
         ).aggregate(
             total_sales=Sum('total'),
             order_count=Count('id'),
@@ -0,0 +1,29 @@
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+def day_range(day):
+    """Aware [start, end) datetimes covering ``day`` in the current time zone.
+
+    Filtering ``created_at__gte=start, created_at__lt=end`` can use an index
+    on the column, unlike ``created_at__date=day`` which wraps it in a function.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def hour_range(day, hour):
+    """Aware [start, end) datetimes covering one hour of ``day`` in the current time zone"""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time(hour)), tz)
+    return start, start + timedelta(hours=1)
+
+
+def month_range(year, month):
+    """First day of the month and first day of the following month"""
+    start = datetime(year, month, 1).date()
+    if month == 12:
+        return start, start.replace(year=year + 1, month=1)
+    return start, start.replace(month=month + 1)
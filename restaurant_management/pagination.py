@@ -0,0 +1,164 @@
+import base64
+import json
+from django.db import connections
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    """The cursor token is malformed or does not match the paginator's ordering"""
+
+
+def approximate_count(queryset):
+    """Row count estimate from the planner statistics for unfiltered PostgreSQL tables.
+
+    Filtered querysets and other backends fall back to an exact COUNT(*).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    return queryset.count()
+
+
+class CursorPaginator:
+    """Keyset paginator over a fixed ordering that ends with a unique field.
+
+    Pages are selected with ``WHERE (a, id) < (last_a, last_id)`` style
+    predicates instead of OFFSET, so a deep page costs the same as the first.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self._count = None
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = approximate_count(self.queryset.order_by())
+        return self._count
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name in self.fields:
+            field = self.queryset.model._meta.get_field(name)
+            values.append(field.value_to_string(obj))
+        token = json.dumps([direction] + values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(token.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            direction, *raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in ('next', 'prev') or len(raw) != len(self.fields):
+                raise ValueError
+            values = [
+                self.queryset.model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, raw)
+            ]
+        except Exception:
+            raise InvalidCursor(token)
+        return direction, values
+
+    def _seek(self, values, reverse):
+        # Expand (a, b, c) > (x, y, z) into a > x OR (a = x AND b > y) OR ...
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            descending = name.startswith('-') != reverse
+            field = name.lstrip('-')
+            clause = Q(**{f"{field}__{'lt' if descending else 'gt'}": values[position]})
+            for earlier, value in zip(self.fields[:position], values[:position]):
+                clause &= Q(**{earlier: value})
+            condition |= clause
+        # A plain range on the leading column lets the planner seek instead of scanning the index
+        descending = self.ordering[0].startswith('-') != reverse
+        return Q(**{f"{self.fields[0]}__{'lte' if descending else 'gte'}": values[0]}) & condition
+
+    def page(self, token=None):
+        direction, values = ('next', None) if not token else self.decode_cursor(token)
+        reverse = direction == 'prev'
+        ordering = self.ordering
+        if reverse:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            return CursorPage(rows, self, has_next=values is not None, has_previous=has_more)
+        return CursorPage(rows, self, has_next=has_more, has_previous=values is not None)
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next and bool(object_list)
+        self._has_previous = has_previous and bool(object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode_cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode_cursor(self.object_list[0], 'prev')
+
+
+class CursorPaginationMixin:
+    """ListView mixin replacing OFFSET pagination with opaque cursor tokens.
+
+    Views set ``cursor_ordering`` (ending in a unique field such as ``-id``)
+    and ``paginate_by``. The page is selected with ``?cursor=``; templates get
+    ``page_obj.next_cursor`` / ``page_obj.previous_cursor``. A total is only
+    computed when ``?total=1`` is passed, using approximate_count().
+    """
+    cursor_ordering = ('-id',)
+    cursor_kwarg = 'cursor'
+
+    def get_ordering(self):
+        return list(self.cursor_ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, self.cursor_ordering, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            page = paginator.page()
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if self.request.GET.get('total') and context.get('paginator') is not None:
+            context['total_count'] = context['paginator'].count
+        return context
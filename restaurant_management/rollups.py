@@ -0,0 +1,29 @@
+from decimal import Decimal
+from django.db import models
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.utils import timezone
+
+
+def add_to_rollup(model, lookup, sales, count, sales_field='total_sales', count_field='order_count', **deltas):
+    """Shift the rollup row matching ``lookup`` by a sales/count delta in one UPDATE.
+
+    ``lookup`` must cover a unique constraint of ``model``. The row is
+    inserted first if missing, ignoring the conflict when a concurrent drain
+    inserts it too, then ``average_order_value`` is re-derived from the
+    shifted columns in the same statement and any extra ``deltas``
+    (field=amount) are added as well.
+    """
+    model.objects.bulk_create([model(**lookup)], ignore_conflicts=True)
+    new_sales = models.F(sales_field) + sales
+    new_count = models.F(count_field) + count
+    # A float divisor keeps SQLite, which stores whole decimals as integers, from dividing integers
+    average = Cast(
+        new_sales / Cast(NullIf(new_count, 0), models.FloatField()),
+        models.DecimalField(max_digits=10, decimal_places=2),
+    )
+    return model.objects.filter(**lookup).update(
+        **{sales_field: new_sales, count_field: new_count},
+        **{field: models.F(field) + amount for field, amount in deltas.items()},
+        average_order_value=Coalesce(Round(average, 2), Decimal('0'), output_field=models.DecimalField()),
+        updated_at=timezone.now(),
+    )
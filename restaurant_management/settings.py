@@ -58,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'orders.middleware.IdempotencyMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -80,6 +81,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'restaurant_management.wsgi.application'
+# The order event stream (/orders/events/stream/) only stays open under the
+# ASGI application, e.g. `uvicorn restaurant_management.asgi:application`;
+# WSGI workers answer it with a single poll.
+ASGI_APPLICATION = 'restaurant_management.asgi.application'
 
 # Database
 DATABASES = {
@@ -89,6 +94,17 @@ DATABASES = {
     }
 }
 
+# Cache
+# Order snapshots and the menu catalog are keyed by versions read from the
+# database, so a per-process cache stays correct; a shared backend only saves
+# each process from building its own copy.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'restaurant-management',
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -0,0 +1,22 @@
+import re
+from django.db import connections
+
+
+class QueryPlanMixin:
+    """TestCase mixin asserting that a queryset is answered from an index"""
+
+    def assertNoFullScan(self, queryset):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan; ask the planner what it would do otherwise
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            full_scan = re.search(rf'Seq Scan on {table}\b', plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            full_scan = re.search(rf'\bSCAN {table}\b', plan)
+        else:
+            self.skipTest(f'No plan check for {connection.vendor}')
+        self.assertIsNone(full_scan, f'Full scan of {table}:\n{plan}')
@@ -9,6 +9,9 @@ class EmployeeAdmin(admin.ModelAdmin):
     ordering = ['user__last_name', 'user__first_name']
     list_editable = ['is_active']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
 @admin.register(Schedule)
 class ScheduleAdmin(admin.ModelAdmin):
     list_display = ['employee', 'date', 'shift', 'start_time', 'end_time']
@@ -16,6 +19,9 @@ class ScheduleAdmin(admin.ModelAdmin):
     search_fields = ['employee__user__username', 'employee__user__first_name', 'employee__user__last_name']
     ordering = ['-date', 'start_time']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
     list_display = ['employee', 'schedule', 'status', 'created_at']
@@ -24,6 +30,9 @@ class AttendanceAdmin(admin.ModelAdmin):
     ordering = ['-created_at']
     readonly_fields = ['created_at']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
+
 @admin.register(Leave)
 class LeaveAdmin(admin.ModelAdmin):
     list_display = ['employee', 'leave_type', 'start_date', 'end_date', 'status']
@@ -31,3 +40,6 @@ class LeaveAdmin(admin.ModelAdmin):
     search_fields = ['employee__user__username', 'employee__user__first_name', 'employee__user__last_name']
     ordering = ['-start_date']
     list_editable = ['status']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_list()
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staff', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['schedule', 'status'], name='attendance_schedule_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['date', 'employee'], name='schedule_date_employee_idx'),
+        ),
+    ]
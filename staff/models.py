@@ -4,6 +4,10 @@ from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+class EmployeeQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('user')
+
 class Employee(models.Model):
     POSITION_CHOICES = [
         ('MANAGER', 'Manager'),
@@ -34,12 +38,18 @@ class Employee(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EmployeeQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.position}"
 
     class Meta:
         ordering = ['user__last_name', 'user__first_name']
 
+class ScheduleQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('employee__user')
+
 class Schedule(models.Model):
     SHIFT_CHOICES = [
         ('MORNING', 'Morning Shift'),
@@ -61,9 +71,14 @@ class Schedule(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ScheduleQuerySet.as_manager()
+
     class Meta:
         ordering = ['date', 'start_time']
         unique_together = ['employee', 'date', 'shift']
+        indexes = [
+            models.Index(fields=['date', 'employee'], name='schedule_date_employee_idx'),
+        ]
 
     def __str__(self):
         return f"{self.employee.user.get_full_name()} - {self.date} {self.shift}"
@@ -84,6 +99,10 @@ class Schedule(models.Model):
                 self.end_time > schedule.start_time):
                 raise ValidationError("This schedule overlaps with another shift")
 
+class AttendanceQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('employee__user', 'schedule__employee__user')
+
 class Attendance(models.Model):
     employee = models.ForeignKey(
         Employee,
@@ -111,9 +130,14 @@ class Attendance(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = AttendanceQuerySet.as_manager()
+
     class Meta:
         ordering = ['-schedule__date', '-check_in']
         unique_together = ['employee', 'schedule']
+        indexes = [
+            models.Index(fields=['schedule', 'status'], name='attendance_schedule_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.employee.user.get_full_name()} - {self.schedule.date} ({self.status})"
@@ -123,6 +147,10 @@ class Attendance(models.Model):
             if self.check_out <= self.check_in:
                 raise ValidationError("Check-out time must be after check-in time")
 
+class LeaveQuerySet(models.QuerySet):
+    def for_list(self):
+        return self.select_related('employee__user', 'approved_by')
+
 class Leave(models.Model):
     LEAVE_TYPES = [
         ('SICK', 'Sick Leave'),
@@ -159,6 +187,8 @@ class Leave(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LeaveQuerySet.as_manager()
+
     class Meta:
         ordering = ['-start_date']
 
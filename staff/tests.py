@@ -1,3 +1,47 @@
+from datetime import date, time, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
 from django.test import TestCase
+from restaurant_management.testing import QueryPlanMixin
+from .models import Attendance, Employee, Leave, Schedule
 
-# Create your tests here.
+
+class StaffQueryShapeTests(TestCase):
+    def create_staff(self, count):
+        for _ in range(count):
+            number = Employee.objects.count()
+            user = User.objects.create_user(f'employee{number}', first_name='Pat', last_name=f'Cook{number}')
+            employee = Employee.objects.create(
+                user=user, position='CHEF', phone='555', address='-', emergency_contact='-',
+                emergency_phone='555', date_hired=date(2024, 1, 1), hourly_rate=Decimal('15.00')
+            )
+            schedule = Schedule.objects.create(
+                employee=employee, date=date.today() + timedelta(days=1), shift='MORNING',
+                start_time=time(8), end_time=time(16)
+            )
+            Attendance.objects.create(employee=employee, schedule=schedule, status='PRESENT')
+            Leave.objects.create(
+                employee=employee, leave_type='SICK', start_date=date.today(),
+                end_date=date.today(), reason='-', approved_by=user
+            )
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        for count in (2, 8):
+            self.create_staff(count)
+            with self.assertNumQueries(1):
+                [str(employee) for employee in Employee.objects.for_list()]
+            with self.assertNumQueries(1):
+                [str(schedule) for schedule in Schedule.objects.for_list()]
+            with self.assertNumQueries(1):
+                [(str(record), str(record.schedule)) for record in Attendance.objects.for_list()]
+            with self.assertNumQueries(1):
+                [(str(leave), str(leave.approved_by)) for leave in Leave.objects.for_list()]
+
+
+class StaffQueryPlanTests(QueryPlanMixin, TestCase):
+    def test_hot_queries_use_indexes(self):
+        today = date.today()
+        self.assertNoFullScan(Schedule.objects.filter(date=today))
+        self.assertNoFullScan(Schedule.objects.filter(date__gte=today).order_by('date', 'employee'))
+        self.assertNoFullScan(Attendance.objects.filter(schedule__date=today, status='PRESENT'))
+        self.assertNoFullScan(Attendance.objects.filter(schedule_id=1, status='PRESENT'))
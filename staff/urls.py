@@ -21,6 +21,7 @@ urlpatterns = [
     # Attendance URLs
     path('attendance/', views.AttendanceListView.as_view(), name='attendance-list'),
     path('attendance/create/', views.AttendanceCreateView.as_view(), name='attendance-create'),
+    path('attendance/export/', views.AttendanceExportView.as_view(), name='attendance-export'),
     path('attendance/<int:pk>/', views.AttendanceDetailView.as_view(), name='attendance-detail'),
     path('attendance/<int:pk>/update/', views.AttendanceUpdateView.as_view(), name='attendance-update'),
     
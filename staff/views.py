@@ -3,18 +3,22 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, redirect
+from django.views import View
+from restaurant_management.exports import EXPORT_CHUNK_SIZE, StreamingExportMixin
 from .models import Employee, Schedule, Attendance, Leave
 from django.contrib.auth.models import User
 from django.utils import timezone
 
 class EmployeeListView(LoginRequiredMixin, ListView):
     model = Employee
+    queryset = Employee.objects.for_list()
     template_name = 'staff/employee_list.html'
     context_object_name = 'employees'
     ordering = ['user__last_name', 'user__first_name']
 
 class EmployeeDetailView(LoginRequiredMixin, DetailView):
     model = Employee
+    queryset = Employee.objects.for_list()
     template_name = 'staff/employee_detail.html'
     context_object_name = 'employee'
 
@@ -23,7 +27,7 @@ class EmployeeDetailView(LoginRequiredMixin, DetailView):
         context['schedules'] = self.object.schedules.filter(
             date__gte=timezone.now().date()
         ).order_by('date', 'start_time')[:5]
-        context['recent_attendance'] = self.object.attendance.order_by('-created_at')[:5]
+        context['recent_attendance'] = self.object.attendance.for_list().order_by('-created_at')[:5]
         context['leaves'] = self.object.leaves.order_by('-start_date')[:5]
         return context
 
@@ -67,12 +71,13 @@ class ScheduleListView(LoginRequiredMixin, ListView):
     ordering = ['date', 'start_time']
 
     def get_queryset(self):
-        return Schedule.objects.filter(
+        return Schedule.objects.for_list().filter(
             date__gte=timezone.now().date()
-        ).select_related('employee__user')
+        )
 
 class ScheduleDetailView(LoginRequiredMixin, DetailView):
     model = Schedule
+    queryset = Schedule.objects.for_list()
     template_name = 'staff/schedule_detail.html'
     context_object_name = 'schedule'
 
@@ -102,12 +107,14 @@ class ScheduleDeleteView(LoginRequiredMixin, DeleteView):
 
 class AttendanceListView(LoginRequiredMixin, ListView):
     model = Attendance
+    queryset = Attendance.objects.for_list()
     template_name = 'staff/attendance_list.html'
     context_object_name = 'attendance_records'
     ordering = ['-schedule__date']
 
 class AttendanceDetailView(LoginRequiredMixin, DetailView):
     model = Attendance
+    queryset = Attendance.objects.for_list()
     template_name = 'staff/attendance_detail.html'
     context_object_name = 'attendance'
 
@@ -123,14 +130,35 @@ class AttendanceUpdateView(LoginRequiredMixin, UpdateView):
     fields = ['status', 'notes']
     success_url = reverse_lazy('staff:attendance-list')
 
+class AttendanceExportView(LoginRequiredMixin, StreamingExportMixin, View):
+    """Attendance records by shift date, optionally limited to ?start= / ?end="""
+    export_name = 'attendance'
+    export_columns = [
+        'id', 'date', 'shift', 'scheduled_start', 'scheduled_end', 'employee_id', 'first_name', 'last_name',
+        'check_in', 'check_out', 'status', 'notes',
+    ]
+
+    def get_export_rows(self, fmt, start, end):
+        records = Attendance.objects.all()
+        if start:
+            records = records.filter(schedule__date__gte=start)
+        if end:
+            records = records.filter(schedule__date__lte=end)
+        return records.order_by('schedule__date', 'id').values_list(
+            'id', 'schedule__date', 'schedule__shift', 'schedule__start_time', 'schedule__end_time', 'employee_id',
+            'employee__user__first_name', 'employee__user__last_name', 'check_in', 'check_out', 'status', 'notes',
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
 class LeaveListView(LoginRequiredMixin, ListView):
     model = Leave
+    queryset = Leave.objects.for_list()
     template_name = 'staff/leave_list.html'
     context_object_name = 'leaves'
     ordering = ['-start_date']
 
 class LeaveDetailView(LoginRequiredMixin, DetailView):
     model = Leave
+    queryset = Leave.objects.for_list()
     template_name = 'staff/leave_detail.html'
     context_object_name = 'leave'
 